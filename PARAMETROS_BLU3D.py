@@ -1,15 +1,2527 @@
+import time
+_STARTUP_T0 = time.perf_counter()  # Reference point for --measure-startup
+
 import re
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
+import ast
+import sys
+import pickle
+import hashlib
+import threading
+import importlib
+import difflib
+import json
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import filedialog, messagebox, Text, Scrollbar, simpledialog, ttk
 import os
 from datetime import datetime
 
+# matplotlib and numpy are imported on first use (graph window, bulk math) so
+# the main window can appear without paying for them at startup.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+THEME_FILE = os.path.join(APP_DIR, 'azure.tcl')
+
+# Modules warmed up in the background once the window is on screen
+DEFERRED_IMPORTS = ['numpy', 'matplotlib.figure']
+
+# Parsed-index cache (see ParseCache)
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.blu3d_cache')
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+DOCUMENT_MEMORY_BUDGET = 256 * 1024 * 1024  # Text of inactive documents is dropped beyond this
+MINIFY_TOLERANCE = 0.001  # Default largest coordinate change (mm) when minifying
+MINIFY_CHUNK_LINES = 65536  # Lines minified per batch
+SPLIT_MAX_LINES = 100000  # Default line target per sub-program
+SPLIT_MAX_BYTES = 4 * 1024 * 1024  # Default size target per sub-program
+WATCH_INTERVAL_MS = 1000  # How often the open program is checked for external changes
+WATCH_CHUNK_LINES = 4096  # Lines per hashed chunk when locating external changes
+JOURNAL_DIR = os.path.join(CACHE_DIR, 'journal')
+JOURNAL_FLUSH_MS = 500  # Pending journal records are written and fsynced this often
+JOURNAL_FLUSH_BYTES = 256 * 1024  # ...or as soon as this much is buffered
+CACHE_VERSION = 3  # Bump whenever SRCIndex's layout or the parser changes
+
+# Parameter types in the order used for their integer codes
+PARAM_TYPES = ['TOOL_RPM', '$VEL.CP', 'LAYER_COOLING', 'ACT_DRIVE']
+
+# Group names shown in the parameter list
+PARAM_GROUP_NAMES = {
+    'TOOL_RPM': 'Tool Speed (TOOL_RPM)',
+    '$VEL.CP': 'Feed Rate ($VEL.CP)',
+    'LAYER_COOLING': 'Cooling (LAYER_COOLING)',
+    'ACT_DRIVE': 'Drive (ACT_DRIVE)',
+}
+
+# Print-time model: $VEL.CP is in m/s, coordinates in mm
+VEL_CP_TO_MM_S = 1000.0
+DEFAULT_ACCELERATION = 1000.0  # mm/s^2
+TRIGGER_DELAY_TO_S = 0.001  # TRIGGER ... DELAY is in ms
+
+# Reverse of PARAM_GROUP_NAMES
+GROUP_PARAM_TYPES = {group_name: param_type for param_type, group_name in PARAM_GROUP_NAMES.items()}
+
+# Limits for every parameter. Values outside min/max or not in enum are
+# errors; values above warn, or jumps of more than max_step between
+# consecutive assignments, are warnings
+VALIDATION_RULES = {
+    'TOOL_RPM': {'min': 0, 'max': 139.8},
+    '$VEL.CP': {'min': 0, 'max': 2.0, 'warn': 0.5, 'max_step': 0.2},
+    'LAYER_COOLING': {'min': 0, 'max': 200},
+    'ACT_DRIVE': {'enum': ('TRUE', 'FALSE')},
+}
+PARAM_MAX_VALUES = {param_type: rule['max'] for param_type, rule in VALIDATION_RULES.items() if 'max' in rule}
+VEL_CP_WARN_VALUE = VALIDATION_RULES['$VEL.CP']['warn']
+
+# Diff view: context lines around each change, and hunks drawn per page
+DIFF_CONTEXT = 3
+DIFF_HUNKS_PER_PAGE = 40
+
+# Edit patches: format version, and header lines handled by DEF/PARKPOS
+PATCH_VERSION = 1
+PATCH_HEADER_PREFIXES = ("DEF ", "PARKPOS = ", ";generated with ", ";generated by ", ";Source file name: ")
+
+# At most this many validation problems are listed (all are counted)
+VALIDATION_LIST_LIMIT = 1000
+
+# Above this many changed lines the preview is redrawn instead of patched
+PREVIEW_PATCH_LIMIT = 2000
+
+TRIGGER_PATTERN = re.compile(r'TRIGGER WHEN DISTANCE=(\d+\.?\d*)\s*DELAY=(\d+\.?\d*)\s*DO\s+ACT_DRIVE=(TRUE|FALSE)')
+LIN_Z_PATTERN = re.compile(r'LIN.*?Z\s*(-?\d+\.?\d*)')
+LIN_X_PATTERN = re.compile(r'LIN.*?X\s*(-?\d+\.?\d*)')
+LIN_Y_PATTERN = re.compile(r'LIN.*?Y\s*(-?\d+\.?\d*)')
+LIN_AXIS_PATTERN = re.compile(r'\b([XYZ]\s*)(-?\d+(?:\.\d*)?)')  # Splits a LIN line around its X/Y/Z numbers
+PRINT_PROGRESS_PATTERN = re.compile(r'TRIGGER WHEN DISTANCE=0 DELAY=0 DO PRINT_PROGRESS=(\d+)')
+PARAM_VALUE_PATTERNS = {
+    'TOOL_RPM': re.compile(r'TOOL_RPM\s*=\s*(-?\d+)'),
+    '$VEL.CP': re.compile(r'\$VEL\.CP\s*=\s*(-?\d+\.?\d*)'),
+    'LAYER_COOLING': re.compile(r'LAYER_COOLING\s*=\s*(-?\d+)'),
+    'ACT_DRIVE': re.compile(r'ACT_DRIVE\s*=\s*(TRUE|FALSE)'),
+}
+
+
+def lin_coordinates(line):
+    """Return (x, y, z) of a LIN move, or None if the line is not one.
+
+    Only moves with a Z are counted; a missing X or Y is returned as NaN
+    (the previous value still applies).
+    """
+    if 'LIN' not in line:
+        return None
+    z_match = LIN_Z_PATTERN.search(line)
+    if not z_match:
+        return None
+    x_match = LIN_X_PATTERN.search(line)
+    y_match = LIN_Y_PATTERN.search(line)
+    return (float(x_match.group(1)) if x_match else float('nan'),
+            float(y_match.group(1)) if y_match else float('nan'),
+            float(z_match.group(1)))
+
+
+def effective_values(change_lines, change_values, query_lines, default=float('nan')):
+    """Value in force at each query line, given sorted assignment lines.
+
+    A line's own assignment counts; lines before the first assignment get
+    default.
+    """
+    import numpy as np
+    positions = np.searchsorted(change_lines, query_lines, side='right') - 1
+    if not len(change_values):
+        return np.full(len(positions), default, dtype=float)
+    values = np.asarray(change_values, dtype=float)[np.maximum(positions, 0)]
+    values[positions < 0] = default
+    return values
+
+
+def chunk_hashes(lines, chunk_lines=WATCH_CHUNK_LINES):
+    """Return (line_count, forward, backward) chunk hashes of a program.
+
+    forward hashes chunks of chunk_lines counted from the first line and
+    backward counted from the last, so a change in the middle leaves
+    both ends matching even when it shifts the line count.
+    """
+    def digest(first, stop):
+        return hashlib.blake2b('\n'.join(lines[first:stop]).encode('utf-8'), digest_size=16).digest()
+    count = len(lines)
+    forward = [digest(first, first + chunk_lines) for first in range(0, count, chunk_lines)]
+    backward = [digest(max(stop - chunk_lines, 0), stop) for stop in range(count, 0, -chunk_lines)]
+    return count, forward, backward
+
+
+def changed_span(old_chunks, new_chunks, chunk_lines=WATCH_CHUNK_LINES):
+    """(start, old_stop, new_stop) of the lines that differ between two programs.
+
+    Lines before start and after the stops are in chunks whose hashes
+    match; the span itself is only as precise as the chunk size.
+    """
+    old_count, old_forward, old_backward = old_chunks
+    new_count, new_forward, new_backward = new_chunks
+    same = 0
+    while same < min(len(old_forward), len(new_forward)) and old_forward[same] == new_forward[same]:
+        same += 1
+    start = min(same * chunk_lines, old_count, new_count)
+    same = 0
+    while same < min(len(old_backward), len(new_backward)) and old_backward[same] == new_backward[same]:
+        same += 1
+    suffix = min(same * chunk_lines, old_count - start, new_count - start)
+    return start, old_count - suffix, new_count - suffix
+
+
+def tolerance_decimals(tolerance):
+    """Fewest decimals whose rounding error (half a unit) stays within tolerance."""
+    import math
+    if tolerance <= 0:
+        raise ValueError("Tolerance must be positive")
+    return max(0, math.ceil(-math.log10(2 * tolerance) - 1e-12))
+
+
+def format_coordinates(values, decimals):
+    """Round and format coordinates without trailing zeros or '-0'."""
+    import numpy as np
+    texts = np.char.mod(f'%.{decimals}f', np.round(values, decimals) + 0.0)
+    if decimals:
+        texts = np.char.rstrip(np.char.rstrip(texts, '0'), '.')
+    texts[(texts == '-0') | (texts == '')] = '0'
+    return texts
+
+
+def minify_lines(lines, tolerance, comments='condense', stats=None):
+    """Yield a smaller copy of a program, MINIFY_CHUNK_LINES at a time.
+
+    LIN X/Y/Z values are rounded to the fewest decimals that keep every
+    coordinate within tolerance (checked, not assumed), whitespace runs
+    are collapsed and blank lines dropped. comments is 'keep', 'condense'
+    (one line per block of comment lines) or 'strip' (also trailing
+    comments). Lines containing strings are left as they are. stats,
+    if given, is filled with sizes, line counts and the largest change.
+    """
+    import numpy as np
+    decimals = tolerance_decimals(tolerance)
+    if stats is None:
+        stats = {}
+    stats.update(bytes_in=0, bytes_out=0, lines_in=len(lines), lines_out=0, coordinates=0, max_change=0.0)
+    previous_comment = False
+    
+    for first in range(0, len(lines), MINIFY_CHUNK_LINES):
+        chunk = [line.rstrip('\r\n') for line in lines[first:first + MINIFY_CHUNK_LINES]]
+        stats['bytes_in'] += sum(map(len, chunk)) + len(chunk)
+        
+        # All coordinates of the batch are rounded and checked as one array
+        pieces = {i: LIN_AXIS_PATTERN.split(line) for i, line in enumerate(chunk)
+                  if 'LIN' in line and '"' not in line}
+        numbers = [number for parts in pieces.values() for number in parts[2::3]]
+        if numbers:
+            values = np.array(numbers, dtype=float)
+            texts = format_coordinates(values, decimals)
+            change = float(np.abs(texts.astype(float) - values).max())
+            if change > tolerance + 1e-9:
+                raise ValueError(f"Rounding moved a coordinate by {change:g} mm")
+            stats['max_change'] = max(stats['max_change'], change)
+            stats['coordinates'] += len(numbers)
+            texts = texts.tolist()
+            position = 0
+            for i, parts in pieces.items():
+                count = len(parts) // 3
+                parts[2::3] = texts[position:position + count]
+                position += count
+                chunk[i] = ''.join(parts)
+        
+        output = []
+        for line in chunk:
+            if '"' not in line:
+                line = ' '.join(line.split())
+            if not line:
+                continue
+            if line.startswith(';'):
+                if comments == 'strip' or (comments == 'condense' and previous_comment):
+                    continue
+                previous_comment = True
+            else:
+                previous_comment = False
+                if comments == 'strip' and ';' in line and '"' not in line:
+                    line = line.split(';', 1)[0].rstrip()
+            output.append(line + '\n')
+        stats['bytes_out'] += sum(map(len, output))
+        stats['lines_out'] += len(output)
+        yield from output
+
+
+def plan_split(line_sizes, cuts, body_start, body_stop, max_lines, max_bytes):
+    """Group layers into parts that stay under the line and byte targets.
+
+    line_sizes holds the size of every line, cuts the sorted 0-based lines
+    where a layer may start a new part. Returns the first line of each
+    part; a single layer larger than a target becomes a part of its own.
+    """
+    import numpy as np
+    cumulative = np.r_[0, np.cumsum(line_sizes)]
+    bounds = [body_start] + [int(cut) for cut in cuts if body_start < cut < body_stop] + [body_stop]
+    starts = [body_start]
+    for cut, following in zip(bounds[1:-1], bounds[2:]):
+        if following - starts[-1] > max_lines or cumulative[following] - cumulative[starts[-1]] > max_bytes:
+            starts.append(cut)
+    return starts
+
+
+def format_duration(seconds):
+    """Format seconds as h:mm:ss."""
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def column_to_numpy(column):
+    """Copy an array.array column into a numpy array.
+
+    A copy rather than a frombuffer view is returned, so the column can
+    still grow while the numpy array is alive.
+    """
+    import numpy as np
+    return np.frombuffer(column, dtype=np.dtype(column.typecode)).copy()
+
+
+def shifted_column(column, shift):
+    """Copy of an array.array column with shift added to every entry."""
+    import numpy as np
+    dtype = np.dtype(column.typecode)
+    shifted = array(column.typecode)
+    shifted.frombytes((np.frombuffer(column, dtype=dtype) + shift).astype(dtype).tobytes())
+    return shifted
+
+
+def format_param_line(param_type, old_line, value):
+    """Rewrite a parameter line with a new value, keeping any TRIGGER prefix."""
+    if param_type in ('LAYER_COOLING', 'ACT_DRIVE') and "TRIGGER WHEN" in old_line:
+        aux = re.match(f"^(.+?){re.escape(param_type)}=", old_line).group(1)
+        return f"{aux}{param_type}={value}"
+    return f"{param_type}={value}"
+
+
+def check_value(param_type, value):
+    """Check one value against VALIDATION_RULES; returns (errors, warnings)."""
+    rule = VALIDATION_RULES.get(param_type, {})
+    errors = []
+    warnings = []
+    if 'enum' in rule:
+        if str(value).upper() not in rule['enum']:
+            errors.append(f"{param_type} can only be {' or '.join(rule['enum'])}")
+        return errors, warnings
+    if 'max' in rule and value > rule['max']:
+        errors.append(f"Maximum value for {param_type} is {rule['max']:g}")
+    if 'min' in rule and value < rule['min']:
+        errors.append(f"Minimum value for {param_type} is {rule['min']:g}")
+    if 'warn' in rule and value > rule['warn']:
+        warnings.append(f"Values above {rule['warn']:g} for {param_type} could be dangerous.")
+    return errors, warnings
+
+
+def value_violations(param_type, values, steps=True):
+    """Check an array of values (in file order) against VALIDATION_RULES.
+
+    Returns a list of (severity, indices, message) where severity is
+    'error' or 'warning'. Step violations point at the later value.
+    """
+    import numpy as np
+    rule = VALIDATION_RULES.get(param_type, {})
+    values = np.asarray(values, dtype=float)
+    found = []
+    
+    def add(severity, mask, message):
+        indices = np.flatnonzero(mask)
+        if len(indices):
+            found.append((severity, indices, message))
+    
+    add('error', ~np.isfinite(values), "is not a number")
+    if 'enum' in rule:
+        # Enumerations are stored as 1.0/0.0, as in ParamStore
+        allowed = [1.0 if value == 'TRUE' else 0.0 for value in rule['enum']]
+        add('error', ~np.isin(values, allowed), f"must be {' or '.join(rule['enum'])}")
+    if 'max' in rule:
+        add('error', values > rule['max'], f"is above the maximum of {rule['max']:g}")
+    if 'min' in rule:
+        add('error', values < rule['min'], f"is below the minimum of {rule['min']:g}")
+    if 'warn' in rule:
+        add('warning', values > rule['warn'], f"is above the warning level of {rule['warn']:g}")
+    if steps and rule.get('max_step') and len(values) > 1:
+        jumps = np.abs(np.diff(values)) > rule['max_step'] + 1e-9
+        add('warning', np.r_[False, jumps], f"changes by more than {rule['max_step']:g} from the previous value")
+    return found
+
+
+def param_value_from_float(param_type, value):
+    """Convert a stored float back to the value type used in the file."""
+    if param_type == 'ACT_DRIVE':
+        return 'TRUE' if value else 'FALSE'
+    if param_type in ('TOOL_RPM', 'LAYER_COOLING'):
+        return int(value)
+    return value
+
+
+class SRCIndex:
+    """Parsed view of a .src program.
+
+    Everything is kept in flat arrays so the index pickles into a compact
+    sidecar file for ParseCache.
+    """
+
+    def __init__(self):
+        self.version = CACHE_VERSION
+        self.line_count = 0
+        self.line_offsets = array('q')  # Character offset of each line start
+        # Parameter occurrences, one entry per parameter line
+        self.occ_lines = array('i')
+        self.occ_types = array('b')  # Index into PARAM_TYPES
+        self.occ_values = array('d')
+        self.occ_prefix_ids = array('i')  # Index into prefixes
+        self.prefixes = ['']  # Interned text before LAYER_COOLING= (e.g. 'TRIGGER ... DO ')
+        # Z/layer table: one row per LIN move
+        self.lin_lines = array('i')
+        self.lin_x = array('d')  # NaN where the move leaves X unchanged
+        self.lin_y = array('d')
+        self.lin_z = array('d')
+        self.layer_starts = array('i')  # First LIN row of each layer
+        # PRINT_PROGRESS percent -> line of its (first) trigger
+        self.progress_lines = {}
+        # TRIGGER ... DO ACT_DRIVE records keyed by line number
+        self.triggers = {}
+        # Header values shown in the File Settings frame
+        self.def_value = None
+        self.parkpos_value = None
+
+    @staticmethod
+    def parse_lines(lines, first_line=1):
+        """Parse a run of lines.
+
+        Returns (occurrences, lin_rows, triggers) where occurrences is a list
+        of (line_num, param_type, value, prefix), lin_rows a list of
+        (line_num, x, y, z) and triggers a dict of line_num -> trigger record.
+        """
+        occurrences = []
+        lin_rows = []
+        triggers = {}
+        
+        for line_num, line in enumerate(lines, first_line):
+            # Look for trigger parameters first
+            if 'TRIGGER' in line:
+                trigger_match = TRIGGER_PATTERN.search(line)
+                if trigger_match:
+                    value = 'TRUE' if trigger_match.group(3) == 'TRUE' else 'FALSE'
+                    occurrences.append((line_num, 'ACT_DRIVE', value, ''))
+                    triggers[line_num] = {
+                        'distance': float(trigger_match.group(1)),
+                        'delay': float(trigger_match.group(2)),
+                        'do': 'ACT_DRIVE',
+                        'value': value
+                    }
+                    continue
+            
+            # Look for other parameters
+            for param_type in PARAM_TYPES:
+                if param_type in line:
+                    match = PARAM_VALUE_PATTERNS[param_type].search(line)
+                    if match:
+                        if param_type == 'ACT_DRIVE':
+                            value = match.group(1)
+                        elif param_type == '$VEL.CP':
+                            value = float(match.group(1))
+                        else:
+                            value = int(match.group(1))
+                        prefix = line.split('LAYER_COOLING')[0] if param_type == 'LAYER_COOLING' else ''
+                        occurrences.append((line_num, param_type, value, prefix))
+                    break
+            
+            # Coordinates of LIN moves
+            coordinates = lin_coordinates(line)
+            if coordinates:
+                lin_rows.append((line_num,) + coordinates)
+        
+        return occurrences, lin_rows, triggers
+
+    @staticmethod
+    def find_progress(lines, first_line=1):
+        """Return (line_num, percent) for every PRINT_PROGRESS trigger."""
+        found = []
+        for line_num, line in enumerate(lines, first_line):
+            if 'PRINT_PROGRESS' in line:
+                match = PRINT_PROGRESS_PATTERN.search(line)
+                if match:
+                    found.append((line_num, int(match.group(1))))
+        return found
+
+    @classmethod
+    def build(cls, content):
+        """Parse the whole program into a new index."""
+        index = cls()
+        lines = content.splitlines()
+        index.line_count = len(lines)
+        
+        offset = 0
+        for line in content.splitlines(True):
+            index.line_offsets.append(offset)
+            offset += len(line)
+        
+        occurrences, lin_rows, triggers = cls.parse_lines(lines)
+        index.add_occurrences(occurrences)
+        index.add_lin_rows(lin_rows)
+        index.triggers = triggers
+        index.scan_lines(lines)
+        return index
+
+    def splice(self, lines, start, old_stop, new_stop, old_lines=None):
+        """New index for an edited program, re-parsing only the changed lines.
+
+        Lines start..old_stop-1 (0-based) of the indexed program were
+        replaced by lines[start:new_stop]; entries outside that span are
+        copied with their line numbers shifted. With the replaced old_lines,
+        progress triggers and header values are only rescanned when the
+        edit touches one.
+        """
+        index = SRCIndex()
+        index.line_count = len(lines)
+        shift = new_stop - old_stop
+        occurrences, lin_rows, triggers = self.parse_lines(lines[start:new_stop], start + 1)
+        
+        # Character offsets: head kept, changed span recomputed, tail shifted
+        index.line_offsets = self.line_offsets[:start]
+        if start < len(self.line_offsets):
+            offset = self.line_offsets[start]
+        elif start:
+            offset = self.line_offsets[start - 1] + len(lines[start - 1]) + 1
+        else:
+            offset = 0
+        for line in lines[start:new_stop]:
+            index.line_offsets.append(offset)
+            offset += len(line) + 1
+        if old_stop < len(self.line_offsets):
+            char_shift = offset - self.line_offsets[old_stop]
+            index.line_offsets.extend(shifted_column(self.line_offsets[old_stop:], char_shift))
+        
+        # Occurrences before, inside and after the span
+        head = bisect_left(self.occ_lines, start + 1)
+        tail = bisect_left(self.occ_lines, old_stop + 1)
+        index.prefixes = list(self.prefixes)
+        index.occ_lines = self.occ_lines[:head]
+        index.occ_types = self.occ_types[:head]
+        index.occ_values = self.occ_values[:head]
+        index.occ_prefix_ids = self.occ_prefix_ids[:head]
+        index.add_occurrences(occurrences)
+        index.occ_lines.extend(shifted_column(self.occ_lines[tail:], shift))
+        index.occ_types.extend(self.occ_types[tail:])
+        index.occ_values.extend(self.occ_values[tail:])
+        index.occ_prefix_ids.extend(self.occ_prefix_ids[tail:])
+        
+        # LIN rows, then layers over the whole table
+        head = bisect_left(self.lin_lines, start + 1)
+        tail = bisect_left(self.lin_lines, old_stop + 1)
+        index.lin_lines = self.lin_lines[:head]
+        index.lin_x = self.lin_x[:head]
+        index.lin_y = self.lin_y[:head]
+        index.lin_z = self.lin_z[:head]
+        for line_num, x, y, z in lin_rows:
+            index.lin_lines.append(line_num)
+            index.lin_x.append(x)
+            index.lin_y.append(y)
+            index.lin_z.append(z)
+        index.lin_lines.extend(shifted_column(self.lin_lines[tail:], shift))
+        index.lin_x.extend(self.lin_x[tail:])
+        index.lin_y.extend(self.lin_y[tail:])
+        index.lin_z.extend(self.lin_z[tail:])
+        index.find_layers()
+        
+        index.triggers = {line_num if line_num <= start else line_num + shift: trigger
+                          for line_num, trigger in self.triggers.items()
+                          if line_num <= start or line_num > old_stop}
+        index.triggers.update(triggers)
+        
+        span_lines = lines[start:new_stop]
+        if old_lines is None or any('PRINT_PROGRESS' in line for line in old_lines):
+            index.scan_lines(lines)
+            return index
+        index.progress_lines = {percent: line_num if line_num <= start else line_num + shift
+                                for percent, line_num in self.progress_lines.items()}
+        for line_num, percent in self.find_progress(span_lines, start + 1):
+            if line_num < index.progress_lines.get(percent, line_num + 1):
+                index.progress_lines[percent] = line_num
+        if any(line.startswith(("DEF ", "PARKPOS = ")) for line in list(old_lines) + span_lines):
+            index.scan_lines(lines)
+        else:
+            index.def_value = self.def_value
+            index.parkpos_value = self.parkpos_value
+        return index
+
+    def add_occurrences(self, occurrences):
+        """Append parsed (line_num, param_type, value, prefix) occurrences."""
+        prefix_ids = {prefix: prefix_id for prefix_id, prefix in enumerate(self.prefixes)}
+        for line_num, param_type, value, prefix in occurrences:
+            self.occ_lines.append(line_num)
+            self.occ_types.append(PARAM_TYPES.index(param_type))
+            if param_type == 'ACT_DRIVE':
+                self.occ_values.append(1.0 if value == 'TRUE' else 0.0)
+            else:
+                self.occ_values.append(float(value))
+            if prefix not in prefix_ids:
+                prefix_ids[prefix] = len(self.prefixes)
+                self.prefixes.append(prefix)
+            self.occ_prefix_ids.append(prefix_ids[prefix])
+
+    def add_lin_rows(self, lin_rows):
+        """Append parsed (line_num, x, y, z) rows, extending layer_starts."""
+        last_z = self.lin_z[-1] if self.lin_z else None
+        for line_num, x, y, z in lin_rows:
+            if last_z is None or abs(z - last_z) > 1e-9:
+                self.layer_starts.append(len(self.lin_z))
+            last_z = z
+            self.lin_lines.append(line_num)
+            self.lin_x.append(x)
+            self.lin_y.append(y)
+            self.lin_z.append(z)
+
+    def find_layers(self):
+        """Recompute layer_starts from lin_z."""
+        import numpy as np
+        z = np.frombuffer(self.lin_z, dtype=np.float64)
+        self.layer_starts = array('i')
+        if len(z):
+            starts = np.flatnonzero(np.r_[True, np.abs(np.diff(z)) > 1e-9]).astype(np.dtype('i'))
+            self.layer_starts.frombytes(starts.tobytes())
+
+    def scan_lines(self, lines):
+        """Progress triggers and header values, which need the whole program."""
+        self.progress_lines = {}
+        for line_num, percent in self.find_progress(lines):
+            self.progress_lines.setdefault(percent, line_num)
+        
+        for line in lines:
+            if line.startswith("DEF "):
+                self.def_value = line[len("DEF "):].strip()
+            elif line.startswith("PARKPOS = "):
+                self.parkpos_value = line.split("PARKPOS = ", 1)[1]
+
+    def occurrences(self):
+        """Yield (line_num, param_type, value, prefix) in file order."""
+        for i in range(len(self.occ_lines)):
+            param_type = PARAM_TYPES[self.occ_types[i]]
+            value = param_value_from_float(param_type, self.occ_values[i])
+            yield self.occ_lines[i], param_type, value, self.prefixes[self.occ_prefix_ids[i]]
+
+
+class MotionTable:
+    """Z height and layer of every LIN move, as numpy arrays.
+
+    lines holds the line number of each LIN move, z its height and
+    layer_starts the first row of each layer. Used to place parameter
+    occurrences in the print without rescanning the program.
+    """
+
+    def __init__(self, lines, z, x=None, y=None):
+        import numpy as np
+        self.lines = lines
+        self.z = z
+        # As parsed (NaN where a move leaves the axis unchanged), for splice
+        self.raw_x = x if x is not None else np.zeros(len(z))
+        self.raw_y = y if y is not None else np.zeros(len(z))
+        self.x = self.forward_fill(self.raw_x)
+        self.y = self.forward_fill(self.raw_y)
+        self._cumulative_length = None
+        if len(z):
+            self.layer_starts = np.flatnonzero(np.r_[True, np.abs(np.diff(z)) > 1e-9])
+        else:
+            self.layer_starts = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_index(cls, index):
+        return cls(column_to_numpy(index.lin_lines), column_to_numpy(index.lin_z),
+                   column_to_numpy(index.lin_x), column_to_numpy(index.lin_y))
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Scan the program for LIN moves."""
+        import numpy as np
+        lin_lines = array('i')
+        lin_x = array('d')
+        lin_y = array('d')
+        lin_z = array('d')
+        for line_num, line in enumerate(lines, 1):
+            coordinates = lin_coordinates(line)
+            if coordinates:
+                lin_lines.append(line_num)
+                lin_x.append(coordinates[0])
+                lin_y.append(coordinates[1])
+                lin_z.append(coordinates[2])
+        return cls(column_to_numpy(lin_lines), column_to_numpy(lin_z),
+                   column_to_numpy(lin_x), column_to_numpy(lin_y))
+
+    def splice(self, start, stop, new_stop, lin_rows):
+        """Table after lines start..stop-1 were replaced by lines start..new_stop-1.
+
+        lin_rows are the (line_num, x, y, z) moves parsed from the new
+        lines; rows above the edit are kept and rows below it shifted.
+        """
+        import numpy as np
+        head = np.searchsorted(self.lines, start, side='left')
+        tail = np.searchsorted(self.lines, stop, side='left')
+        rows = np.array(lin_rows, dtype=float).reshape(-1, 4)
+        lines = np.concatenate([self.lines[:head], rows[:, 0].astype(self.lines.dtype),
+                                self.lines[tail:] + (new_stop - stop)])
+        
+        def column(values, index):
+            return np.concatenate([values[:head], rows[:, index], values[tail:]])
+        return MotionTable(lines, column(self.z, 3), column(self.raw_x, 1), column(self.raw_y, 2))
+
+    @staticmethod
+    def forward_fill(values):
+        """Replace NaNs with the last known value (leading NaNs with the first)."""
+        import numpy as np
+        missing = np.isnan(values)
+        if not missing.any():
+            return values
+        if missing.all():
+            return np.zeros(len(values))
+        positions = np.where(missing, 0, np.arange(len(values)))
+        np.maximum.accumulate(positions, out=positions)
+        filled = values[positions]
+        first = np.flatnonzero(~missing)[0]
+        filled[:first] = values[first]
+        return filled
+
+    def cumulative_length(self):
+        """Path length travelled at the end of each LIN move."""
+        import numpy as np
+        if self._cumulative_length is None:
+            if len(self.z) < 2:
+                self._cumulative_length = np.zeros(len(self.z))
+            else:
+                steps = np.sqrt(np.diff(self.x) ** 2 + np.diff(self.y) ** 2 + np.diff(self.z) ** 2)
+                self._cumulative_length = np.r_[0.0, np.cumsum(steps)]
+        return self._cumulative_length
+
+    def progress_rows(self, percents):
+        """First LIN row at which each percentage of the path is reached.
+
+        Falls back to the move count when the moves have no length.
+        """
+        import numpy as np
+        percents = np.asarray(percents, dtype=float)
+        cumulative = self.cumulative_length()
+        if not len(cumulative):
+            return np.zeros(len(percents), dtype=np.int64)
+        if cumulative[-1] <= 0:
+            cumulative = np.arange(len(cumulative), dtype=float)
+        targets = percents / 100.0 * cumulative[-1]
+        rows = np.searchsorted(cumulative, targets - 1e-9, side='left')
+        return np.minimum(rows, len(cumulative) - 1)
+
+    @property
+    def layer_count(self):
+        return len(self.layer_starts)
+
+    def rows_at(self, line_numbers):
+        """Row of the last LIN move at or before each line.
+
+        Lines before the first move are treated as part of the first layer.
+        """
+        import numpy as np
+        rows = np.searchsorted(self.lines, line_numbers, side='right') - 1
+        return np.maximum(rows, 0)
+
+    def placement(self, line_numbers):
+        """Return (z, layer, progress) arrays for the given line numbers.
+
+        progress is the share of the path length travelled (0-1).
+        """
+        import numpy as np
+        line_numbers = np.asarray(line_numbers)
+        if not len(self.z):
+            zeros = np.zeros(len(line_numbers))
+            return zeros, zeros.astype(np.int64), zeros
+        rows = self.rows_at(line_numbers)
+        layer = np.searchsorted(self.layer_starts, rows, side='right') - 1
+        
+        # Share of the path length, as for the PRINT_PROGRESS triggers
+        cumulative = self.cumulative_length()
+        if cumulative[-1] > 0:
+            progress = cumulative[rows] / cumulative[-1]
+        else:
+            progress = rows / max(len(self.z) - 1, 1)
+        return self.z[rows], layer, progress
+
+
+class RangeStats:
+    """Segment tree of min, max, weighted sum and weight over an array.
+
+    Any index range is answered in O(log n) and a single value is
+    replaced in O(log n). Entries with zero weight are left out of min
+    and max.
+    """
+
+    def __init__(self, values, weights):
+        import numpy as np
+        count = len(values)
+        self.size = size = 1 << max(count - 1, 0).bit_length()
+        self.low = np.full(2 * size, np.inf)
+        self.high = np.full(2 * size, -np.inf)
+        self.total = np.zeros(2 * size)
+        self.weight = np.zeros(2 * size)
+        
+        values = np.asarray(values, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        present = weights > 0
+        self.low[size:size + count] = np.where(present, values, np.inf)
+        self.high[size:size + count] = np.where(present, values, -np.inf)
+        self.total[size:size + count] = values * weights
+        self.weight[size:size + count] = weights
+        
+        # Fill the tree one level at a time
+        level = size // 2
+        while level:
+            nodes = np.arange(level, 2 * level)
+            self.low[nodes] = np.minimum(self.low[2 * nodes], self.low[2 * nodes + 1])
+            self.high[nodes] = np.maximum(self.high[2 * nodes], self.high[2 * nodes + 1])
+            self.total[nodes] = self.total[2 * nodes] + self.total[2 * nodes + 1]
+            self.weight[nodes] = self.weight[2 * nodes] + self.weight[2 * nodes + 1]
+            level //= 2
+
+    def query(self, start, stop):
+        """(min, max, weighted sum, weight) of entries start..stop-1."""
+        low, high, total, weight = float('inf'), float('-inf'), 0.0, 0.0
+        start += self.size
+        stop += self.size
+        while start < stop:
+            if start & 1:
+                low = min(low, self.low[start])
+                high = max(high, self.high[start])
+                total += self.total[start]
+                weight += self.weight[start]
+                start += 1
+            if stop & 1:
+                stop -= 1
+                low = min(low, self.low[stop])
+                high = max(high, self.high[stop])
+                total += self.total[stop]
+                weight += self.weight[stop]
+            start //= 2
+            stop //= 2
+        return float(low), float(high), float(total), float(weight)
+
+    def update(self, index, value):
+        """Replace one value, keeping its weight."""
+        node = index + self.size
+        weight = self.weight[node]
+        if weight > 0:
+            self.low[node] = self.high[node] = value
+        self.total[node] = value * weight
+        node //= 2
+        while node:
+            left, right = 2 * node, 2 * node + 1
+            self.low[node] = min(self.low[left], self.low[right])
+            self.high[node] = max(self.high[left], self.high[right])
+            self.total[node] = self.total[left] + self.total[right]
+            node //= 2
+
+
+class EffectiveTimeline:
+    """Value of every parameter in effect at any line or Z height.
+
+    For each parameter the assignments in file order are kept as numpy
+    arrays of IDs, lines and values, and every LIN move holds the index
+    of the assignment in force there (a forward fill), so per-move values
+    are a single gather. Lines and heights are looked up with
+    searchsorted, and range statistics come from a RangeStats per
+    parameter, weighted by the number of moves each assignment covers.
+    A changed value is patched in place; anything that moves lines needs
+    a new timeline.
+    """
+
+    def __init__(self, changes, motion):
+        """changes maps each parameter to (param_ids, lines, values)."""
+        import numpy as np
+        self.motion = motion
+        self.ids = {}
+        self.lines = {}
+        self.values = {}
+        self.fill = {}
+        self.trees = {}  # param_type -> RangeStats, built on first query
+        self.positions = {}  # param_id -> (param_type, index)
+        for param_type, (param_ids, lines, values) in changes.items():
+            self.ids[param_type] = param_ids
+            self.lines[param_type] = lines
+            self.values[param_type] = np.asarray(values, dtype=float)
+            self.fill[param_type] = np.searchsorted(lines, motion.lines, side='right') - 1
+            self.positions.update((param_id, (param_type, index))
+                                  for index, param_id in enumerate(param_ids.tolist()))
+        # Highest Z reached so far at each move, for height lookups
+        self.z_reached = np.maximum.accumulate(motion.z) if len(motion.z) else motion.z
+
+    def changes(self, param_type):
+        """Lines and values of a parameter's assignments (values copied)."""
+        return self.lines[param_type], self.values[param_type].copy()
+
+    def value_at(self, param_type, line_numbers, default=float('nan')):
+        """Value in force at one line or an array of lines (default before the first)."""
+        import numpy as np
+        values = effective_values(self.lines[param_type], self.values[param_type],
+                                  np.atleast_1d(line_numbers), default)
+        return values if np.ndim(line_numbers) else float(values[0])
+
+    def move_values(self, param_type, default=float('nan')):
+        """Value in force at every LIN move."""
+        import numpy as np
+        fill = self.fill[param_type]
+        values = self.values[param_type]
+        if not len(values):
+            return np.full(len(fill), default)
+        return np.where(fill >= 0, values[np.maximum(fill, 0)], default)
+
+    def value_at_z(self, param_type, z, default=float('nan')):
+        """Value in force at the first move that reaches each height."""
+        import numpy as np
+        if not len(self.z_reached):
+            return np.full(np.shape(z), default) if np.ndim(z) else default
+        rows = np.minimum(np.searchsorted(self.z_reached, np.atleast_1d(z) - 1e-9, side='left'),
+                          len(self.z_reached) - 1)
+        fill = self.fill[param_type][rows]
+        values = self.values[param_type]
+        if len(values):
+            values = np.where(fill >= 0, values[np.maximum(fill, 0)], default)
+        else:
+            values = np.full(len(rows), default)
+        return values if np.ndim(z) else float(values[0])
+
+    def rows_between_lines(self, first_line, last_line):
+        """Move rows whose LIN line lies in first_line..last_line."""
+        import numpy as np
+        lines = self.motion.lines
+        return (int(np.searchsorted(lines, first_line, side='left')),
+                int(np.searchsorted(lines, last_line, side='right')))
+
+    def rows_between_z(self, z_low, z_high):
+        """Move rows from the first reaching z_low to the last before passing z_high."""
+        import numpy as np
+        return (int(np.searchsorted(self.z_reached, z_low - 1e-9, side='left')),
+                int(np.searchsorted(self.z_reached, z_high + 1e-9, side='right')))
+
+    def rows_of_layers(self, first_layer, last_layer):
+        """Move rows of layers first_layer..last_layer (0-based)."""
+        starts = self.motion.layer_starts
+        stop = starts[last_layer + 1] if last_layer + 1 < len(starts) else len(self.motion.z)
+        return int(starts[first_layer]), int(stop)
+
+    def range_stats(self, param_type, start, stop):
+        """Statistics of a parameter over move rows start..stop-1.
+
+        Returns a dict with min, max and mean over the moves that have a
+        value, 'moves' (how many do) and 'changes' (assignments taking
+        effect inside the range). min, max and mean are NaN when no move
+        has a value.
+        """
+        import numpy as np
+        fill = self.fill[param_type]
+        values = self.values[param_type]
+        start, stop = max(start, 0), min(stop, len(fill))
+        stats = {'min': float('nan'), 'max': float('nan'), 'mean': float('nan'), 'moves': 0, 'changes': 0}
+        if start >= stop or not len(values):
+            return stats
+        
+        tree = self.trees.get(param_type)
+        if tree is None:
+            weights = np.bincount(fill[fill >= 0], minlength=len(values))
+            tree = self.trees[param_type] = RangeStats(values, weights)
+        
+        # The first and last assignment may only partly overlap the range
+        first, last = int(fill[start]), int(fill[stop - 1])
+        stats['changes'] = last - first
+        low, high, total, weight = tree.query(first + 1, last) if last > first + 1 else (
+            float('inf'), float('-inf'), 0.0, 0.0)
+        ends = {last: stop - start} if first == last else {
+            first: int(np.searchsorted(fill, first, side='right')) - start,
+            last: stop - int(np.searchsorted(fill, last, side='left'))}
+        for index, moves in ends.items():
+            if index >= 0 and moves > 0:
+                low = min(low, values[index])
+                high = max(high, values[index])
+                total += values[index] * moves
+                weight += moves
+        if weight:
+            stats.update({'min': float(low), 'max': float(high), 'mean': total / weight, 'moves': int(weight)})
+        return stats
+
+    def shift_lines(self, first_line, shift, motion):
+        """Move assignments at or below first_line by shift lines.
+
+        Only valid when the edit left every assignment and LIN move in
+        the same order, so the forward fill still holds.
+        """
+        for lines in self.lines.values():
+            lines[lines >= first_line] += shift
+        self.motion = motion
+
+    def update_value(self, param_id, value):
+        """Record a new value for one assignment."""
+        param_type, index = self.positions[param_id]
+        self.values[param_type][index] = value
+        if param_type in self.trees:
+            self.trees[param_type].update(index, value)
+
+
+class PrintTimeEstimator:
+    """Per-move time for a MotionTable under a trapezoidal speed profile.
+
+    Move i runs from row i-1 to row i at its effective $VEL.CP. It
+    accelerates and decelerates at a fixed rate between junction speeds,
+    which fall with the angle between consecutive moves (full speed when
+    straight, zero on a right angle or sharper) and are capped by what the
+    neighbouring moves can reach. Times can be refreshed for just the
+    moves whose speed changed.
+    """
+
+    def __init__(self, motion, acceleration=DEFAULT_ACCELERATION):
+        import numpy as np
+        self.motion = motion
+        self.acceleration = float(acceleration)
+        
+        # Geometry never changes for a given motion table
+        count = len(motion.z)
+        deltas = np.zeros((count, 3))
+        if count > 1:
+            deltas[1:, 0] = np.diff(motion.x)
+            deltas[1:, 1] = np.diff(motion.y)
+            deltas[1:, 2] = np.diff(motion.z)
+        self.lengths = np.sqrt((deltas ** 2).sum(axis=1))
+        
+        # Cosine of the turn at the end of each move (0 at the last move)
+        self.junction_cos = np.zeros(count)
+        if count > 2:
+            dots = (deltas[1:-1] * deltas[2:]).sum(axis=1)
+            norms = self.lengths[1:-1] * self.lengths[2:]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.junction_cos[1:-1] = np.where(norms > 0, dots / norms, 0.0)
+        np.clip(self.junction_cos, 0.0, 1.0, out=self.junction_cos)
+        
+        # Cap junction speeds so that either neighbouring move can reach
+        # them (or stop) within half its length; with that, every move's
+        # profile is feasible without a sequential planner pass
+        self.junction_cap = np.zeros(count)
+        if count > 2:
+            self.junction_cap[1:-1] = np.sqrt(self.acceleration * np.minimum(self.lengths[1:-1], self.lengths[2:]))
+        
+        self.speeds = np.zeros(count)
+        self.times = np.zeros(count)
+
+    def segment_times(self, start, stop, speeds=None):
+        """Times of moves start..stop-1 for the current (or given) speeds."""
+        import numpy as np
+        if speeds is None:
+            speeds = self.speeds
+        count = len(speeds)
+        accel = self.acceleration
+        speed = speeds[start:stop]
+        length = self.lengths[start:stop]
+        
+        # Junction speed at the end of each move, and at the start (the
+        # previous move's end)
+        following = speeds[min(start + 1, count):min(stop + 1, count)]
+        following = np.r_[following, np.zeros(len(speed) - len(following))]
+        exit_speed = np.minimum(np.minimum(speed, following) * self.junction_cos[start:stop],
+                                self.junction_cap[start:stop])
+        if start > 0:
+            previous_exit = min(min(speeds[start - 1], speeds[start]) * self.junction_cos[start - 1],
+                                self.junction_cap[start - 1])
+        else:
+            previous_exit = 0.0
+        entry_speed = np.r_[previous_exit, exit_speed[:-1]] if len(speed) else exit_speed
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ramp = (2 * speed ** 2 - entry_speed ** 2 - exit_speed ** 2) / (2 * accel)
+            cruise_time = (speed - entry_speed) / accel + (speed - exit_speed) / accel + \
+                (length - ramp) / speed
+            # Too short to reach full speed: accelerate to a lower peak
+            peak = np.sqrt((2 * accel * length + entry_speed ** 2 + exit_speed ** 2) / 2)
+            peak_time = (2 * peak - entry_speed - exit_speed) / accel
+        times = np.where(ramp <= length, cruise_time, peak_time)
+        times[(length <= 0) | (speed <= 0)] = 0.0
+        return times
+
+    def set_speeds(self, speeds):
+        """Use new per-move speeds (mm/s), recomputing only what changed.
+
+        Returns the number of moves recomputed.
+        """
+        import numpy as np
+        speeds = np.asarray(speeds, dtype=float)
+        changed = np.flatnonzero(speeds != self.speeds)
+        if not len(changed):
+            return 0
+        self.speeds = speeds.copy()
+        
+        # A speed change also moves the junctions on either side
+        runs = np.zeros(len(speeds), dtype=bool)
+        runs[changed] = True
+        runs[np.maximum(changed - 1, 0)] = True
+        runs[np.minimum(changed + 1, len(speeds) - 1)] = True
+        edges = np.flatnonzero(np.diff(np.r_[0, runs.astype(np.int8), 0]))
+        for start, stop in zip(edges[::2], edges[1::2]):
+            self.times[start:stop] = self.segment_times(start, stop)
+        return int(runs.sum())
+
+    def total_time(self):
+        return float(self.times.sum())
+
+    def layer_times(self, times=None):
+        """Time spent in each layer (moves counted in the layer they end in)."""
+        import numpy as np
+        if times is None:
+            times = self.times
+        if not len(times):
+            return np.zeros(0)
+        return np.add.reduceat(times, self.motion.layer_starts)
+
+    def layer_times_at(self, layer_speeds):
+        """Per-layer times if every move in layer i ran at layer_speeds[i] (mm/s)."""
+        import numpy as np
+        move_layers = np.repeat(np.arange(len(layer_speeds)),
+                                np.diff(np.r_[self.motion.layer_starts, len(self.speeds)]))
+        return self.layer_times(self.segment_times(0, len(self.speeds), np.asarray(layer_speeds)[move_layers]))
+
+
+def simulate_triggers(motion, move_times, trigger_lines, distances, delays):
+    """Where each TRIGGER WHEN DISTANCE=.. DELAY=.. fires along the path.
+
+    A trigger refers to the first LIN move after its line: DISTANCE=0 is
+    the start point of that move and DISTANCE=1 its end point. DELAY then
+    shifts the switching point in time, which is placed on the path using
+    the per-move times (move i runs from row i-1 to row i, at constant
+    speed within the move). Returns a dict of arrays: row (move it fires
+    in), line (that move's LIN line), length (mm of path), x, y, z and
+    time (s from the first move).
+    """
+    import numpy as np
+    trigger_lines = np.asarray(trigger_lines, dtype=np.int64)
+    count = len(motion.z)
+    if not count or not len(trigger_lines):
+        empty = np.zeros(len(trigger_lines))
+        return {'row': empty.astype(np.int64), 'line': empty.astype(np.int64), 'length': empty,
+                'x': empty, 'y': empty, 'z': empty, 'time': empty}
+    
+    move_times = np.asarray(move_times, dtype=float)
+    end_times = np.cumsum(move_times)
+    path_lengths = motion.cumulative_length()
+    
+    # Reference point: end of the move before the next LIN, or of the next LIN
+    following = np.searchsorted(motion.lines, trigger_lines, side='right')
+    reference = np.clip(np.where(np.asarray(distances) >= 1, following, following - 1), 0, count - 1)
+    fire_time = np.minimum(end_times[reference] + np.asarray(delays, dtype=float) * TRIGGER_DELAY_TO_S,
+                           end_times[-1])
+    
+    # First move that ends at or after the firing time; moves that take no
+    # time before the reference point do not pull it back
+    row = np.maximum(np.searchsorted(end_times, fire_time, side='left'), reference)
+    row = np.minimum(row, count - 1)
+    previous = np.maximum(row - 1, 0)
+    start_time = np.where(row > 0, end_times[previous], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(move_times[row] > 0, (fire_time - start_time) / move_times[row], 1.0)
+    np.clip(fraction, 0.0, 1.0, out=fraction)
+    
+    def interpolate(values):
+        return values[previous] + fraction * (values[row] - values[previous])
+    
+    return {'row': row, 'line': motion.lines[row], 'length': interpolate(path_lengths),
+            'x': interpolate(motion.x), 'y': interpolate(motion.y), 'z': interpolate(motion.z),
+            'time': np.maximum(fire_time, 0.0)}
+
+
+def optimize_layer_speeds(estimator, min_layer_time, min_speed, max_speed, max_step, iterations=30):
+    """Highest $VEL.CP per layer that keeps every layer above min_layer_time.
+
+    Speeds are in m/s and rounded down to 4 decimals. Each layer's cap is
+    found by bisection (all layers at once, since layer time falls as the
+    speed rises). The caps are then lowered so adjacent layers differ by at
+    most max_step; the largest such schedule is min over k of
+    cap[k] + max_step * |i - k|, computed with two running minimums.
+
+    Returns (speeds, too_fast) where too_fast marks layers that are shorter
+    than min_layer_time even at min_speed.
+    """
+    import numpy as np
+    layer_count = estimator.motion.layer_count
+    low = np.full(layer_count, float(min_speed))
+    high = np.full(layer_count, float(max_speed))
+    
+    fast_times = estimator.layer_times_at(high * VEL_CP_TO_MM_S)
+    slow_times = estimator.layer_times_at(low * VEL_CP_TO_MM_S)
+    search = (fast_times < min_layer_time) & (slow_times >= min_layer_time)
+    for _ in range(iterations):
+        if not search.any():
+            break
+        middle = np.where(search, (low + high) / 2, high)
+        slow_enough = estimator.layer_times_at(middle * VEL_CP_TO_MM_S) >= min_layer_time
+        low = np.where(search & slow_enough, middle, low)
+        high = np.where(search & ~slow_enough, middle, high)
+    caps = np.where(fast_times >= min_layer_time, high, low)
+    too_fast = slow_times < min_layer_time
+    
+    # Work in 0.0001 m/s steps so rounding cannot break the step limit
+    caps = np.floor(caps * 10000 + 1e-6)
+    step = np.floor(max_step * 10000 + 1e-6)
+    positions = np.arange(layer_count) * step
+    forward = np.minimum.accumulate(caps - positions) + positions
+    backward = (np.minimum.accumulate((caps + positions)[::-1]) - positions[::-1])[::-1]
+    speeds = np.minimum(forward, backward) / 10000
+    return speeds, too_fast
+
+
+def longest_increasing_run(values):
+    """Indices of a longest strictly increasing subsequence (patience sorting)."""
+    tails = []  # Smallest tail value of an increasing run of each length
+    tail_indices = []
+    previous = [-1] * len(values)
+    for i, value in enumerate(values):
+        k = bisect_left(tails, value)
+        if k:
+            previous[i] = tail_indices[k - 1]
+        if k == len(tails):
+            tails.append(value)
+            tail_indices.append(i)
+        else:
+            tails[k] = value
+            tail_indices[k] = i
+    result = []
+    i = tail_indices[-1] if tail_indices else -1
+    while i >= 0:
+        result.append(i)
+        i = previous[i]
+    return result[::-1]
+
+
+def diff_lines(old_lines, new_lines):
+    """Changed regions between two lists of lines.
+
+    Lines are hashed to integers first. Lines that occur exactly once on
+    both sides are matched as anchors (patience diff); the gaps between
+    anchors are compared with numpy, and only gaps that really differ are
+    handed to difflib. Returns a list of (tag, i1, i2, j1, j2) opcodes
+    like difflib's, without the 'equal' ones.
+    """
+    import numpy as np
+    ids = {}
+    old = np.fromiter((ids.setdefault(line, len(ids)) for line in old_lines), dtype=np.int64, count=len(old_lines))
+    new = np.fromiter((ids.setdefault(line, len(ids)) for line in new_lines), dtype=np.int64, count=len(new_lines))
+    
+    # Anchors: lines unique on both sides, kept in an order valid for both
+    unique = (np.bincount(old, minlength=len(ids)) == 1) & (np.bincount(new, minlength=len(ids)) == 1)
+    new_position = np.full(len(ids), -1, dtype=np.int64)
+    new_position[new] = np.arange(len(new))
+    anchor_old = np.flatnonzero(unique[old])
+    anchor_new = new_position[old[anchor_old]]
+    if len(anchor_new) > 1 and not (np.diff(anchor_new) > 0).all():
+        keep = longest_increasing_run(anchor_new.tolist())
+        anchor_old = anchor_old[keep]
+        anchor_new = anchor_new[keep]
+    anchor_old = np.r_[-1, anchor_old, len(old)]
+    anchor_new = np.r_[-1, anchor_new, len(new)]
+    
+    # Gaps between anchors; equal-sized gaps are compared in one go
+    gap_old = np.diff(anchor_old) - 1
+    gap_new = np.diff(anchor_new) - 1
+    candidates = np.flatnonzero((gap_old > 0) | (gap_new > 0))
+    same_size = candidates[gap_old[candidates] == gap_new[candidates]]
+    if len(same_size):
+        sizes = gap_old[same_size]
+        same_size = same_size[sizes > 0]
+        sizes = sizes[sizes > 0]
+        starts = np.r_[0, np.cumsum(sizes)[:-1]]
+        offsets = np.arange(sizes.sum()) - np.repeat(starts, sizes)
+        equal = old[np.repeat(anchor_old[same_size] + 1, sizes) + offsets] == \
+            new[np.repeat(anchor_new[same_size] + 1, sizes) + offsets]
+        unchanged = np.logical_and.reduceat(equal, starts) if len(starts) else np.zeros(0, dtype=bool)
+        candidates = np.setdiff1d(candidates, same_size[unchanged])
+    
+    changes = []
+    for gap in candidates.tolist():
+        i1 = int(anchor_old[gap]) + 1
+        i2 = int(anchor_old[gap + 1])
+        j1 = int(anchor_new[gap]) + 1
+        j2 = int(anchor_new[gap + 1])
+        if i1 == i2 or j1 == j2:
+            changes.append(('insert' if i1 == i2 else 'delete', i1, i2, j1, j2))
+            continue
+        matcher = difflib.SequenceMatcher(None, old[i1:i2].tolist(), new[j1:j2].tolist(), autojunk=False)
+        for tag, a1, a2, b1, b2 in matcher.get_opcodes():
+            if tag != 'equal':
+                changes.append((tag, i1 + a1, i1 + a2, j1 + b1, j1 + b2))
+    return changes
+
+
+def diff_hunks(changes, old_count, new_count, context=DIFF_CONTEXT):
+    """Group changes whose context overlaps into hunks.
+
+    Returns a list of (i1, i2, j1, j2, changes) covering each hunk's
+    lines (with context) on both sides.
+    """
+    hunks = []
+    for change in changes:
+        tag, i1, i2, j1, j2 = change
+        start_old = max(i1 - context, 0)
+        start_new = max(j1 - context, 0)
+        if hunks and start_old <= hunks[-1][1]:
+            hunks[-1][1] = min(i2 + context, old_count)
+            hunks[-1][3] = min(j2 + context, new_count)
+            hunks[-1][4].append(change)
+        else:
+            hunks.append([start_old, min(i2 + context, old_count), start_new, min(j2 + context, new_count), [change]])
+    return [tuple(hunk) for hunk in hunks]
+
+
+def line_key(line):
+    """What a line is matched by when a patch is replayed.
+
+    Parameter lines match by parameter type (their value may differ),
+    other lines by their text.
+    """
+    occurrences, _, _ = SRCIndex.parse_lines([line])
+    return occurrences[0][1] if occurrences else line.strip()
+
+
+class LayerAnchors:
+    """Semantic anchors for the lines of a program.
+
+    A line is anchored by the Z of its layer (plus how many earlier layers
+    share that Z), its line_key and how many lines with that key precede
+    it in the layer. PRINT_PROGRESS triggers are anchored by percent. A
+    line belongs to the layer of the last LIN move at or before it.
+    """
+
+    def __init__(self, lines, motion, key_lines):
+        import numpy as np
+        self.lines = lines
+        self.key_lines = key_lines  # Parameter type -> sorted line numbers
+        if len(motion.lines):
+            self.region_starts = motion.lines[motion.layer_starts].astype(np.int64)
+            self.region_starts[0] = 1
+            layer_z = motion.z[motion.layer_starts].tolist()
+        else:
+            self.region_starts = np.ones(1, dtype=np.int64)
+            layer_z = [None]
+        self.keys = []
+        seen = {}
+        for z in layer_z:
+            z = round(z, 4) if z is not None else None
+            self.keys.append((z, seen.get(z, 0)))
+            seen[z] = seen.get(z, 0) + 1
+        self.layers = {key: layer for layer, key in enumerate(self.keys)}
+
+    def region(self, layer):
+        """First and one-past-last line of a layer."""
+        stop = self.region_starts[layer + 1] if layer + 1 < len(self.region_starts) else len(self.lines) + 1
+        return int(self.region_starts[layer]), int(stop)
+
+    def anchor(self, line_num):
+        """Anchor for a 1-based line number (0 means the start of the file)."""
+        import numpy as np
+        if line_num == 0:
+            return {'start': True}
+        line = self.lines[line_num - 1]
+        progress = PRINT_PROGRESS_PATTERN.search(line)
+        if progress:
+            return {'progress': int(progress.group(1))}
+        layer = max(int(np.searchsorted(self.region_starts, line_num, side='right')) - 1, 0)
+        start, _ = self.region(layer)
+        key = line_key(line)
+        if key in self.key_lines:
+            key_lines = self.key_lines[key]
+            nth = int(np.searchsorted(key_lines, line_num) - np.searchsorted(key_lines, start))
+        else:
+            nth = sum(1 for other in self.lines[start - 1:line_num - 1] if other.strip() == key)
+        z, repeat = self.keys[layer]
+        return {'z': z, 'repeat': repeat, 'key': key, 'nth': nth}
+
+    def resolve(self, anchor, progress_index):
+        """Line number an anchor points at in this program, or None."""
+        import numpy as np
+        if anchor.get('start'):
+            return 0
+        if 'progress' in anchor:
+            return progress_index.get(anchor['progress'])
+        z = round(anchor['z'], 4) if anchor['z'] is not None else None
+        layer = self.layers.get((z, anchor['repeat']))
+        if layer is None:
+            return None
+        start, stop = self.region(layer)
+        key, nth = anchor['key'], anchor['nth']
+        if key in self.key_lines:
+            key_lines = self.key_lines[key]
+            position = int(np.searchsorted(key_lines, start)) + nth
+            if position < len(key_lines) and key_lines[position] < stop:
+                return int(key_lines[position])
+            return None
+        for line_num in range(start, stop):
+            if self.lines[line_num - 1].strip() == key:
+                if nth == 0:
+                    return line_num
+                nth -= 1
+        return None
+
+
+class ParamExpression:
+    """A rule like 'TOOL_RPM = 80 + 0.4*z', evaluated over numpy arrays.
+
+    Only arithmetic, comparisons, boolean operators, conditional
+    expressions and a few numpy functions are allowed. Conditionals and
+    boolean operators are rewritten to np.where/np.logical_* so that the
+    rule is evaluated element-wise over every occurrence in one go.
+    """
+
+    FUNCTIONS = ('abs', 'min', 'max', 'clip', 'where', 'round', 'floor', 'ceil', 'sqrt', 'exp', 'log')
+    ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.BoolOp, ast.IfExp,
+                     ast.Call, ast.Name, ast.Load, ast.Constant,
+                     ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+                     ast.USub, ast.UAdd, ast.Not, ast.And, ast.Or,
+                     ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+
+    def __init__(self, text, variables):
+        # Accept "TARGET = expression" or a bare expression
+        target, sep, expression = text.partition('=')
+        if sep and expression[:1] != '=' and target.strip() and re.fullmatch(r'[\w.$]+', target.strip()):
+            self.target = target.strip()
+        else:
+            self.target, expression = None, text
+        self.text = expression.strip()
+        self.variables = tuple(variables)
+        
+        tree = ast.parse(self.text, mode='eval')
+        for node in ast.walk(tree):
+            if not isinstance(node, self.ALLOWED_NODES):
+                raise ValueError(f"'{type(node).__name__}' is not allowed in a rule")
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                raise ValueError("Only numeric constants are allowed in a rule")
+            if isinstance(node, ast.Name) and node.id not in self.variables and node.id not in self.FUNCTIONS:
+                raise ValueError(f"Unknown name '{node.id}' (use {', '.join(self.variables)})")
+            if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name)
+                                                   and node.func.id in self.FUNCTIONS):
+                raise ValueError("Only the built-in rule functions can be called")
+        tree = ast.fix_missing_locations(_VectorizeRule().visit(tree))
+        self.code = compile(tree, '<rule>', 'eval')
+
+    def evaluate(self, **arrays):
+        """Evaluate the rule element-wise; returns a float array."""
+        import numpy as np
+        namespace = {'abs': np.abs, 'min': np.minimum, 'max': np.maximum, 'clip': np.clip,
+                     'where': np.where, 'round': np.round, 'floor': np.floor, 'ceil': np.ceil,
+                     'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log,
+                     '_and': np.logical_and, '_or': np.logical_or, '_not': np.logical_not}
+        namespace.update(arrays)
+        size = len(next(iter(arrays.values()))) if arrays else 0
+        result = eval(self.code, {'__builtins__': {}}, namespace)
+        return np.broadcast_to(np.asarray(result, dtype=float), (size,)).copy()
+
+
+class _VectorizeRule(ast.NodeTransformer):
+    """Rewrite scalar-only syntax in a rule into element-wise numpy calls."""
+
+    @staticmethod
+    def call(name, args):
+        return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=args, keywords=[])
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        return self.call('where', [node.test, node.body, node.orelse])
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        name = '_and' if isinstance(node.op, ast.And) else '_or'
+        result = node.values[0]
+        for value in node.values[1:]:
+            result = self.call(name, [result, value])
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return self.call('_not', [node.operand])
+        return node
+
+    def visit_Compare(self, node):
+        # a < b < c becomes (a < b) & (b < c)
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        left = node.left
+        parts = []
+        for op, right in zip(node.ops, node.comparators):
+            parts.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+            left = right
+        result = parts[0]
+        for part in parts[1:]:
+            result = self.call('_and', [result, part])
+        return result
+
+
+class ParseCache:
+    """On-disk cache of SRCIndex objects.
+
+    Entries are keyed by file size, mtime and a content hash, and the
+    least recently used ones are evicted once the cache grows past
+    max_bytes.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key_for(self, file_path, data):
+        """Build the cache key for a file given its raw bytes."""
+        stat = os.stat(file_path)
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        return f"{stat.st_size:x}-{stat.st_mtime_ns:x}-{digest}"
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.idx")
+
+    def load(self, key):
+        """Return the cached index for key, or None on a miss."""
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                index = pickle.load(cache_file)
+            if getattr(index, 'version', None) != CACHE_VERSION:
+                return None
+            os.utime(path)  # Mark as recently used
+            return index
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+    def store(self, key, index):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self.entry_path(key)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as cache_file:
+                pickle.dump(index, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.evict(keep=os.path.basename(path))
+        except OSError:
+            pass  # The cache is optional; the program is simply parsed again next time
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until under max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.idx') and name != keep:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        
+        total = sum(size for _, size, _ in entries)
+        if keep is not None:
+            total += os.path.getsize(os.path.join(self.cache_dir, keep))
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+
+class EditJournal:
+    """Append-only log of the edits made to one program, for crash recovery.
+
+    Records are JSON lines: a header naming the program (and its parse
+    cache key), then line edits with their old and new text, and
+    snapshots of the Z-height/progress parameter lists when they change.
+    Records are buffered and written with one fsync per batch. Replaying
+    the records onto the original file restores the session.
+    A 'lines' record batches single-line replacements of a bulk edit.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.last_dicts = None
+
+    @staticmethod
+    def path_for(input_file):
+        name = hashlib.sha1(os.path.abspath(input_file).encode('utf-8')).hexdigest()
+        return os.path.join(JOURNAL_DIR, f"{name}.journal")
+
+    @staticmethod
+    def pending():
+        """Journals left behind by sessions that did not close cleanly."""
+        try:
+            return [os.path.join(JOURNAL_DIR, name) for name in sorted(os.listdir(JOURNAL_DIR))
+                    if name.endswith('.journal')]
+        except OSError:
+            return []
+
+    @staticmethod
+    def read(path):
+        """Return (header, records); a torn last line is ignored."""
+        records = []
+        with open(path, 'r', encoding='utf-8') as journal_file:
+            for line in journal_file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        if not records or records[0].get('t') != 'open':
+            return None, []
+        return records[0], records[1:]
+
+    def start(self, header, records=()):
+        """Begin a new journal (atomically replacing any old one)."""
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        self.close()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as journal_file:
+            journal_file.write(json.dumps(dict(header, t='open')) + '\n')
+            for record in records:
+                journal_file.write(json.dumps(record) + '\n')
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def append(self, record):
+        line = json.dumps(record)
+        self.buffer.append(line)
+        self.buffered_bytes += len(line)
+        if self.buffered_bytes >= JOURNAL_FLUSH_BYTES:
+            self.flush()
+
+    def record_edit(self, start, old_lines, new_lines):
+        self.append({'t': 'edit', 's': start, 'o': list(old_lines), 'n': list(new_lines)})
+
+    def record_lines(self, line_numbers, old_lines, new_lines):
+        """Log single-line replacements (e.g. a bulk value edit) as one record."""
+        self.append({'t': 'lines', 'l': list(line_numbers), 'o': list(old_lines), 'n': list(new_lines)})
+
+    def record_dicts(self, custom_z_params, print_progress_params):
+        """Log the parameter lists, if they changed since the last record."""
+        dicts = {'t': 'dicts',
+                 'z': [[z, params] for z, params in custom_z_params.items()],
+                 'p': [[percent, params] for percent, params in print_progress_params.items()]}
+        encoded = json.dumps(dicts)
+        if encoded != self.last_dicts:
+            self.last_dicts = encoded
+            self.buffer.append(encoded)
+            self.buffered_bytes += len(encoded)
+
+    def flush(self):
+        if not self.buffer or self.file is None:
+            return
+        self.file.write('\n'.join(self.buffer) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.buffer = []
+        self.buffered_bytes = 0
+
+    def has_edits(self):
+        """Whether anything beyond the starting parameter lists was logged."""
+        self.flush()
+        if self.file is None or not os.path.exists(self.path):
+            return False
+        _, records = EditJournal.read(self.path)
+        return any(record['t'] != 'dicts' for record in records) or \
+            sum(record['t'] == 'dicts' for record in records) > 1
+
+    def close(self, delete=False):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+        if delete and os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def replay(lines, records):
+        """Apply journal records to a list of lines in place.
+
+        Returns (applied, dicts) where dicts is the last parameter list
+        record (or None). Stops at the first edit whose old text does not
+        match.
+        """
+        applied = 0
+        dicts = None
+        for record in records:
+            if record['t'] == 'edit':
+                start, old_lines = record['s'], record['o']
+                if lines[start - 1:start - 1 + len(old_lines)] != old_lines:
+                    break
+                lines[start - 1:start - 1 + len(old_lines)] = record['n']
+            elif record['t'] == 'lines':
+                if any(lines[line_num - 1] != old for line_num, old in zip(record['l'], record['o'])):
+                    break
+                for line_num, new in zip(record['l'], record['n']):
+                    lines[line_num - 1] = new
+            elif record['t'] == 'dicts':
+                dicts = record
+            applied += 1
+        return applied, dicts
+
+
+# SRCModifierApp attributes that belong to one open document
+DOCUMENT_STATE = (
+    'input_file', 'content_lines', '_content_cache', 'loaded_lines', 'src_index', 'motion_table',
+    'progress_index', 'time_estimator', 'baseline_index', 'baseline_estimator', 'journal',
+    'line_map', 'param_store', 'param_groups', 'trigger_params', 'custom_z_params',
+    'print_progress_params', 'undo_state', 'redo_state', 'source_stat', 'source_chunks', 'timeline',
+)
+
+
+class Document:
+    """One open program in the workspace.
+
+    While the document is not the active one, state holds its
+    DOCUMENT_STATE attributes. Its text can be evicted to save memory;
+    it is rebuilt from the file on disk plus the edit journal, while the
+    parse index, parameter store and line map are always kept, so
+    switching back never re-parses.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.cache_key = None
+        self.state = {}
+        self.fields = {}  # DEF/PARKPOS/output name as typed, and the preview position
+        self.last_used = 0
+        self.text_bytes = 0
+        self.tab = None
+
+    @property
+    def title(self):
+        return os.path.basename(self.path) if self.path else "Untitled"
+
+    @property
+    def resident(self):
+        return self.state.get('content_lines') is not None
+
+    def has_unsaved_edits(self):
+        """Whether the kept state differs from the file (evicted text counts by its journal)."""
+        journal = self.state.get('journal')
+        return self.state.get('content_lines') != self.state.get('loaded_lines') or \
+            (journal is not None and journal.has_edits())
+
+    @staticmethod
+    def measure(lines):
+        """Approximate memory used by a list of line strings."""
+        return sum(map(len, lines)) + 57 * len(lines) if lines else 0
+
+    def evict(self):
+        """Drop the text; returns the bytes freed."""
+        freed = self.text_bytes
+        self.state['content_lines'] = None
+        self.state['_content_cache'] = None
+        self.state['loaded_lines'] = None
+        self.text_bytes = 0
+        return freed
+
+    def reload(self):
+        """Rebuild evicted text from disk and the journal.
+
+        Returns the number of journal records that no longer applied.
+        """
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        lines = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n').splitlines()
+        self.state['loaded_lines'] = list(lines)
+        skipped = 0
+        journal = self.state.get('journal')
+        if journal is not None:
+            journal.flush()
+            _, records = EditJournal.read(journal.path)
+            applied, _ = EditJournal.replay(lines, records)
+            skipped = len(records) - applied
+        self.state['content_lines'] = lines
+        self.state['_content_cache'] = None
+        self.text_bytes = self.measure(lines)
+        return skipped
+
+
+class LineMap:
+    """Current line numbers for a program that is being edited.
+
+    Every line present at load time is a slot in a Fenwick tree whose
+    weight is the number of live lines at that slot: the original line
+    (unless deleted) plus any lines inserted just before it. Slot
+    line_count + 1 collects lines appended at the end. Lines inserted after
+    load are tracked in small per-slot lists of markers (a parameter ID,
+    or -1 for other lines), so anything anchored to a slot or marker can
+    find its current line in O(log n) without renumbering.
+    """
+
+    def __init__(self, line_count):
+        self.size = line_count + 1
+        # All original slots start with weight 1, the tail slot with 0
+        self.tree = array('i', [i & -i for i in range(self.size + 1)])
+        self.tree[self.size] -= 1
+        self.alive = bytearray(b'\x01') * self.size + bytearray(b'\x00')
+        self.inserted = {}  # Slot -> markers of lines inserted before it
+        self.total = line_count
+
+    def add(self, slot, delta):
+        self.total += delta
+        while slot <= self.size:
+            self.tree[slot] += delta
+            slot += slot & -slot
+
+    def prefix(self, slot):
+        """Number of live lines in slots 1..slot."""
+        total = 0
+        while slot > 0:
+            total += self.tree[slot]
+            slot -= slot & -slot
+        return total
+
+    def locate(self, line_num):
+        """Return (slot, index) of a current line.
+
+        index is the position in the slot's inserted list, or -1 for the
+        slot's original line.
+        """
+        pos = 0
+        remaining = line_num
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] < remaining:
+                pos = nxt
+                remaining -= self.tree[nxt]
+            step >>= 1
+        slot = pos + 1
+        if remaining <= len(self.inserted.get(slot, ())):
+            return slot, remaining - 1
+        return slot, -1
+
+    def line_of(self, slot, marker=None):
+        """Current line of a slot's original line, or of an inserted marker."""
+        if marker is None:
+            return self.prefix(slot)
+        return self.prefix(slot - 1) + self.inserted[slot].index(marker) + 1
+
+    def delete(self, start, count):
+        """Delete count lines from current line start.
+
+        Returns the removed (slot, marker) pairs; marker is None for
+        original lines.
+        """
+        removed = []
+        for _ in range(count):
+            slot, index = self.locate(start)
+            if index < 0:
+                self.alive[slot] = 0
+                removed.append((slot, None))
+            else:
+                removed.append((slot, self.inserted[slot].pop(index)))
+            self.add(slot, -1)
+        return removed
+
+    def insert(self, start, markers):
+        """Insert lines so the first one becomes current line start.
+
+        Returns the slot the new lines were attached to.
+        """
+        if start > self.total:
+            slot, index = self.size, len(self.inserted.get(self.size, ()))
+        else:
+            slot, index = self.locate(start)
+            if index < 0:
+                index = len(self.inserted.get(slot, ()))
+        self.inserted.setdefault(slot, [])[index:index] = markers
+        self.add(slot, len(markers))
+        return slot
+
+
+class ParamStore:
+    """Struct-of-arrays storage for parameter occurrences.
+
+    A parameter's ID is its row in the columns. Deleted rows keep their
+    slot (type code -1) so IDs stay stable for the whole session. Values
+    are floats (ACT_DRIVE is 1.0/0.0) and prefixes are interned, so an
+    occurrence costs about 20 bytes.
+    """
+
+    def __init__(self, line_map):
+        self.line_map = line_map
+        self.types = array('b')  # Index into PARAM_TYPES, -1 once deleted
+        self.values = array('d')
+        self.prefix_ids = array('i')
+        self.slots = array('i')  # line_map slot the occurrence is anchored to
+        self.on_inserted = bytearray()  # 1 if anchored to an inserted line
+        self.prefixes = ['']
+        self.prefix_lookup = {'': 0}
+        # Parameter ID on each slot's original line (-1 if none)
+        self.slot_ids = array('i', [-1]) * (line_map.size + 1)
+        self.live_count = 0
+
+    @classmethod
+    def from_index(cls, index, line_map):
+        """Load the occurrences of a parsed index; IDs follow file order."""
+        store = cls(line_map)
+        store.types = array('b', index.occ_types)
+        store.values = array('d', index.occ_values)
+        store.prefix_ids = array('i', index.occ_prefix_ids)
+        store.slots = array('i', index.occ_lines)
+        store.on_inserted = bytearray(len(index.occ_lines))
+        store.prefixes = list(index.prefixes)
+        store.prefix_lookup = {prefix: i for i, prefix in enumerate(store.prefixes)}
+        for param_id, line_num in enumerate(index.occ_lines):
+            store.slot_ids[line_num] = param_id
+        store.live_count = len(index.occ_lines)
+        return store
+
+    def __len__(self):
+        return self.live_count
+
+    def __contains__(self, param_id):
+        return 0 <= param_id < len(self.types) and self.types[param_id] >= 0
+
+    def ids(self):
+        """IDs of all live occurrences (in ID order, not file order)."""
+        return [param_id for param_id, code in enumerate(self.types) if code >= 0]
+
+    def intern_prefix(self, prefix):
+        if prefix not in self.prefix_lookup:
+            self.prefix_lookup[prefix] = len(self.prefixes)
+            self.prefixes.append(prefix)
+        return self.prefix_lookup[prefix]
+
+    def add(self, param_type, value, prefix=''):
+        """Append an occurrence (anchor it with set_anchor) and return its ID."""
+        self.types.append(PARAM_TYPES.index(param_type))
+        self.values.append(0.0)
+        self.prefix_ids.append(0)
+        self.slots.append(0)
+        self.on_inserted.append(0)
+        self.live_count += 1
+        param_id = len(self.types) - 1
+        self.set_value(param_id, value, prefix)
+        return param_id
+
+    def remove(self, param_id):
+        if not self.on_inserted[param_id] and self.slot_ids[self.slots[param_id]] == param_id:
+            self.slot_ids[self.slots[param_id]] = -1
+        self.types[param_id] = -1
+        self.live_count -= 1
+
+    def set_value(self, param_id, value, prefix=None):
+        if value in ('TRUE', 'FALSE'):
+            value = 1.0 if value == 'TRUE' else 0.0
+        self.values[param_id] = float(value)
+        if prefix is not None:
+            self.prefix_ids[param_id] = self.intern_prefix(prefix)
+
+    def set_anchor(self, param_id, slot, inserted):
+        self.slots[param_id] = slot
+        self.on_inserted[param_id] = 1 if inserted else 0
+        if not inserted:
+            self.slot_ids[slot] = param_id
+
+    def type_of(self, param_id):
+        return PARAM_TYPES[self.types[param_id]]
+
+    def value_of(self, param_id):
+        """Value as written in the file (int, float or 'TRUE'/'FALSE')."""
+        return param_value_from_float(self.type_of(param_id), self.values[param_id])
+
+    def prefix_of(self, param_id):
+        return self.prefixes[self.prefix_ids[param_id]]
+
+    def line_of(self, param_id):
+        """Current line number of an occurrence."""
+        if self.on_inserted[param_id]:
+            return self.line_map.line_of(self.slots[param_id], param_id)
+        return self.line_map.line_of(self.slots[param_id])
+
+    def record(self, param_id):
+        return ParamRecord(self, param_id)
+
+
+class ParamRecord:
+    """Read-only view of one ParamStore row, built on demand for the UI."""
+
+    __slots__ = ('store', 'param_id')
+
+    def __init__(self, store, param_id):
+        self.store = store
+        self.param_id = param_id
+
+    @property
+    def param_type(self):
+        return self.store.type_of(self.param_id)
+
+    @property
+    def value(self):
+        return self.store.value_of(self.param_id)
+
+    @property
+    def prefix(self):
+        return self.store.prefix_of(self.param_id)
+
+    @property
+    def line(self):
+        return self.store.line_of(self.param_id)
+
+    @property
+    def group_name(self):
+        return PARAM_GROUP_NAMES[self.param_type]
+
+    @property
+    def label(self):
+        """Full label, e.g. 'Feed Rate ($VEL.CP) (Line 12)'."""
+        return f"{self.group_name} (Line {self.line})"
+
+    @property
+    def short_label(self):
+        """Row label, e.g. '$VEL.CP (Line 12)'."""
+        return f"{self.param_type} (Line {self.line})"
+
+
+# Graph tab settings: parameter -> (tab title, y label, y limits)
+GRAPH_SETTINGS = {
+    'TOOL_RPM': ('Tool Speed', 'Tool Speed (rpm)', (-10, 139.8)),
+    '$VEL.CP': ('Feed Rate', 'Feed Rate (m/s)', (0, 2)),
+    'LAYER_COOLING': ('Cooling', 'Cooling (%)', (0, 200)),
+    'ACT_DRIVE': ('ACT_DRIVE', 'ACT_DRIVE', (-0.1, 1.1)),
+}
+GRAPH_HIT_RADIUS = 6  # Pixels around a point that start a drag
+TOOLPATH_RESOLUTION = 1000  # Grid cells across the part when decimating the toolpath
+TOOLPATH_SEGMENT_LIMIT = 250000  # Most segments drawn in the 3D view
+LAYER_CACHE_SIZE = 64  # Rendered layers kept by the layer viewer
+LAYER_PREFETCH = 2  # Layers prepared on each side of the one shown
+LAYER_INFO_PARAMS = ('TOOL_RPM', '$VEL.CP', 'LAYER_COOLING')
+
+
+def decimate_path(points, values, runs, resolution):
+    """Indices of the toolpath vertices worth drawing.
+
+    points is an (n, 3) array of consecutive vertices, values the value of
+    the move ending at each vertex and runs a run number per vertex
+    (segments are never drawn between runs). Vertices are snapped to a
+    grid with `resolution` cells across the largest extent, and a vertex
+    is dropped when it is in the same cell as the one before. Both ends
+    of a value change and of a run are always kept, so every drawn
+    segment has a single value.
+    """
+    import numpy as np
+    count = len(points)
+    if count < 3:
+        return np.arange(count)
+    cell = max(np.ptp(points, axis=0).max() / resolution, 1e-9)
+    cells = np.floor(points / cell).astype(np.int64)
+    
+    moved = (cells[1:] != cells[:-1]).any(axis=1)
+    changed = (values[1:] != values[:-1]) & ~(np.isnan(values[1:]) & np.isnan(values[:-1]))
+    changed |= runs[1:] != runs[:-1]
+    keep = np.zeros(count, dtype=bool)
+    keep[[0, -1]] = True
+    keep[1:] |= moved | changed
+    keep[:-1] |= changed
+    return np.flatnonzero(keep)
+
+
+class ParameterGraph:
+    """Parameter vs Z graphs, one notebook tab per parameter.
+
+    Figures and canvases are only created the first time a tab is shown,
+    so opening the graph window costs one canvas instead of four.
+
+    Each assignment is drawn as a point that can be dragged up or down
+    (with Shift, every later assignment moves by the same amount). Only
+    the moving artists are redrawn while dragging; on release on_edit is
+    called once with (param_name, param_ids, old_values, new_values).
+    """
+
+    def __init__(self, master, param_colors, on_edit=None):
+        self.param_colors = param_colors
+        self.on_edit = on_edit
+        self.z_points = []
+        self.series = {}
+        self.handles = {}
+        self.markers = {}
+        self.figures = {}
+        self.canvases = {}
+        self.artists = {}
+        self.stale_tabs = set()
+        self.dragging_point = None
+
+        # Create a notebook for tabs
+        self.notebook = ttk.Notebook(master)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+
+        # Create an empty tab for each parameter
+        self.tabs = {}
+        for param_name, (title, _, _) in GRAPH_SETTINGS.items():
+            tab = ttk.Frame(self.notebook)
+            self.notebook.add(tab, text=title)
+            self.tabs[param_name] = tab
+
+        self.notebook.bind('<<NotebookTabChanged>>', lambda e: self.draw_current_tab())
+
+    def current_param(self):
+        """Return the parameter whose tab is currently selected."""
+        index = self.notebook.index(self.notebook.select())
+        return list(GRAPH_SETTINGS)[index]
+
+    def ensure_canvas(self, param_name):
+        """Create the figure and canvas for a tab on first use."""
+        if param_name not in self.canvases:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+            figure = Figure(figsize=(6, 4), dpi=100)
+            canvas = FigureCanvasTkAgg(figure, master=self.tabs[param_name])
+            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+            canvas.mpl_connect('button_press_event', self.on_press)
+            canvas.mpl_connect('motion_notify_event', self.on_motion)
+            canvas.mpl_connect('button_release_event', self.on_release)
+            self.figures[param_name] = figure
+            self.canvases[param_name] = canvas
+        return self.canvases[param_name]
+
+    def plot_parameters(self, z_points, series, handles=None, markers=None):
+        """Store new data and redraw only the visible tab.
+
+        handles maps a parameter to (param_ids, z, values, starts) for its
+        draggable assignments, where starts is the first entry of the
+        series each one sets. markers maps a parameter to (z, values) of
+        points drawn on top, e.g. where triggers fire. The Z-sorted order
+        of the points is added to each handle here, once per update.
+        """
+        import numpy as np
+        if self.dragging_point is not None:
+            return
+        self.z_points = z_points
+        self.series = series
+        self.handles = {}
+        for param_name, (param_ids, z, values, starts) in (handles or {}).items():
+            order = np.argsort(z, kind='stable')
+            self.handles[param_name] = (param_ids, z, values, starts, order, z[order])
+        self.markers = markers or {}
+        self.stale_tabs = set(GRAPH_SETTINGS)
+        self.draw_current_tab()
+
+    def draw_current_tab(self):
+        try:
+            param_name = self.current_param()
+            if param_name not in self.stale_tabs:
+                return
+
+            canvas = self.ensure_canvas(param_name)
+            figure = self.figures[param_name]
+            title, ylabel, ylim = GRAPH_SETTINGS[param_name]
+
+            figure.clear()
+            ax = figure.add_subplot(111)
+            ax.set_xlabel('Z Height (mm)')
+            ax.set_ylabel(ylabel)
+            ax.grid(True)
+            ax.set_ylim(*ylim)
+
+            values = self.series.get(param_name, [])
+            self.artists.pop(param_name, None)
+            if len(self.z_points) and len(values):
+                step_line, = ax.step(self.z_points, values, where='post', label=title,
+                                     color=self.param_colors.get(param_name))
+                marker = self.markers.get(param_name)
+                if marker is not None and len(marker[0]):
+                    ax.plot(marker[0], marker[1], 'x', markersize=5, color='red', label='Trigger fires')
+                ax.legend(loc='upper right')
+                
+                handle = self.handles.get(param_name)
+                if handle is not None and self.on_edit is not None and param_name != 'ACT_DRIVE':
+                    _, z, point_values = handle[:3]
+                    points, = ax.plot(z, point_values, 'o', markersize=4, color='black')
+                    self.artists[param_name] = (ax, step_line, points)
+
+            figure.tight_layout()
+            canvas.draw()
+            self.stale_tabs.discard(param_name)
+
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to update graph: {str(e)}")
+
+    def hit_test(self, param_name, event):
+        """Index of the draggable point under the mouse, or None.
+
+        Only the points whose Z falls within the hit radius are looked at,
+        found with searchsorted on the Z-sorted order.
+        """
+        import numpy as np
+        ax = self.artists[param_name][0]
+        _, z, values, _, order, z_sorted = self.handles[param_name]
+        
+        to_data = ax.transData.inverted()
+        left = to_data.transform((event.x - GRAPH_HIT_RADIUS, event.y))[0]
+        right = to_data.transform((event.x + GRAPH_HIT_RADIUS, event.y))[0]
+        first = np.searchsorted(z_sorted, min(left, right), side='left')
+        last = np.searchsorted(z_sorted, max(left, right), side='right')
+        candidates = order[first:last]
+        if not len(candidates):
+            return None
+        
+        pixels = ax.transData.transform(np.column_stack([z[candidates], values[candidates]]))
+        distances = np.hypot(pixels[:, 0] - event.x, pixels[:, 1] - event.y)
+        nearest = np.argmin(distances)
+        if distances[nearest] > GRAPH_HIT_RADIUS:
+            return None
+        return int(candidates[nearest])
+
+    def on_press(self, event):
+        try:
+            if event.button != 1 or event.inaxes is None:
+                return
+            param_name = self.current_param()
+            if param_name not in self.artists:
+                return
+            index = self.hit_test(param_name, event)
+            if index is None:
+                return
+            
+            import numpy as np
+            ax, step_line, points = self.artists[param_name]
+            _, z, values, starts = self.handles[param_name][:4]
+            # Shift moves this point and every later one
+            if event.key == 'shift':
+                moving = np.arange(index, len(values))
+                rows = slice(starts[index], None)
+            else:
+                moving = np.array([index])
+                rows = slice(starts[index], starts[index + 1] if index + 1 < len(starts) else None)
+            self.dragging_point = {
+                'param': param_name,
+                'index': index,
+                'moving': moving,
+                'rows': rows,
+                'series': np.asarray(self.series[param_name], dtype=float),
+                'delta': 0.0,
+            }
+            
+            # Draw everything else once and keep it as the blit background
+            canvas = self.canvases[param_name]
+            step_line.set_animated(True)
+            points.set_animated(True)
+            canvas.draw()
+            self.dragging_point['background'] = canvas.copy_from_bbox(ax.bbox)
+            self.blit_drag()
+            
+        except Exception as e:
+            self.dragging_point = None
+            messagebox.showerror("Error", f"Failed to start drag: {str(e)}")
+
+    def on_motion(self, event):
+        drag = self.dragging_point
+        if drag is None or event.inaxes is None or event.ydata is None:
+            return
+        values = self.handles[drag['param']][2]
+        low, high = GRAPH_SETTINGS[drag['param']][2]
+        target = min(max(event.ydata, max(low, 0)), high)
+        drag['delta'] = target - values[drag['index']]
+        self.blit_drag()
+
+    def blit_drag(self):
+        """Redraw only the step line and points over the saved background."""
+        drag = self.dragging_point
+        param_name = drag['param']
+        ax, step_line, points = self.artists[param_name]
+        values = self.handles[param_name][2]
+        
+        point_values = values.copy()
+        point_values[drag['moving']] += drag['delta']
+        series = drag['series'].copy()
+        series[drag['rows']] += drag['delta']
+        if len(drag['moving']) == 1:
+            series[drag['rows']] = point_values[drag['index']]
+        points.set_ydata(point_values)
+        step_line.set_ydata(series)
+        
+        canvas = self.canvases[param_name]
+        canvas.restore_region(drag['background'])
+        ax.draw_artist(step_line)
+        ax.draw_artist(points)
+        canvas.blit(ax.bbox)
+
+    def on_release(self, event):
+        drag = self.dragging_point
+        if drag is None:
+            return
+        self.dragging_point = None
+        param_name = drag['param']
+        _, step_line, points = self.artists[param_name]
+        step_line.set_animated(False)
+        points.set_animated(False)
+        
+        param_ids, _, values = self.handles[param_name][:3]
+        old_values = values[drag['moving']]
+        if drag['delta']:
+            self.on_edit(param_name, param_ids[drag['moving']], old_values, old_values + drag['delta'])
+        else:
+            self.canvases[param_name].draw()
+
+
+class ToolpathViewer:
+    """3D view of the LIN moves, colored by the value of one parameter.
+
+    The path is drawn as a single Line3DCollection built from numpy
+    vertex arrays. Only moves inside the Z range are used, and they are
+    decimated to about one vertex per grid cell so the view stays
+    responsive for millions of moves.
+    """
+
+    def __init__(self, master, value_source):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
+        self.value_source = value_source  # param_name -> value of each move
+        self.motion = None
+        
+        controls = tk.Frame(master)
+        controls.pack(fill='x', padx=5, pady=5)
+        tk.Label(controls, text="Color by:").pack(side='left')
+        self.param_var = tk.StringVar(value='TOOL_RPM')
+        param_menu = ttk.Combobox(controls, textvariable=self.param_var, values=list(GRAPH_SETTINGS),
+                                  state='readonly', width=15)
+        param_menu.pack(side='left', padx=5)
+        param_menu.bind('<<ComboboxSelected>>', lambda e: self.redraw())
+        
+        tk.Label(controls, text="Z from:").pack(side='left', padx=(10, 0))
+        self.z_min_entry = tk.Entry(controls, width=8)
+        self.z_min_entry.pack(side='left', padx=2)
+        tk.Label(controls, text="to:").pack(side='left')
+        self.z_max_entry = tk.Entry(controls, width=8)
+        self.z_max_entry.pack(side='left', padx=2)
+        tk.Button(controls, text="Apply", command=self.redraw).pack(side='left', padx=5)
+        self.status_label = tk.Label(controls, text="")
+        self.status_label.pack(side='right')
+        
+        self.figure = Figure(figsize=(7, 5), dpi=100)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    def set_path(self, motion):
+        """Show a new MotionTable, keeping the current Z range."""
+        if self.motion is None and len(motion.z):
+            self.z_min_entry.insert(0, f"{motion.z.min():g}")
+            self.z_max_entry.insert(0, f"{motion.z.max():g}")
+        self.motion = motion
+        self.redraw()
+
+    def z_range(self):
+        low = float(self.z_min_entry.get()) if self.z_min_entry.get().strip() else float('-inf')
+        high = float(self.z_max_entry.get()) if self.z_max_entry.get().strip() else float('inf')
+        return low, high
+
+    def build_segments(self, values, z_low, z_high, resolution=TOOLPATH_RESOLUTION):
+        """Return (segments, segment_values, move_count) for the Z range."""
+        import numpy as np
+        motion = self.motion
+        points = np.column_stack([motion.x, motion.y, motion.z])
+        
+        # Moves inside the range, split into runs of consecutive rows
+        rows = np.flatnonzero((motion.z >= z_low) & (motion.z <= z_high))
+        runs = np.r_[0, np.cumsum(np.diff(rows) != 1)]
+        points = points[rows]
+        values = values[rows]
+        
+        while True:
+            kept = decimate_path(points, values, runs, resolution)
+            joined = runs[kept[1:]] == runs[kept[:-1]]
+            if joined.sum() <= TOOLPATH_SEGMENT_LIMIT or resolution < 10:
+                break
+            resolution //= 2
+        
+        starts = kept[:-1][joined]
+        ends = kept[1:][joined]
+        segments = np.stack([points[starts], points[ends]], axis=1)
+        move_count = int((runs[1:] == runs[:-1]).sum()) if len(rows) else 0
+        return segments, values[ends], move_count
+
+    def redraw(self):
+        try:
+            import numpy as np
+            from matplotlib import colormaps
+            from mpl_toolkits.mplot3d.art3d import Line3DCollection
+            
+            self.figure.clear()
+            ax = self.figure.add_subplot(111, projection='3d')
+            ax.set_xlabel('X (mm)')
+            ax.set_ylabel('Y (mm)')
+            ax.set_zlabel('Z (mm)')
+            if self.motion is None or not len(self.motion.z):
+                self.canvas.draw()
+                return
+            
+            param_name = self.param_var.get()
+            z_low, z_high = self.z_range()
+            segments, segment_values, move_count = self.build_segments(
+                self.value_source(param_name), z_low, z_high)
+            
+            if len(segments):
+                cmap = colormaps['viridis'].with_extremes(bad='lightgray')
+                collection = Line3DCollection(segments, cmap=cmap, linewidths=0.8)
+                collection.set_array(np.ma.masked_invalid(segment_values))
+                low, high = GRAPH_SETTINGS[param_name][2]
+                collection.set_clim(max(low, 0), high)
+                ax.add_collection3d(collection)
+                self.figure.colorbar(collection, ax=ax, shrink=0.7, label=GRAPH_SETTINGS[param_name][1])
+                
+                # add_collection3d does not rescale the axes
+                flat = segments.reshape(-1, 3)
+                ax.set_xlim(flat[:, 0].min(), flat[:, 0].max() + 1e-6)
+                ax.set_ylim(flat[:, 1].min(), flat[:, 1].max() + 1e-6)
+                ax.set_zlim(flat[:, 2].min(), flat[:, 2].max() + 1e-6)
+            
+            self.status_label.config(text=f"{len(segments):,} of {move_count:,} moves drawn")
+            self.canvas.draw()
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to draw toolpath: {str(e)}")
+
+
+class LayerViewer:
+    """XY path of one layer at a time, with a slider over the layers.
+
+    Layer rows come from the MotionTable's layer_starts, the ACT_DRIVE
+    value of every move is computed once per path, and the info line is
+    answered by stats_source over the layer's rows. Rendered layers
+    (segments, colors and the info line) are kept in an LRU cache, and
+    the neighbours of the shown layer are prepared when idle so
+    scrubbing only swaps arrays into a single LineCollection.
+    """
+
+    def __init__(self, master, value_source, stats_source, cache_size=LAYER_CACHE_SIZE):
+        from matplotlib.figure import Figure
+        from matplotlib.collections import LineCollection
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.colors import to_rgba
+        
+        self.master = master
+        self.value_source = value_source  # param_name -> value of each move
+        self.stats_source = stats_source  # (param_name, start, stop) -> range statistics
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.motion = None
+        self.drive = None
+        self.layer = 0
+        self.prefetch_job = None
+        self.extrude_color = to_rgba('#1f77b4')
+        self.travel_color = to_rgba('lightgray')
+        
+        controls = tk.Frame(master)
+        controls.pack(fill='x', padx=5, pady=5)
+        self.layer_label = tk.Label(controls, text="Layer", width=28, anchor='w')
+        self.layer_label.pack(side='left')
+        self.layer_scale = tk.Scale(controls, from_=0, to=0, orient=tk.HORIZONTAL, showvalue=False,
+                                    command=lambda value: self.show_layer(int(float(value))))
+        self.layer_scale.pack(side='left', fill='x', expand=True, padx=5)
+        self.info_label = tk.Label(master, text="", anchor='w', justify='left')
+        self.info_label.pack(fill='x', padx=5)
+        
+        self.figure = Figure(figsize=(6, 6), dpi=100)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_aspect('equal', adjustable='datalim')
+        self.ax.set_xlabel('X (mm)')
+        self.ax.set_ylabel('Y (mm)')
+        self.collection = LineCollection([], linewidths=1.0)
+        self.ax.add_collection(self.collection)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    def set_path(self, motion):
+        """Show a new MotionTable; cached layers are dropped."""
+        import numpy as np
+        self.motion = motion
+        self.cache.clear()
+        self.drive = self.value_source('ACT_DRIVE')
+        
+        # Fixed limits for the whole part, so layers do not jump around
+        if len(motion.z):
+            margin = max(np.ptp(motion.x), np.ptp(motion.y), 1.0) * 0.02
+            self.ax.set_xlim(motion.x.min() - margin, motion.x.max() + margin)
+            self.ax.set_ylim(motion.y.min() - margin, motion.y.max() + margin)
+        self.layer_scale.config(to=max(motion.layer_count - 1, 0))
+        self.show_layer(min(self.layer, max(motion.layer_count - 1, 0)))
+
+    def layer_rows(self, layer):
+        """First and end row of a layer in the MotionTable."""
+        starts = self.motion.layer_starts
+        stop = starts[layer + 1] if layer + 1 < len(starts) else len(self.motion.z)
+        return int(starts[layer]), int(stop)
+
+    def build_layer(self, layer):
+        """Segments, colors, widths and info text for one layer."""
+        import numpy as np
+        motion = self.motion
+        start, stop = self.layer_rows(layer)
+        
+        # Move i runs from row i-1 to row i; the move into the layer counts
+        moves = np.arange(max(start, 1), stop)
+        segments = np.empty((len(moves), 2, 2))
+        segments[:, 0, 0] = motion.x[moves - 1]
+        segments[:, 0, 1] = motion.y[moves - 1]
+        segments[:, 1, 0] = motion.x[moves]
+        segments[:, 1, 1] = motion.y[moves]
+        
+        extruding = self.drive[moves] == 1.0
+        colors = np.where(extruding[:, None], self.extrude_color, self.travel_color)
+        widths = np.where(extruding, 1.2, 0.5)
+        
+        parts = [f"Z {motion.z[start]:g}", f"{len(moves):,} moves ({int(extruding.sum()):,} extruding)"]
+        for param_name in LAYER_INFO_PARAMS:
+            stats = self.stats_source(param_name, start, stop)
+            if not stats['moves']:
+                parts.append(f"{param_name} -")
+            elif stats['min'] == stats['max']:
+                parts.append(f"{param_name} {stats['min']:g}")
+            else:
+                parts.append(f"{param_name} {stats['min']:g}-{stats['max']:g} (avg {stats['mean']:.4g})")
+        return segments, colors, widths, "   ".join(parts)
+
+    def get_layer(self, layer):
+        """Rendered layer from the LRU cache, building it on a miss."""
+        rendered = self.cache.get(layer)
+        if rendered is None:
+            rendered = self.cache[layer] = self.build_layer(layer)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(layer)
+        return rendered
+
+    def show_layer(self, layer):
+        try:
+            if self.motion is None or not self.motion.layer_count:
+                return
+            self.layer = layer
+            segments, colors, widths, info = self.get_layer(layer)
+            self.collection.set_segments(segments)
+            self.collection.set_color(colors)
+            self.collection.set_linewidths(widths)
+            self.layer_label.config(text=f"Layer {layer + 1:,} of {self.motion.layer_count:,}")
+            self.info_label.config(text=info)
+            if self.layer_scale.get() != layer:
+                self.layer_scale.set(layer)
+            self.canvas.draw_idle()
+            
+            # Prepare the neighbours once the UI is idle
+            if self.prefetch_job is not None:
+                self.master.after_cancel(self.prefetch_job)
+            self.prefetch_job = self.master.after_idle(self.prefetch)
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to show layer: {str(e)}")
+
+    def prefetch(self):
+        self.prefetch_job = None
+        for distance in range(1, LAYER_PREFETCH + 1):
+            for layer in (self.layer + distance, self.layer - distance):
+                if 0 <= layer < self.motion.layer_count and layer not in self.cache:
+                    self.get_layer(layer)
+        # Keep the shown layer the most recently used
+        self.cache.move_to_end(self.layer)
+
 
 class SRCModifierApp:
-    def __init__(self, root):
+    def __init__(self, root, deferred_loading=True):
         try:
             self.root = root
             self.root.title("SRC File Modifier")
@@ -38,8 +2550,37 @@ class SRCModifierApp:
                      command=self.update_file_settings).pack(pady=5)
             
             # Initialize parameters
-            self.params = {}
-            self.param_line_numbers = {}  # Store line numbers for each parameter
+            self.content_lines = None
+            self._content_cache = None
+            self.src_index = None
+            self.motion_table = None
+            self.progress_index = {}  # PRINT_PROGRESS percent -> line number
+            self.time_estimator = None
+            self.baseline_index = None  # Index of the file as loaded, for before/after times
+            self.baseline_estimator = None
+            self.acceleration = DEFAULT_ACCELERATION
+            self.loaded_lines = None  # Program as loaded, for the diff view
+            self.journal = None  # Crash-recovery log of the current session
+            self.journal_warned = set()  # Programs already warned about a journal failure
+            self.undo_state = None
+            self.redo_state = None
+            self.source_stat = None  # (mtime, size) of input_file when last read
+            self.source_chunks = None  # chunk_hashes of the loaded program
+            self.timeline = None  # EffectiveTimeline, rebuilt after lines move
+            
+            # Open documents (tabs); the active one's state lives on self
+            self.documents = []
+            self.active_document = None
+            self.document_clock = 0
+            self.memory_budget = DOCUMENT_MEMORY_BUDGET
+            self.parse_cache = ParseCache()
+            
+            # Parameter occurrences are identified by stable integer IDs
+            # (rows of param_store); current line numbers come from line_map
+            self.line_map = None
+            self.param_store = None
+            self.relabel_pending = False
+            self.graph_pending = False
             self.param_groups = {}
             self.step_size = 5.0  # Default step size (%)
             
@@ -52,6 +2593,14 @@ class SRCModifierApp:
             self.ax = None
             self.canvas = None
             
+            # Graph window is created on first use
+            self.graph_window = None
+            self.parameter_graph = None
+            self.toolpath_window = None
+            self.toolpath_viewer = None
+            self.layer_window = None
+            self.layer_viewer = None
+            
             self.dragging_point = None
             self.preview_text = None
             # Define colors for each parameter type
@@ -84,7 +2633,7 @@ class SRCModifierApp:
             # Store frame positions
             self.frame_positions = {}
             
-            # Store trigger parameters that should be preserved
+            # Store trigger parameters that should be preserved (by parameter ID)
             self.trigger_params = {}
             
             # Add undo/redo history
@@ -112,20 +2661,246 @@ class SRCModifierApp:
             # Add find text functionality
             self.find_text = lambda: None  # Placeholder for find_text method
             
+            # Theme and heavy imports are loaded once the window is showing
+            if deferred_loading:
+                self.root.after_idle(self.load_deferred_resources)
+                self.root.after(JOURNAL_FLUSH_MS, self.offer_restore)
+                self.root.after(WATCH_INTERVAL_MS, self.watch_source)
+                self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+            
         except Exception as e:
             messagebox.showerror("Error", f"Failed to initialize application: {str(e)}")
 
+    @property
+    def original_content(self):
+        """Program text, joined lazily from content_lines after edits."""
+        if self._content_cache is None and self.content_lines is not None:
+            self._content_cache = '\n'.join(self.content_lines) + '\n'
+        return self._content_cache
+
+    @original_content.setter
+    def original_content(self, content):
+        self._content_cache = content
+        self.content_lines = content.splitlines() if content is not None else None
+
+    def journal_content(self, content):
+        """Journal a whole-text replacement as its line edits, before it is assigned."""
+        if self.journal is None or self.content_lines is None:
+            return
+        new_lines = content.splitlines()
+        # Last first, so that earlier line numbers still hold
+        for tag, i1, i2, j1, j2 in reversed(diff_lines(self.content_lines, new_lines)):
+            self.journal.record_edit(i1 + 1, self.content_lines[i1:i2], new_lines[j1:j2])
+
+    def load_deferred_resources(self):
+        """Load the theme and warm up heavy imports after the first paint."""
+        self.load_theme()
+        threading.Thread(target=self.warm_up_imports, daemon=True).start()
+
+    def load_theme(self):
+        try:
+            if not os.path.exists(THEME_FILE):
+                return  # Keep the default Tk look
+            self.root.tk.call('source', THEME_FILE)
+            self.root.tk.call('set_theme', 'light')
+        except tk.TclError:
+            pass  # Keep the default Tk look
+
+    def warm_up_imports(self):
+        """Import numpy/matplotlib in the background so first use is instant."""
+        for module_name in DEFERRED_IMPORTS:
+            try:
+                importlib.import_module(module_name)
+            except ImportError:
+                pass  # Reported when the feature is actually used
+
+    def open_graph_window(self):
+        try:
+            if self.graph_window is not None and self.graph_window.winfo_exists():
+                self.graph_window.lift()
+                return
+            
+            self.graph_window = tk.Toplevel(self.root)
+            self.graph_window.title("Parameter Graph")
+            self.graph_window.geometry("700x500")
+            self.parameter_graph = ParameterGraph(self.graph_window, self.param_colors, self.edit_from_graph)
+            self.update_graph()
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open graph: {str(e)}")
+
+    def open_toolpath_window(self):
+        try:
+            if not self.content_lines:
+                messagebox.showerror("Error", "Please load a file first")
+                return
+            if self.toolpath_window is not None and self.toolpath_window.winfo_exists():
+                self.toolpath_window.lift()
+                return
+            
+            self.toolpath_window = tk.Toplevel(self.root)
+            self.toolpath_window.title("Toolpath 3D")
+            self.toolpath_window.geometry("800x650")
+            self.toolpath_viewer = ToolpathViewer(self.toolpath_window, self.move_values)
+            self.update_toolpath()
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open toolpath view: {str(e)}")
+
+    def update_toolpath(self):
+        if self.toolpath_viewer is None or not self.toolpath_window.winfo_exists():
+            return
+        if not self.content_lines or self.param_store is None:
+            return
+        self.toolpath_viewer.set_path(self.get_motion_table())
+
+    def open_layer_window(self):
+        try:
+            if not self.content_lines:
+                messagebox.showerror("Error", "Please load a file first")
+                return
+            if self.layer_window is not None and self.layer_window.winfo_exists():
+                self.layer_window.lift()
+                return
+            
+            self.layer_window = tk.Toplevel(self.root)
+            self.layer_window.title("Layer Viewer")
+            self.layer_window.geometry("700x750")
+            self.layer_viewer = LayerViewer(self.layer_window, self.move_values, self.range_stats)
+            self.update_layer_viewer()
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open layer viewer: {str(e)}")
+
+    def update_layer_viewer(self):
+        if self.layer_viewer is None or not self.layer_window.winfo_exists():
+            return
+        if not self.content_lines or self.param_store is None:
+            return
+        self.layer_viewer.set_path(self.get_motion_table())
+
+    def move_values(self, param_type):
+        """Effective value of a parameter at every LIN move (NaN before the first)."""
+        return self.get_timeline().move_values(param_type)
+
+    def range_stats(self, param_type, start, stop):
+        """Min, max, mean and change count of a parameter over move rows start..stop-1."""
+        return self.get_timeline().range_stats(param_type, start, stop)
+
+    def update_graph(self):
+        """Send the effective parameter values at each Z height to the graph."""
+        if self.parameter_graph is None or not self.graph_window.winfo_exists():
+            return
+        if not self.content_lines or self.param_store is None:
+            return
+        import numpy as np
+        
+        timeline = self.get_timeline()
+        motion = timeline.motion
+        series = {}
+        handles = {}
+        for param_name in GRAPH_SETTINGS:
+            param_ids = timeline.ids[param_name]
+            lines, values = timeline.changes(param_name)
+            series[param_name] = timeline.move_values(param_name)
+            
+            # Only assignments still in force at some move can be dragged
+            starts = np.searchsorted(motion.lines, lines, side='left')
+            live = (starts < len(motion.lines)) & (np.r_[starts[1:], len(motion.lines)] != starts)
+            starts = starts[live]
+            handles[param_name] = (param_ids[live], motion.z[starts], values[live], starts)
+        
+        # Where each TRIGGER ... DO ACT_DRIVE switches the drive
+        param_ids, firings = self.trigger_firings()
+        markers = {'ACT_DRIVE': (firings['z'], column_to_numpy(self.param_store.values)[param_ids])}
+        
+        self.parameter_graph.plot_parameters(motion.z, series, handles, markers)
+
+    def trigger_firings(self):
+        """IDs of the ACT_DRIVE triggers in file order, and where each fires."""
+        import numpy as np
+        timeline = self.get_timeline()
+        param_ids = np.array([param_id for param_id in timeline.ids['ACT_DRIVE'].tolist()
+                              if param_id in self.trigger_params], dtype=np.int64)
+        triggers = [self.trigger_params[param_id] for param_id in param_ids.tolist()]
+        lines = np.fromiter((self.param_line(param_id) for param_id in param_ids.tolist()),
+                            dtype=np.int64, count=len(param_ids))
+        distances = np.fromiter((trigger['distance'] for trigger in triggers), dtype=float, count=len(triggers))
+        delays = np.fromiter((trigger['delay'] for trigger in triggers), dtype=float, count=len(triggers))
+        estimator = self.get_time_estimator()
+        return param_ids, simulate_triggers(estimator.motion, estimator.times, lines, distances, delays)
+
+    def show_trigger_firings(self):
+        """List where every ACT_DRIVE trigger fires; double-click one to jump to that move."""
+        try:
+            if not self.content_lines:
+                messagebox.showerror("Error", "Please load a file first")
+                return
+            param_ids, firings = self.trigger_firings()
+            if not len(param_ids):
+                messagebox.showinfo("Trigger Firings", "No TRIGGER ... DO ACT_DRIVE lines found")
+                return
+            
+            window = tk.Toplevel(self.root)
+            window.title("Trigger Firings")
+            window.geometry("760x400")
+            tk.Label(window, text=f"{len(param_ids):,} triggers - double-click to jump to the move where one fires",
+                     anchor='w').pack(fill='x', padx=5, pady=5)
+            
+            listbox = tk.Listbox(window, font=("Courier", 9))
+            list_scroll = Scrollbar(window, command=listbox.yview)
+            listbox.configure(yscrollcommand=list_scroll.set)
+            list_scroll.pack(side='right', fill='y')
+            listbox.pack(fill='both', expand=True, padx=5, pady=5)
+            
+            values = column_to_numpy(self.param_store.values)[param_ids]
+            rows = zip(param_ids.tolist(), values.tolist(), firings['length'].tolist(), firings['x'].tolist(),
+                       firings['y'].tolist(), firings['z'].tolist(), firings['time'].tolist())
+            for param_id, value, length, x, y, z, seconds in rows:
+                trigger = self.trigger_params[param_id]
+                listbox.insert(tk.END, f"Line {self.param_line(param_id):>8}  D={trigger['distance']:g} "
+                                       f"T={trigger['delay']:g}ms  {'ON ' if value == 1.0 else 'OFF'}  "
+                                       f"s={length:10.1f}mm  X{x:9.3f} Y{y:9.3f} Z{z:8.3f}  "
+                                       f"t={seconds:10.3f}s")
+            
+            def jump(event=None):
+                selection = listbox.curselection()
+                if selection:
+                    self.jump_to_line(int(firings['line'][selection[0]]))
+            listbox.bind('<Double-Button-1>', jump)
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to simulate triggers: {str(e)}")
+
+    def schedule_graph_update(self):
+        """Refresh the graph once the current batch of edits is done."""
+        if not self.graph_pending:
+            self.graph_pending = True
+            self.root.after_idle(self.run_graph_update)
+
+    def run_graph_update(self):
+        self.graph_pending = False
+        self.update_graph()
+        self.update_toolpath()
+        self.update_layer_viewer()
+
+    def edit_from_graph(self, param_name, param_ids, values, new_values):
+        """Write values dragged on the graph as one undoable edit."""
+        try:
+            self.commit_group_values(param_name, param_ids, values, new_values)
+            self.schedule_graph_update()
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to apply graph edit: {str(e)}")
+
     def update_file_settings(self):
         try:
             if not self.original_content:
                 messagebox.showerror("Error", "Please load a file first")
                 return
             
-            # Save current state before modification
-            self.save_state()
-            
-            lines = self.original_content.splitlines()
-            modified = False
+            lines = list(self.content_lines)
+            modified = []
             
             # Get file name without extension
             file_name = os.path.basename(self.input_file).split('.')[0]
@@ -134,25 +2909,21 @@ class SRCModifierApp:
             for i, line in enumerate(lines):
                 if line.startswith("DEF "):  # Modify DEF line
                     lines[i] = f"DEF {self.def_entry.get()}"
-                    modified = True
+                    modified.append(i)
                 elif line.startswith("PARKPOS = "):  # Modify PARKPOS line
                     lines[i] = f"PARKPOS = {self.parkpos_entry.get()}"
-                    modified = True
+                    modified.append(i)
                 elif line.startswith(";generated with "):  # Overwrite generation info
                     lines[i] = ";generated by @BLU3D, experimental prototype 0.1"
-                    modified = True
+                    modified.append(i)
                 elif line.startswith(";Source file name: "):  # Overwrite source file name
                     lines[i] = f";Source file name: {file_name}.src"
-                    modified = True
+                    modified.append(i)
             
             if modified:
-                self.original_content = '\n'.join(lines) + '\n'
-                
-                # Force preview update
-                if self.preview_text:
-                    self.preview_text.delete("1.0", tk.END)
-                    self.preview_text.insert("1.0", self.original_content)
-                self.update_preview()
+                # One undoable (and journaled) edit over the header lines
+                first, last = min(modified), max(modified)
+                self.apply_line_edit(first + 1, last + 2, lines[first:last + 1])
                 self.modify_button.config(state=tk.NORMAL)
                 self.save_button.config(state=tk.NORMAL)
         
@@ -160,40 +2931,65 @@ class SRCModifierApp:
             messagebox.showerror("Error", f"Failed to update settings: {str(e)}")
 
     def load_file(self):
+        # Open file dialog to select .src file
+        file_path = filedialog.askopenfilename(
+            filetypes=[("SRC files", "*.src"), ("All files", "*.*")]
+        )
+        
+        if file_path:
+            self.open_program(file_path)
+
+    def open_program(self, file_path, journal=True):
+        """Load a program and start journaling its edits; returns the cache key."""
         try:
-            # Open file dialog to select .src file
-            file_path = filedialog.askopenfilename(
-                filetypes=[("SRC files", "*.src"), ("All files", "*.*")]
-            )
+            # A program that is already open just gets its tab selected
+            for document in self.documents:
+                if os.path.abspath(document.path) == os.path.abspath(file_path):
+                    self.switch_document(document)
+                    return document.cache_key
+            document = self.new_document(file_path)
             
-            if not file_path:
-                return
-                
             self.input_file = file_path
             
             # Read file content
-            with open(file_path, 'r', encoding='utf-8') as file:
-                self.original_content = file.read()
-                
-            # After loading file content, extract DEF and PARKPOS values
-            lines = self.original_content.splitlines()
-            if lines:
-                for line in lines:
-                    if line.startswith("DEF "):
-                        def_value = line.split("DEF  ", 1)[1]
-                        self.def_entry.delete(0, tk.END)
-                        self.def_entry.insert(0, def_value)
-                    elif line.startswith("PARKPOS = "):
-                        parkpos_value = line.split("PARKPOS = ", 1)[1]
-                        self.parkpos_entry.delete(0, tk.END)
-                        self.parkpos_entry.insert(0, parkpos_value)
+            with open(file_path, 'rb') as file:
+                data = file.read()
+            self.original_content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+            
+            # Reuse the parsed index from a previous load of the same file
+            cache_key = self.parse_cache.key_for(file_path, data)
+            index = self.parse_cache.load(cache_key)
+            if index is None:
+                index = SRCIndex.build(self.original_content)
+                self.parse_cache.store(cache_key, index)
+            document.cache_key = cache_key
+            
+            # Show DEF and PARKPOS values
+            if index.def_value is not None:
+                self.def_entry.delete(0, tk.END)
+                self.def_entry.insert(0, index.def_value)
+            if index.parkpos_value is not None:
+                self.parkpos_entry.delete(0, tk.END)
+                self.parkpos_entry.insert(0, index.parkpos_value)
+            
+            self.baseline_index = index
+            self.baseline_estimator = None
+            self.loaded_lines = list(self.content_lines)  # Shares the line strings
+            stat = os.stat(file_path)
+            self.source_stat = (stat.st_mtime_ns, stat.st_size)
+            self.source_chunks = chunk_hashes(self.content_lines)
             
             # Extract parameters and create UI elements
-            if self.extract_params_from_file():
+            if self.extract_params_from_file(index):
                 self.create_param_entries()
                 self.modify_button.config(state=tk.NORMAL)
                 self.save_button.config(state=tk.NORMAL)  # Enable save button when file is loaded
                 self.update_preview()
+            
+            # Every later edit is journaled against this exact file
+            if journal:
+                self.start_journal(cache_key)
+            return cache_key
                 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load file: {str(e)}")
@@ -451,22 +3247,17 @@ class SRCModifierApp:
             button_frame.pack(fill='x', padx=2, pady=1)
 
             # Get line number for jump button
-            content_lines = self.original_content.splitlines()
             line_number = None
             
             if is_z_height:
                 z_pattern = re.compile(r'LIN.*?Z\s*([-\d.]+)')
-                for i, line in enumerate(content_lines, 1):
+                for i, line in enumerate(self.content_lines, 1):
                     match = z_pattern.search(line)
                     if match and abs(float(match.group(1)) - value) < 0.0001:
                         line_number = i
                         break
             else:
-                search_text = f"PRINT_PROGRESS={value}"
-                for i, line in enumerate(content_lines, 1):
-                    if search_text in line:
-                        line_number = i
-                        break
+                line_number = self.progress_line(value)
 
             # Jump to line button
             if line_number:
@@ -499,9 +3290,6 @@ class SRCModifierApp:
 
     def add_param_to_progress(self, value, is_z_height=False, parent_dialog=None):
         try:
-            # Save current state before adding
-            self.save_state()
-            
             # Create parameter selection dialog
             dialog = tk.Toplevel(self.root)
             dialog.title("Add Parameter")
@@ -533,29 +3321,11 @@ class SRCModifierApp:
 
             def validate_param_value(param_name, value):
                 try:
-                    if param_name == 'TOOL_RPM':
-                        val = float(value)
-                        if val > 139.8:
-                            messagebox.showerror("Error", "Maximum value for TOOL_RPM is 139.8")
-                            return False
-                    elif param_name == '$VEL.CP':
-                        val = float(value)
-                        if val > 2:
-                            messagebox.showerror("Error", "Maximum value for $VEL.CP is 2")
-                            return False
-                        if val > 0.5:
-                            return messagebox.askyesno("Warning", 
-                                "Values above 0.5 for $VEL.CP could be dangerous.\n\n" +
-                                "Do you wish to continue with this value?")
-                    elif param_name == 'LAYER_COOLING':
-                        val = int(value)
-                        if val > 200:
-                            messagebox.showerror("Error", "Maximum value for LAYER_COOLING is 200")
-                            return False
-                    return True
+                    val = int(value) if param_name == 'LAYER_COOLING' else float(value)
                 except ValueError:
                     messagebox.showerror("Error", "Please enter a valid number")
                     return False
+                return self.validate_value(param_name, val)
 
             def add_parameter():
                 param_name = param_var.get()
@@ -575,18 +3345,8 @@ class SRCModifierApp:
                         return
                     param_value = float(param_value) if param_name != 'LAYER_COOLING' else int(param_value)
 
-                # Add parameter to appropriate dictionary
-                if is_z_height:
-                    if value not in self.custom_z_params:
-                        self.custom_z_params[value] = {}
-                    self.custom_z_params[value][param_name] = param_value
-                else:
-                    if value not in self.print_progress_params:
-                        self.print_progress_params[value] = {}
-                    self.print_progress_params[value][param_name] = param_value
-
                 # Find the appropriate position to insert/update the parameter
-                content_lines = self.original_content.splitlines()
+                content_lines = self.content_lines
                 insert_index = None
                 param_exists = False
                 existing_param_index = None
@@ -606,34 +3366,47 @@ class SRCModifierApp:
                                 j += 1
                             insert_index = j if not param_exists else None
                             break
-                else:
-                    trigger_pattern = f"TRIGGER WHEN DISTANCE=0 DELAY=0 DO PRINT_PROGRESS={int(value)}"
-                    for i, line in enumerate(content_lines):
-                        if trigger_pattern in line:
-                            # Search for existing parameter in this print progress block
-                            j = i + 1
-                            while j < len(content_lines) and any(param in content_lines[j] for param in self.available_params):
-                                if f"{param_name}=" in content_lines[j]:
-                                    param_exists = True
-                                    existing_param_index = j
-                                    break
-                                j += 1
-                            insert_index = j if not param_exists else None
-                            break
+                else:
+                    trigger_line = self.progress_line(value)
+                    if trigger_line is None and messagebox.askyesno("Print Progress",
+                            f"There is no PRINT_PROGRESS={int(value)} trigger in this file.\n\n" +
+                            "Insert the missing triggers by path length?"):
+                        self.insert_progress_triggers()
+                        trigger_line = self.progress_line(value)
+                    if trigger_line is not None:
+                        # Search for existing parameter in this print progress block
+                        j = trigger_line
+                        while j < len(content_lines) and any(param in content_lines[j] for param in self.available_params):
+                            if f"{param_name}=" in content_lines[j]:
+                                param_exists = True
+                                existing_param_index = j
+                                break
+                            j += 1
+                        insert_index = j if not param_exists else None
 
                 if param_exists:
                     # Update existing parameter
-                    content_lines[existing_param_index] = f"{param_name}={param_value}"
+                    self.apply_line_edit(existing_param_index + 1, existing_param_index + 2,
+                                         [f"{param_name}={param_value}"])
                 elif insert_index is not None:
                     # Insert new parameter
-                    content_lines.insert(insert_index, f"{param_name}={param_value}")
+                    self.apply_line_edit(insert_index + 1, insert_index + 1,
+                                         [f"{param_name}={param_value}"])
                 else:
                     messagebox.showerror("Error", "Could not find appropriate position to insert parameter")
                     return
 
-                # Update content and UI
-                self.original_content = '\n'.join(content_lines) + '\n'
-                self.update_preview()
+                # Add parameter to appropriate dictionary
+                if is_z_height:
+                    if value not in self.custom_z_params:
+                        self.custom_z_params[value] = {}
+                    self.custom_z_params[value][param_name] = param_value
+                else:
+                    if value not in self.print_progress_params:
+                        self.print_progress_params[value] = {}
+                    self.print_progress_params[value][param_name] = param_value
+
+                # Update UI
                 self.jump_to_line(existing_param_index + 1 if param_exists else insert_index + 1)
                 self.refresh_progress_params(value, is_z_height)
                 self.modify_button.config(state=tk.NORMAL)
@@ -671,22 +3444,17 @@ class SRCModifierApp:
             button_frame.pack(fill='x', padx=2, pady=1)
 
             # Get the line number for the jump button
-            content_lines = self.original_content.splitlines()
             line_number = None
             
             if is_z_height:
                 z_pattern = re.compile(r'LIN.*?Z\s*([-\d.]+)')
-                for i, line in enumerate(content_lines, 1):
+                for i, line in enumerate(self.content_lines, 1):
                     match = z_pattern.search(line)
                     if match and abs(float(match.group(1)) - value) < 0.0001:
                         line_number = i
                         break
             else:
-                search_text = f"PRINT_PROGRESS={value}"
-                for i, line in enumerate(content_lines, 1):
-                    if search_text in line:
-                        line_number = i
-                        break
+                line_number = self.progress_line(value)
 
             # Jump to line button
             if line_number:
@@ -717,13 +3485,6 @@ class SRCModifierApp:
                     entry = tk.Entry(param_frame, textvariable=value_var, width=10)
                 entry.pack(side='right')
 
-                # Add jump button for this parameter
-                if param_name in self.param_line_numbers:
-                    jump_btn = tk.Button(param_frame, text="→", 
-                                       command=lambda ln=self.param_line_numbers[param_name]: self.jump_to_line(ln),
-                                       bg='light blue')
-                    jump_btn.pack(side='right', padx=2)
-
                 # Add remove button for this parameter
                 remove_btn = tk.Button(param_frame, text="✕", 
                                      command=lambda p=param_name, v=value: self.remove_param(p, v, is_z_height),
@@ -735,45 +3496,28 @@ class SRCModifierApp:
 
     def remove_param(self, param_name, value, is_z_height=False):
         try:
-            # Save current state before deletion
-            self.save_state()
-            
-            # Remove parameter from dictionary
-            if is_z_height:
-                if value in self.custom_z_params and param_name in self.custom_z_params[value]:
-                    del self.custom_z_params[value][param_name]
-                    # Keep frame even if empty
-                    if value in self.z_param_frames:
-                        self.refresh_progress_params(value, is_z_height=True)
-            else:
-                if value in self.print_progress_params and param_name in self.print_progress_params[value]:
-                    del self.print_progress_params[value][param_name]
-                    # Keep frame even if empty
-                    if value in self.print_progress_frames:
-                        self.refresh_progress_params(value, is_z_height=False)
-
-            # Remove from content while preserving PRINT_PROGRESS line
-            content_lines = self.original_content.splitlines()
-            new_content_lines = []
+            # Find the lines to remove while preserving the Z/PRINT_PROGRESS line
+            content_lines = self.content_lines
+            progress_index = None if is_z_height else self.progress_line(value)
+            z_pattern = re.compile(r'LIN.*?Z\s*([-\d.]+)')
+            removed = set()
             skip_next = False
             
             for i, line in enumerate(content_lines):
                 if skip_next:
                     skip_next = False
+                    removed.add(i + 1)
                     continue
                     
                 if is_z_height:
-                    z_pattern = re.compile(r'LIN.*?Z\s*([-\d.]+)')
                     match = z_pattern.search(line)
                     if match and abs(float(match.group(1)) - value) < 0.0001:
-                        new_content_lines.append(line)
                         # Skip only the specific parameter line
                         if i + 1 < len(content_lines) and f"{param_name}=" in content_lines[i + 1]:
                             skip_next = True
                         continue
                 else:
-                    if f"PRINT_PROGRESS={int(value)}" in line:
-                        new_content_lines.append(line)  # Keep PRINT_PROGRESS line
+                    if i + 1 == progress_index:
                         # Skip only the specific parameter line
                         if i + 1 < len(content_lines) and f"{param_name}=" in content_lines[i + 1]:
                             skip_next = True
@@ -782,14 +3526,32 @@ class SRCModifierApp:
                 # Check for $VEL.CP parameter
                 if f"$VEL.CP=" in line and param_name == "$VEL.CP":
                     skip_next = True
-                    continue
-                
-                new_content_lines.append(line)
-
-            # Update original content
-            self.original_content = '\n'.join(new_content_lines) + '\n'
+                    removed.add(i + 1)
+            
+            # One undoable edit over the affected span, saved before the
+            # parameter lists change
+            if removed:
+                first, last = min(removed), max(removed)
+                self.apply_line_edit(first, last + 1, [content_lines[line_num - 1] for line_num in range(first, last + 1)
+                                                       if line_num not in removed])
+            else:
+                self.save_state()
             
-            # Update preview
+            # Remove parameter from dictionary
+            if is_z_height:
+                if value in self.custom_z_params and param_name in self.custom_z_params[value]:
+                    del self.custom_z_params[value][param_name]
+                    # Keep frame even if empty
+                    if value in self.z_param_frames:
+                        self.refresh_progress_params(value, is_z_height=True)
+            else:
+                if value in self.print_progress_params and param_name in self.print_progress_params[value]:
+                    del self.print_progress_params[value][param_name]
+                    # Keep frame even if empty
+                    if value in self.print_progress_frames:
+                        self.refresh_progress_params(value, is_z_height=False)
+            
+            # The generated Z-height/progress lines in the preview changed too
             self.update_preview()
             
             # Enable save button
@@ -830,6 +3592,8 @@ class SRCModifierApp:
                 value = int(value_var.get())
             else:
                 value = float(value_var.get())
+            if not self.validate_value(param_name, value):
+                return
                 
             self.custom_z_params[percentage][param_name] = value
             
@@ -876,92 +3640,38 @@ class SRCModifierApp:
         except ValueError:
             messagebox.showerror("Error", "Please enter a valid number")
 
-    def extract_params_from_file(self):
+    def extract_params_from_file(self, index=None):
         if not self.original_content:
             return
             
         try:
             # Clear existing params
-            self.params.clear()
-            self.param_line_numbers.clear()
             self.param_groups.clear()
             self.trigger_params.clear()
             
-            # Split content into lines
-            lines = self.original_content.splitlines()            
-            # Extract all parameters with line numbers
-            for line_num, line in enumerate(lines, 1):
-                # Look for trigger parameters first
-                trigger_match = re.search(r'TRIGGER WHEN DISTANCE=(\d+\.?\d*)\s*DELAY=(\d+\.?\d*)\s*DO\s+ACT_DRIVE=(TRUE|FALSE)', line)
-                if trigger_match:
-                    distance = float(trigger_match.group(1))
-                    delay = float(trigger_match.group(2))
-                    act_drive_value = 'TRUE' if trigger_match.group(3) == 'TRUE' else 'FALSE'
-                    
-                    # Add ACT_DRIVE to params while preserving trigger
-                    key = f"Drive (ACT_DRIVE) (Line {line_num})"
-                    self.params[key] = act_drive_value
-                    self.param_line_numbers[key] = line_num
-                    
-                    if 'Drive (ACT_DRIVE)' not in self.param_groups:
-                        self.param_groups['Drive (ACT_DRIVE)'] = []
-                    self.param_groups['Drive (ACT_DRIVE)'].append(key)
-                    
-                    self.trigger_params[line_num] = {
-                        'distance': distance,
-                        'delay': delay,
-                        'do': 'ACT_DRIVE',
-                        'value': act_drive_value
-                    }
-                    continue
-                
-                # Look for other parameters
-                if 'TOOL_RPM' in line:
-                    value = int(re.search(r'TOOL_RPM\s*=\s*(-?\d+)', line).group(1))  # Changed to int
-                    key = f"Tool Speed (TOOL_RPM) (Line {line_num})"
-                    self.params[key] = value
-                    self.param_line_numbers[key] = line_num
-                    
-                    # Group parameters
-                    if 'Tool Speed (TOOL_RPM)' not in self.param_groups:
-                        self.param_groups['Tool Speed (TOOL_RPM)'] = []
-                    self.param_groups['Tool Speed (TOOL_RPM)'].append(key)
-                    
-                elif '$VEL.CP' in line:
-                    value = float(re.search(r'\$VEL\.CP\s*=\s*(-?\d+\.?\d*)', line).group(1))
-                    key = f"Feed Rate ($VEL.CP) (Line {line_num})"
-                    self.params[key] = value
-                    self.param_line_numbers[key] = line_num
-                    
-                    if 'Feed Rate ($VEL.CP)' not in self.param_groups:
-                        self.param_groups['Feed Rate ($VEL.CP)'] = []
-                    self.param_groups['Feed Rate ($VEL.CP)'].append(key)
-                    
-                elif 'LAYER_COOLING' in line:
-                    # Extract everything before LAYER_COOLING
-                    prefix = line.split('LAYER_COOLING')[0]
-                    value = int(re.search(r'LAYER_COOLING\s*=\s*(-?\d+)', line).group(1))  # Changed to int
-                    key = f"Cooling (LAYER_COOLING) (Line {line_num})"
-                    self.params[key] = value
-                    self.param_line_numbers[key] = line_num
-                    
-                    # Store the prefix if it exists
-                    if prefix:
-                        self.params[f"{key}_prefix"] = prefix
-                    
-                    if 'Cooling (LAYER_COOLING)' not in self.param_groups:
-                        self.param_groups['Cooling (LAYER_COOLING)'] = []
-                    self.param_groups['Cooling (LAYER_COOLING)'].append(key)
-                    
-                elif 'ACT_DRIVE' in line:
-                    value = 'TRUE' if re.search(r'ACT_DRIVE\s*=\s*(TRUE|FALSE)', line).group(1) == 'TRUE' else 'FALSE'
-                    key = f"Drive (ACT_DRIVE) (Line {line_num})"
-                    self.params[key] = value
-                    self.param_line_numbers[key] = line_num
-                    
-                    if 'Drive (ACT_DRIVE)' not in self.param_groups:
-                        self.param_groups['Drive (ACT_DRIVE)'] = []
-                    self.param_groups['Drive (ACT_DRIVE)'].append(key)
+            # Parse the content unless a (cached) index was supplied
+            if index is None:
+                index = SRCIndex.build(self.original_content)
+            self.src_index = index
+            self.timeline = None
+            self.motion_table = None
+            self.progress_index = dict(index.progress_lines)
+            
+            # Every line starts out as its own line_map slot, and parameter
+            # IDs follow file order
+            self.line_map = LineMap(index.line_count)
+            self.param_store = ParamStore.from_index(index, self.line_map)
+            
+            # Group parameters
+            for code, param_type in enumerate(PARAM_TYPES):
+                group_ids = array('i', (param_id for param_id, occ_type in enumerate(index.occ_types)
+                                        if occ_type == code))
+                if group_ids:
+                    self.param_groups[PARAM_GROUP_NAMES[param_type]] = group_ids
+            
+            # Trigger parameters that should be preserved
+            for line_num, trigger in index.triggers.items():
+                self.trigger_params[self.param_store.slot_ids[line_num]] = dict(trigger)
                     
             return True
             
@@ -972,6 +3682,14 @@ class SRCModifierApp:
 
     def create_ui(self):
         try:
+            # One tab per open program
+            tab_row = tk.Frame(self.root)
+            tab_row.pack(fill='x', padx=2)
+            self.tab_bar = ttk.Notebook(tab_row, height=1)
+            self.tab_bar.pack(side='left', fill='x', expand=True)
+            self.tab_bar.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+            tk.Button(tab_row, text="Close Tab", command=self.close_document).pack(side='right', padx=2)
+            
             # Main container
             main_container = tk.PanedWindow(self.root, orient=tk.HORIZONTAL)
             main_container.pack(fill=tk.BOTH, expand=True)
@@ -984,6 +3702,10 @@ class SRCModifierApp:
             # Add print progress button
             add_print_progress_btn = tk.Button(left_frame, text="Add Print Progress Parameter", command=self.add_print_progress)
             add_print_progress_btn.pack(pady=5)
+            
+            # Generate PRINT_PROGRESS triggers for files that lack them
+            tk.Button(left_frame, text="Insert Missing Progress Triggers",
+                      command=self.insert_progress_triggers).pack(pady=5)
 
             # Add Z height button
             add_z_height_btn = tk.Button(left_frame, text="Add Z Height Parameter", command=self.add_z_height)
@@ -993,6 +3715,37 @@ class SRCModifierApp:
             self.load_button = tk.Button(left_frame, text="Load File", command=self.load_file)
             self.load_button.pack(pady=10)
 
+            # Carry this session's edits over to a re-sliced program
+            patch_frame = tk.Frame(left_frame)
+            patch_frame.pack(pady=5)
+            tk.Button(patch_frame, text="Export Patch...", command=self.export_patch).pack(side='left', padx=2)
+            tk.Button(patch_frame, text="Apply Patch...", command=self.apply_patch).pack(side='left', padx=2)
+
+            # What changed since the file was loaded
+            tk.Button(left_frame, text="Show Changes", command=self.show_diff).pack(pady=5)
+
+            # Check every value against the limits
+            tk.Button(left_frame, text="Validate", command=self.show_violations).pack(pady=5)
+
+            # Drop assignments that set the value already in effect
+            tk.Button(left_frame, text="Remove Redundant Assignments",
+                      command=self.remove_redundant_assignments).pack(pady=5)
+
+            # Where each DISTANCE/DELAY trigger switches the drive
+            tk.Button(left_frame, text="Show Trigger Firings", command=self.show_trigger_firings).pack(pady=5)
+
+            # Print-time estimate for the current edits
+            tk.Button(left_frame, text="Estimate Print Time", command=self.show_time_estimate).pack(pady=5)
+            
+            # Per-layer $VEL.CP schedule for the shortest safe cycle time
+            tk.Button(left_frame, text="Optimize Cycle Time", command=self.show_speed_optimizer).pack(pady=5)
+
+            # Graph button (matplotlib is only imported when this is used)
+            graph_btn = tk.Button(left_frame, text="Show Graph", command=self.open_graph_window)
+            graph_btn.pack(pady=5)
+            tk.Button(left_frame, text="Show Toolpath 3D", command=self.open_toolpath_window).pack(pady=5)
+            tk.Button(left_frame, text="Show Layers", command=self.open_layer_window).pack(pady=5)
+
             # Create scrollable frame for parameters
             param_canvas = tk.Canvas(left_frame)
             scrollbar = tk.Scrollbar(left_frame, orient="vertical", command=param_canvas.yview)
@@ -1016,6 +3769,7 @@ class SRCModifierApp:
             scrollbar.pack(side="right", fill="y")
 
             self.entries = {}
+            self.entry_rows = {}
             # Output name entry
             output_label = tk.Label(left_frame, text="Output filename:")
             output_label.pack(pady=(5,0))
@@ -1026,6 +3780,37 @@ class SRCModifierApp:
             input_name = os.path.splitext(os.path.basename(self.input_file))[0] if self.input_file else ""
             default_output = f"{input_name}_modified.src" if input_name else ""
             self.output_name.insert(0, default_output)
+            
+            # Optional split into a master program and chained sub-programs
+            split_frame = tk.Frame(left_frame)
+            split_frame.pack(pady=(0, 5))
+            self.split_var = tk.BooleanVar(value=False)
+            tk.Checkbutton(split_frame, text="Split into parts", variable=self.split_var).grid(row=0, column=0,
+                                                                                             columnspan=4, sticky='w')
+            tk.Label(split_frame, text="Max lines:").grid(row=1, column=0, sticky='e')
+            self.split_lines_entry = tk.Entry(split_frame, width=8)
+            self.split_lines_entry.insert(0, str(SPLIT_MAX_LINES))
+            self.split_lines_entry.grid(row=1, column=1, padx=2)
+            tk.Label(split_frame, text="Max KB:").grid(row=1, column=2, sticky='e')
+            self.split_kb_entry = tk.Entry(split_frame, width=8)
+            self.split_kb_entry.insert(0, str(SPLIT_MAX_BYTES // 1024))
+            self.split_kb_entry.grid(row=1, column=3, padx=2)
+            
+            # Optional minified output
+            minify_frame = tk.Frame(left_frame)
+            minify_frame.pack(pady=(0, 5))
+            self.minify_var = tk.BooleanVar(value=False)
+            tk.Checkbutton(minify_frame, text="Minify", variable=self.minify_var).grid(row=0, column=0,
+                                                                                     columnspan=4, sticky='w')
+            tk.Label(minify_frame, text="Tolerance (mm):").grid(row=1, column=0, sticky='e')
+            self.minify_tolerance_entry = tk.Entry(minify_frame, width=7)
+            self.minify_tolerance_entry.insert(0, str(MINIFY_TOLERANCE))
+            self.minify_tolerance_entry.grid(row=1, column=1, padx=2)
+            tk.Label(minify_frame, text="Comments:").grid(row=1, column=2, sticky='e')
+            self.minify_comments = ttk.Combobox(minify_frame, values=['keep', 'condense', 'strip'],
+                                                state='readonly', width=9)
+            self.minify_comments.set('condense')
+            self.minify_comments.grid(row=1, column=3, padx=2)
 
             # Modify button
             self.modify_button = tk.Button(left_frame, text="Modify & Save", command=self.modify_file, state=tk.DISABLED)
@@ -1147,10 +3932,11 @@ class SRCModifierApp:
             for widget in self.param_frame.winfo_children():
                 widget.destroy()
             self.entries.clear()
+            self.entry_rows.clear()
             self.content_frames.clear()
             self.header_labels.clear()
 
-            if not self.params:
+            if not self.param_store:
                 return
             
             # Create parent header frame
@@ -1173,6 +3959,26 @@ class SRCModifierApp:
                                   anchor='w')
             parent_label.pack(side='left', fill='x', expand=True)
             
+            # Step used by the group scale buttons
+            step_var = tk.StringVar(value=f"{self.step_size:g}")
+            step_box = tk.Spinbox(parent_buttons_frame, from_=0.5, to=50, increment=0.5,
+                                  width=5, textvariable=step_var)
+            step_box.pack(side='right')
+            tk.Label(parent_buttons_frame, text="Step %:", font=("Arial", 8)).pack(side='right')
+            
+            def update_step(*args):
+                try:
+                    self.step_size = float(step_var.get())
+                except ValueError:
+                    pass
+                for toolbar_update in self.step_labels:
+                    toolbar_update()
+            step_var.trace('w', update_step)
+            self.step_labels = []
+            
+            tk.Button(parent_buttons_frame, text="Apply rule...", font=("Arial", 8),
+                      command=self.ask_rule).pack(side='right', padx=5)
+            
             # Create parent content frame
             parent_content_frame = tk.Frame(self.param_frame)
             parent_content_frame.pack(fill='x')
@@ -1184,6 +3990,7 @@ class SRCModifierApp:
                 else:
                     parent_content_frame.pack(fill='x')
                     parent_arrow.config(text="▼")
+                    self.schedule_relabel()
             
             parent_arrow.bind('<Button-1>', toggle_parent)
             parent_label.bind('<Button-1>', toggle_parent)
@@ -1216,132 +4023,1451 @@ class SRCModifierApp:
                 header_label.pack(side='left', fill='x', expand=True)
                 self.header_labels[param_type] = header_label
                 
+                # Whole-group operations for numeric parameters
+                if GROUP_PARAM_TYPES.get(param_type, 'ACT_DRIVE') != 'ACT_DRIVE':
+                    self.create_group_toolbar(header_frame, param_type)
+                
                 # Content frame
                 content_frame = tk.Frame(container)
                 content_frame.pack(fill='x')
                 self.content_frames[param_type] = content_frame
                 
-                def make_toggle_function(content_frame, arrow_btn, header_label, param_type):
-                    def toggle(event=None):
-                        if content_frame.winfo_viewable():
-                            content_frame.pack_forget()
-                            arrow_btn.config(text="▶")
-                        else:
-                            content_frame.pack(fill='x', padx=20)
-                            arrow_btn.config(text="▼")
-                    return toggle
+                def make_toggle_function(content_frame, arrow_btn, header_label, param_type):
+                    def toggle(event=None):
+                        if content_frame.winfo_viewable():
+                            content_frame.pack_forget()
+                            arrow_btn.config(text="▶")
+                        else:
+                            content_frame.pack(fill='x', padx=20)
+                            arrow_btn.config(text="▼")
+                            self.relabel_group(param_type)
+                    return toggle
+                
+                toggle_func = make_toggle_function(content_frame, arrow_btn, header_label, param_type)
+                arrow_btn.bind('<Button-1>', toggle_func)
+                header_label.bind('<Button-1>', toggle_func)
+                
+                # Create entries for parameters
+                for param_id in param_keys:
+                    self.create_param_row(content_frame, param_id)
+                    
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to create parameter entries: {str(e)}")
+
+    def create_group_toolbar(self, header_frame, group_name):
+        """Buttons that edit every occurrence in a group at once."""
+        toolbar = tk.Frame(header_frame)
+        toolbar.pack(fill='x', padx=25, pady=(0, 2))
+        
+        down_btn = tk.Button(toolbar, font=("Arial", 8),
+                             command=lambda: self.bulk_edit_group(group_name, 'scale', -self.step_size))
+        down_btn.pack(side='left', padx=1)
+        up_btn = tk.Button(toolbar, font=("Arial", 8),
+                           command=lambda: self.bulk_edit_group(group_name, 'scale', self.step_size))
+        up_btn.pack(side='left', padx=1)
+        
+        def update_step_labels():
+            down_btn.config(text=f"-{self.step_size:g}%")
+            up_btn.config(text=f"+{self.step_size:g}%")
+        update_step_labels()
+        self.step_labels.append(update_step_labels)
+        
+        tk.Button(toolbar, text="Set all", font=("Arial", 8),
+                  command=lambda: self.ask_bulk_edit(group_name, 'set')).pack(side='left', padx=1)
+        tk.Button(toolbar, text="Offset", font=("Arial", 8),
+                  command=lambda: self.ask_bulk_edit(group_name, 'offset')).pack(side='left', padx=1)
+        tk.Button(toolbar, text="Clamp", font=("Arial", 8),
+                  command=lambda: self.ask_bulk_edit(group_name, 'clamp')).pack(side='left', padx=1)
+
+    def ask_bulk_edit(self, group_name, operation):
+        """Prompt for the operands of a group operation, then run it."""
+        param_type = GROUP_PARAM_TYPES[group_name]
+        if operation == 'set':
+            value = simpledialog.askfloat("Set all", f"New value for every {param_type}:", parent=self.root)
+            if value is not None:
+                self.bulk_edit_group(group_name, 'set', value)
+        elif operation == 'offset':
+            value = simpledialog.askfloat("Offset", f"Amount to add to every {param_type}:", parent=self.root)
+            if value is not None:
+                self.bulk_edit_group(group_name, 'offset', value)
+        elif operation == 'clamp':
+            low = simpledialog.askfloat("Clamp", f"Minimum {param_type}:", parent=self.root)
+            if low is None:
+                return
+            high = simpledialog.askfloat("Clamp", f"Maximum {param_type}:", parent=self.root)
+            if high is not None:
+                self.bulk_edit_group(group_name, 'clamp', min(low, high), max(low, high))
+
+    def bulk_edit_group(self, group_name, operation, *operands):
+        """Apply scale/set/offset/clamp to a whole group as one edit."""
+        try:
+            import numpy as np
+            
+            param_type = GROUP_PARAM_TYPES[group_name]
+            param_ids = column_to_numpy(self.param_groups.get(group_name, array('i')))
+            if not len(param_ids):
+                return
+            values = column_to_numpy(self.param_store.values)[param_ids]
+            
+            if operation == 'scale':
+                new_values = values * (1.0 + operands[0] / 100.0)
+            elif operation == 'set':
+                new_values = np.full_like(values, operands[0])
+            elif operation == 'offset':
+                new_values = values + operands[0]
+            elif operation == 'clamp':
+                new_values = np.clip(values, operands[0], operands[1])
+            else:
+                raise ValueError(f"Unknown operation {operation}")
+            
+            self.commit_group_values(param_type, param_ids, values, new_values)
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to edit {group_name}: {str(e)}")
+
+    def commit_group_values(self, param_type, param_ids, values, new_values):
+        """Round, validate and write new values for a set of occurrences.
+
+        Nothing is written unless every value passes. Returns True if the
+        values were applied.
+        """
+        import numpy as np
+        
+        # Integer parameters stay integers, feed rates get 4 decimals
+        if param_type in ('TOOL_RPM', 'LAYER_COOLING'):
+            new_values = np.rint(new_values)
+        else:
+            new_values = np.round(new_values, 4)
+        
+        # Validate the whole result before touching the document
+        if not self.confirm_values(param_type, new_values, lambda index: self.param_line(int(param_ids[index]))):
+            return False
+        
+        changed = new_values != values
+        if changed.any():
+            self.apply_value_edits(param_ids[changed].tolist(), new_values[changed].tolist())
+            self.modify_button.config(state=tk.NORMAL)
+            self.save_button.config(state=tk.NORMAL)
+        return True
+
+    def confirm_values(self, param_type, new_values, line_of, steps=False):
+        """Check new values against VALIDATION_RULES: errors refuse, warnings ask.
+
+        line_of maps an index into new_values to its line number. Step
+        checks only make sense when new_values is the parameter's whole
+        sequence in file order. Returns True if the values may be written.
+        """
+        violations = value_violations(param_type, new_values, steps=steps)
+        for severity, indices, message in violations:
+            if severity == 'error':
+                messagebox.showerror("Error",
+                    f"{len(indices)} new {param_type} values {message} (first at line {line_of(indices[0])})")
+                return False
+        warnings = [f"{len(indices)} new values {message}" for severity, indices, message in violations]
+        if warnings and not messagebox.askyesno("Warning",
+                f"{param_type}: " + "; ".join(warnings) + "\n\nDo you wish to continue with these values?"):
+            return False
+        return True
+
+    def validate_value(self, param_type, value):
+        """Check one typed value, asking before accepting a warning."""
+        errors, warnings = check_value(param_type, value)
+        if errors:
+            messagebox.showerror("Error", errors[0])
+            return False
+        if warnings:
+            return messagebox.askyesno("Warning", warnings[0] + "\n\n" +
+                                       "Do you wish to continue with this value?")
+        return True
+
+    def scan_violations(self, limit=VALIDATION_LIST_LIMIT, lines=None):
+        """Check every occurrence in the file against VALIDATION_RULES.
+
+        Values are checked one group at a time with numpy, and line numbers
+        are only looked up for the first `limit` failures of each kind.
+        With lines, that text (e.g. the output about to be written) is
+        parsed and checked instead of the loaded program.
+        Returns (violations, error_count, warning_count) where violations
+        is a list of (line, param_type, severity, message) sorted by line.
+        """
+        import numpy as np
+        violations = []
+        counts = {'error': 0, 'warning': 0}
+        
+        # (param_type, line lookup, values) per parameter, in file order
+        groups = []
+        if lines is not None:
+            found = {}
+            for line_num, param_type, value, _ in SRCIndex.parse_lines(lines)[0]:
+                if param_type == 'ACT_DRIVE':
+                    value = 1.0 if value == 'TRUE' else 0.0
+                found.setdefault(param_type, ([], []))
+                found[param_type][0].append(line_num)
+                found[param_type][1].append(value)
+            for param_type, (line_nums, values) in found.items():
+                groups.append((param_type, line_nums.__getitem__, np.array(values, dtype=float)))
+        elif self.param_store:
+            values = column_to_numpy(self.param_store.values)
+            for group_name, group_ids in self.param_groups.items():
+                param_ids = column_to_numpy(group_ids)
+                groups.append((GROUP_PARAM_TYPES[group_name],
+                               lambda index, param_ids=param_ids: self.param_line(int(param_ids[index])),
+                               values[param_ids]))
+        
+        for param_type, line_of, group_values in groups:
+            for severity, indices, message in value_violations(param_type, group_values):
+                counts[severity] += len(indices)
+                for index in indices[:limit].tolist():
+                    shown = param_value_from_float(param_type, group_values[index])
+                    violations.append((line_of(index), param_type, severity,
+                                       f"{param_type}={shown} {message}"))
+        violations.sort()
+        return violations[:limit], counts['error'], counts['warning']
+
+    def show_violations(self, scan=None):
+        """List rule violations; double-click one to jump to its line."""
+        try:
+            violations, errors, warnings = scan if scan is not None else self.scan_violations()
+            if not violations:
+                messagebox.showinfo("Validation", "No problems found")
+                return
+            
+            window = tk.Toplevel(self.root)
+            window.title("Validation")
+            window.geometry("560x400")
+            
+            summary = f"{errors} errors, {warnings} warnings"
+            if errors + warnings > len(violations):
+                summary += f" (first {len(violations)} listed)"
+            tk.Label(window, text=summary + " - double-click to jump to the line",
+                     anchor='w').pack(fill='x', padx=5, pady=5)
+            
+            listbox = tk.Listbox(window, font=("Courier", 9))
+            list_scroll = Scrollbar(window, command=listbox.yview)
+            listbox.configure(yscrollcommand=list_scroll.set)
+            list_scroll.pack(side='right', fill='y')
+            listbox.pack(fill='both', expand=True, padx=5, pady=5)
+            for line_num, param_type, severity, message in violations:
+                listbox.insert(tk.END, f"Line {line_num:>8}  {severity.upper():<8} {message}")
+                if severity == 'error':
+                    listbox.itemconfig(tk.END, fg='red')
+            
+            def jump(event=None):
+                selection = listbox.curselection()
+                if selection:
+                    self.jump_to_line(violations[selection[0]][0])
+            listbox.bind('<Double-Button-1>', jump)
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to show validation results: {str(e)}")
+
+    def occurrence_lines(self, index=None):
+        """Sorted line numbers of every occurrence, per parameter type.
+
+        Taken straight from a parse index when one is current.
+        """
+        import numpy as np
+        index = index if index is not None else self.src_index
+        if index is not None:
+            types = column_to_numpy(index.occ_types)
+            lines = column_to_numpy(index.occ_lines)
+            return {param_type: lines[types == code].astype(np.int64)
+                    for code, param_type in enumerate(PARAM_TYPES)}
+        return {param_type: self.param_changes(param_type)[0] for param_type in PARAM_TYPES}
+
+    def export_patch(self):
+        """Save this session's edits, anchored by Z/layer/progress, as a JSON patch."""
+        try:
+            if not self.loaded_lines:
+                messagebox.showerror("Error", "Please load a file first")
+                return
+            patch = self.build_patch()
+            
+            input_name = os.path.splitext(os.path.basename(self.input_file))[0] if self.input_file else "edits"
+            file_path = filedialog.asksaveasfilename(defaultextension=".json", initialfile=f"{input_name}_patch.json",
+                                                     filetypes=[("Patch files", "*.json"), ("All files", "*.*")])
+            if not file_path:
+                return
+            with open(file_path, 'w', encoding='utf-8') as file:
+                json.dump(patch, file, indent=1)
+            messagebox.showinfo("Export Patch", f"Saved {len(patch['edits'])} line edits to {file_path}")
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export patch: {str(e)}")
+
+    def build_patch(self):
+        """This session's edits against the loaded program, as a patch dict."""
+        anchors = LayerAnchors(self.loaded_lines, MotionTable.from_index(self.baseline_index),
+                               self.occurrence_lines(self.baseline_index))
+        edits = []
+        for tag, i1, i2, j1, j2 in diff_lines(self.loaded_lines, self.content_lines):
+            old_block = self.loaded_lines[i1:i2]
+            new_block = self.content_lines[j1:j2]
+            
+            # Same parameters in the same order: plain value changes
+            if len(old_block) == len(new_block):
+                new_params = [SRCIndex.parse_lines([line])[0] for line in new_block]
+                if all(occurrences and line_key(old) == occurrences[0][1]
+                       for old, occurrences in zip(old_block, new_params)):
+                    for offset, occurrences in enumerate(new_params):
+                        edits.append({'op': 'set', 'anchor': anchors.anchor(i1 + offset + 1),
+                                      'value': occurrences[0][2]})
+                    continue
+            
+            # Header lines are carried by the DEF/PARKPOS fields instead
+            for offset, line in enumerate(old_block):
+                if not line.startswith(PATCH_HEADER_PREFIXES):
+                    edits.append({'op': 'delete', 'anchor': anchors.anchor(i1 + offset + 1)})
+            inserted = [line for line in new_block if not line.startswith(PATCH_HEADER_PREFIXES)]
+            if inserted:
+                edits.append({'op': 'insert', 'anchor': anchors.anchor(i1), 'lines': inserted})
+        
+        return {
+            'version': PATCH_VERSION,
+            'source': os.path.basename(self.input_file) if self.input_file else None,
+            'def': self.def_entry.get() if self.def_entry.get() != self.baseline_index.def_value else None,
+            'parkpos': (self.parkpos_entry.get()
+                        if self.parkpos_entry.get() != self.baseline_index.parkpos_value else None),
+            'custom_z_params': [[z, params] for z, params in self.custom_z_params.items() if params],
+            'print_progress_params': [[percent, params] for percent, params in self.print_progress_params.items()
+                                      if params],
+            'edits': edits,
+        }
+
+    def apply_patch(self, file_path=None):
+        """Replay an exported patch onto the loaded program.
+
+        Anchors are resolved through the Z and progress indexes, and the
+        program is rewritten in a single pass. Anchors that cannot be found
+        are skipped and listed.
+        """
+        try:
+            if not self.content_lines:
+                messagebox.showerror("Error", "Please load the program to patch first")
+                return
+            if file_path is None:
+                file_path = filedialog.askopenfilename(filetypes=[("Patch files", "*.json"), ("All files", "*.*")])
+                if not file_path:
+                    return
+            with open(file_path, 'r', encoding='utf-8') as file:
+                patch = json.load(file)
+            if patch.get('version') != PATCH_VERSION:
+                messagebox.showerror("Error", f"Unsupported patch version {patch.get('version')}")
+                return
+            
+            unresolved = self.apply_patch_data(patch)
+            messagebox.showinfo("Apply Patch", self.patch_report(patch, unresolved))
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to apply patch: {str(e)}")
+
+    def apply_patch_data(self, patch):
+        """Apply a patch dict to the current program; returns the unresolved edits."""
+        anchors = LayerAnchors(self.content_lines, self.get_motion_table(), self.occurrence_lines())
+        sets = {}
+        deletes = set()
+        inserts = {}
+        unresolved = []
+        for edit in patch['edits']:
+            line_num = anchors.resolve(edit['anchor'], self.progress_index)
+            if line_num is None:
+                unresolved.append(edit)
+            elif edit['op'] == 'set':
+                sets[line_num] = (edit['anchor']['key'], edit['value'])
+            elif edit['op'] == 'delete':
+                deletes.add(line_num)
+            else:
+                inserts.setdefault(line_num, []).extend(edit['lines'])
+        
+        # Rewrite the program in one pass, noting the span that changed
+        new_lines = list(inserts.get(0, ()))
+        first = 1 if new_lines else None
+        last = 0
+        for line_num, line in enumerate(self.content_lines, 1):
+            old_line = line
+            if line_num not in deletes:
+                if line_num in sets:
+                    line = format_param_line(sets[line_num][0], line, sets[line_num][1])
+                elif patch.get('def') is not None and line.startswith("DEF "):
+                    line = f"DEF {patch['def']}"
+                elif patch.get('parkpos') is not None and line.startswith("PARKPOS = "):
+                    line = f"PARKPOS = {patch['parkpos']}"
+                new_lines.append(line)
+            if line_num in deletes or line is not old_line or line_num in inserts:
+                first = line_num if first is None else first
+                last = line_num
+            new_lines.extend(inserts.get(line_num, ()))
+        
+        # Applied as one undoable edit of that span, before the lists change
+        if first is None:
+            self.save_state()
+        else:
+            last = max(last, first)
+            tail = len(self.content_lines) - last
+            self.apply_line_edit(first, last + 1, new_lines[first - 1:len(new_lines) - tail])
+        for entry, value in ((self.def_entry, patch.get('def')), (self.parkpos_entry, patch.get('parkpos'))):
+            if value is not None:
+                entry.delete(0, tk.END)
+                entry.insert(0, value)
+        
+        # Z-height and progress parameter lists
+        for key, frame_name, is_z_height in (('custom_z_params', "Z Height", True),
+                                             ('print_progress_params', "Print Progress", False)):
+            params_dict = self.custom_z_params if is_z_height else self.print_progress_params
+            frames = self.z_param_frames if is_z_height else self.print_progress_frames
+            for value, params in patch.get(key, []):
+                if not is_z_height and self.progress_line(value) is None:
+                    unresolved.append({'op': 'progress', 'anchor': {'progress': value}})
+                    continue
+                params_dict.setdefault(value, {}).update(params)
+                if value not in frames or not frames[value].winfo_exists():
+                    frames.pop(value, None)
+                    self.create_print_progress_frame(value, frame_name, is_z_height)
+                self.refresh_progress_params(value, is_z_height)
+        
+        self.update_preview()
+        self.modify_button.config(state=tk.NORMAL)
+        self.save_button.config(state=tk.NORMAL)
+        return unresolved
+
+    @staticmethod
+    def patch_report(patch, unresolved):
+        """Summary of an applied patch, listing anchors that were not found."""
+        applied = len(patch['edits']) - sum(1 for edit in unresolved if edit['op'] != 'progress')
+        report = f"Applied {applied} of {len(patch['edits'])} line edits."
+        if unresolved:
+            report += f"\n\n{len(unresolved)} anchors could not be found:\n"
+            for edit in unresolved[:20]:
+                anchor = edit['anchor']
+                if 'progress' in anchor:
+                    report += f"- {edit['op']} at PRINT_PROGRESS={anchor['progress']}\n"
+                else:
+                    report += f"- {edit['op']} {anchor['key']} #{anchor['nth'] + 1} at Z={anchor['z']}\n"
+            if len(unresolved) > 20:
+                report += f"... and {len(unresolved) - 20} more\n"
+        return report
+
+    def watch_source(self):
+        """Poll the open program's mtime and size; re-armed with root.after."""
+        try:
+            if self.input_file and self.source_stat is not None:
+                stat = os.stat(self.input_file)
+                if (stat.st_mtime_ns, stat.st_size) != self.source_stat:
+                    self.source_stat = (stat.st_mtime_ns, stat.st_size)
+                    self.reload_source()
+        except OSError:
+            pass  # Being rewritten or removed; look again next time
+        self.root.after(WATCH_INTERVAL_MS, self.watch_source)
+
+    def reload_source(self):
+        """Take in an external rewrite of the open program.
+
+        Only the chunks whose hashes changed are re-parsed, and pending
+        edits are re-applied through their Z/progress anchors as line edits.
+        """
+        try:
+            with open(self.input_file, 'rb') as file:
+                data = file.read()
+            content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+            lines = content.splitlines()
+            if lines == self.loaded_lines:
+                return
+            
+            # Nothing to carry over if the file now holds the current content
+            patch = self.build_patch() if lines != self.content_lines else None
+            pending = patch is not None and any(patch[key] for key in ('edits', 'custom_z_params',
+                                                                       'print_progress_params', 'def', 'parkpos'))
+            name = os.path.basename(self.input_file)
+            if pending and not messagebox.askyesno("File Changed",
+                    f"{name} was changed on disk.\n\n" +
+                    f"Reload it and re-apply your {len(patch['edits'])} pending line edits?"):
+                return
+            
+            chunks = chunk_hashes(lines)
+            start, old_stop, new_stop = changed_span(self.source_chunks, chunks)
+            index = self.baseline_index.splice(lines, start, old_stop, new_stop)
+            cache_key = self.parse_cache.key_for(self.input_file, data)
+            self.parse_cache.store(cache_key, index)
+            
+            # The new file becomes the loaded program
+            if self.journal is not None:
+                self.journal.close(delete=True)
+                self.journal = None
+            self.original_content = content
+            self.loaded_lines = list(self.content_lines)
+            self.baseline_index = index
+            self.baseline_estimator = None
+            self.motion_table = None
+            self.time_estimator = None
+            self.source_chunks = chunks
+            self.custom_z_params = {}
+            self.print_progress_params = {}
+            self.z_param_frames = {}
+            self.print_progress_frames = {}
+            
+            # Undo states hold spans of the old content; the re-applied edits
+            # below become the only undoable step
+            self.undo_state = None
+            self.redo_state = None
+            self.undo_button.config(state=tk.DISABLED)
+            self.redo_button.config(state=tk.DISABLED)
+            for entry, value in ((self.def_entry, index.def_value), (self.parkpos_entry, index.parkpos_value)):
+                if value is not None:
+                    entry.delete(0, tk.END)
+                    entry.insert(0, value)
+            self.extract_params_from_file(index)
+            self.create_param_entries()
+            
+            unresolved = self.apply_patch_data(patch) if pending else []
+            if not pending:
+                self.update_preview()
+            if self.active_document is not None:
+                self.active_document.cache_key = cache_key
+            self.start_journal(cache_key)
+            self.compact_journal()
+            
+            if unresolved:
+                messagebox.showwarning("File Changed", f"{name} was reloaded.\n\n" +
+                                       self.patch_report(patch, unresolved))
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to reload changed file: {str(e)}")
+
+    def new_document(self, file_path):
+        """Put the active document aside and start an empty one in a new tab."""
+        if self.active_document is not None:
+            self.store_active_document()
+        self.reset_document_state()
+        document = Document(file_path)
+        self.documents.append(document)
+        self.active_document = document
+        self.touch_document(document)
+        
+        document.tab = tk.Frame(self.tab_bar)
+        self.switching_tabs = True
+        self.tab_bar.add(document.tab, text=document.title)
+        self.tab_bar.select(document.tab)
+        self.switching_tabs = False
+        return document
+
+    def reset_document_state(self):
+        """Fresh per-document attributes (new objects, never cleared in place)."""
+        for name in DOCUMENT_STATE:
+            setattr(self, name, None)
+        for name in ('progress_index', 'param_groups', 'trigger_params', 'custom_z_params',
+                     'print_progress_params', 'z_param_frames', 'print_progress_frames'):
+            setattr(self, name, {})
+
+    def touch_document(self, document):
+        self.document_clock += 1
+        document.last_used = self.document_clock
+
+    def store_active_document(self):
+        """Move the active document's state from the app into its Document."""
+        document = self.active_document
+        for name in DOCUMENT_STATE:
+            document.state[name] = getattr(self, name)
+        document.fields = {
+            'def': self.def_entry.get(),
+            'parkpos': self.parkpos_entry.get(),
+            'output': self.output_name.get(),
+            'preview': self.preview_text.yview()[0] if self.preview_text else 0.0,
+        }
+        document.text_bytes = Document.measure(self.content_lines)
+        if self.journal is not None:
+            self.journal.flush()
+
+    def on_tab_changed(self, event=None):
+        if getattr(self, 'switching_tabs', False):
+            return
+        selected = self.tab_bar.select()
+        for document in self.documents:
+            if str(document.tab) == selected:
+                self.switch_document(document)
+                break
+
+    def switch_document(self, document):
+        """Make another open document the active one, without re-parsing it."""
+        try:
+            if document is self.active_document:
+                return
+            if self.active_document is not None:
+                self.store_active_document()
+            if not document.resident:
+                skipped = document.reload()
+                if skipped:
+                    messagebox.showwarning("Workspace",
+                        f"{document.path} changed on disk; {skipped} edits could not be replayed")
+            
+            for name in DOCUMENT_STATE:
+                setattr(self, name, document.state.get(name))
+            document.state = {}
+            self.active_document = document
+            self.touch_document(document)
+            
+            # Rebuild the widgets from the kept state
+            for entry, key in ((self.def_entry, 'def'), (self.parkpos_entry, 'parkpos'), (self.output_name, 'output')):
+                entry.delete(0, tk.END)
+                entry.insert(0, document.fields.get(key, ''))
+            self.z_param_frames = {}
+            self.print_progress_frames = {}
+            self.create_param_entries()
+            self.rebuild_progress_frames()
+            self.update_preview()
+            if self.preview_text:
+                self.preview_text.yview_moveto(document.fields.get('preview', 0.0))
+            self.undo_button.config(state=tk.NORMAL if self.undo_state else tk.DISABLED)
+            self.redo_button.config(state=tk.NORMAL if self.redo_state else tk.DISABLED)
+            
+            self.switching_tabs = True
+            self.tab_bar.select(document.tab)
+            self.switching_tabs = False
+            self.evict_documents()
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to switch document: {str(e)}")
+
+    def evict_documents(self):
+        """Drop the text of least recently used inactive documents over the budget."""
+        resident = [document for document in self.documents
+                    if document is not self.active_document and document.resident]
+        total = Document.measure(self.content_lines) + sum(document.text_bytes for document in resident)
+        for document in sorted(resident, key=lambda document: document.last_used):
+            if total <= self.memory_budget:
+                break
+            total -= document.evict()
+
+    def close_document(self):
+        """Close the active tab, discarding its journal (after asking, if it has edits)."""
+        try:
+            document = self.active_document
+            if document is None:
+                return
+            if self.document_unsaved(document):
+                answer = messagebox.askyesnocancel("Close Tab", f"{document.title} has unsaved edits.\n\n"
+                                                   "Save them before closing?")
+                if answer is None or (answer and not self.modify_file()):
+                    return
+            if self.journal is not None:
+                self.journal.close(delete=True)
+            self.documents.remove(document)
+            self.switching_tabs = True
+            self.tab_bar.forget(document.tab)
+            self.switching_tabs = False
+            document.tab.destroy()
+            self.active_document = None
+            
+            if self.documents:
+                self.switch_document(max(self.documents, key=lambda other: other.last_used))
+            else:
+                self.reset_document_state()
+                self.create_param_entries()
+                if self.preview_text:
+                    self.preview_text.delete('1.0', tk.END)
+                self.modify_button.config(state=tk.DISABLED)
+                self.save_button.config(state=tk.DISABLED)
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to close document: {str(e)}")
+
+    def rebuild_progress_frames(self):
+        """Create the Z-height and progress frames for the current parameter lists."""
+        for params_dict, frame_name, is_z_height in ((self.custom_z_params, "Z Height", True),
+                                                     (self.print_progress_params, "Print Progress", False)):
+            for value in params_dict:
+                self.create_print_progress_frame(value, frame_name, is_z_height)
+                self.refresh_progress_params(value, is_z_height)
+
+    def start_journal(self, cache_key, records=()):
+        """Start a fresh journal for the loaded program."""
+        try:
+            if self.journal is not None:
+                self.journal.close(delete=True)
+            self.journal = EditJournal(EditJournal.path_for(self.input_file))
+            self.journal.start({'file': os.path.abspath(self.input_file), 'key': cache_key,
+                                'started': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, records)
+            self.journal.record_dicts(self.custom_z_params, self.print_progress_params)
+        except OSError as e:
+            self.journal = None
+            self.warn_journal("start", e)
+
+    def flush_journal(self):
+        """Write out pending journal records; re-arms itself."""
+        try:
+            if self.journal is not None:
+                self.journal.record_dicts(self.custom_z_params, self.print_progress_params)
+                self.journal.flush()
+        except OSError as e:
+            self.warn_journal("write", e)
+        self.root.after(JOURNAL_FLUSH_MS, self.flush_journal)
+
+    def compact_journal(self):
+        """Rewrite the journal as the minimal edits from the loaded file."""
+        if self.journal is None or not self.loaded_lines:
+            return
+        try:
+            records = [{'t': 'edit', 's': i1 + 1, 'o': self.loaded_lines[i1:i2], 'n': self.content_lines[j1:j2]}
+                       for tag, i1, i2, j1, j2 in reversed(diff_lines(self.loaded_lines, self.content_lines))]
+            header, _ = EditJournal.read(self.journal.path)
+            self.journal.buffer = []
+            self.journal.buffered_bytes = 0
+            self.journal.last_dicts = None
+            self.journal.start(header, records)
+            self.journal.record_dicts(self.custom_z_params, self.print_progress_params)
+            self.journal.flush()
+        except (OSError, TypeError) as e:
+            self.warn_journal("compact", e)
+
+    def warn_journal(self, action, error):
+        """Tell the operator, once per program, that crash recovery is not working."""
+        if self.input_file in self.journal_warned:
+            return
+        self.journal_warned.add(self.input_file)
+        messagebox.showwarning("Crash Recovery", f"Failed to {action} the edit journal for "
+                               f"{os.path.basename(self.input_file or '')}: {str(error)}\n\n"
+                               "Edits will not be recoverable if the program closes unexpectedly.")
+
+    def offer_restore(self):
+        """On start, offer to restore sessions that did not close cleanly."""
+        for path in EditJournal.pending():
+            try:
+                header, records = EditJournal.read(path)
+                edits = sum(1 for record in records if record['t'] in ('edit', 'lines'))
+                if header is None or (not edits and not any(record['t'] == 'dicts' and (record['z'] or record['p'])
+                                                              for record in records)):
+                    os.remove(path)
+                    continue
+                if not messagebox.askyesno("Restore Session",
+                        f"Unsaved edits to {header['file']} were found from {header.get('started', 'an earlier session')}"
+                        f" ({edits} edits).\n\nRestore them?"):
+                    os.remove(path)
+                    continue
+                self.restore_session(header, records)
+                self.flush_journal()
+                return  # One session at a time; the rest are offered next start
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to restore session: {str(e)}")
+        self.flush_journal()
+
+    def restore_session(self, header, records):
+        """Reload the original program and replay journal records onto it."""
+        if not os.path.exists(header['file']):
+            messagebox.showerror("Error", f"{header['file']} no longer exists")
+            return
+        with open(header['file'], 'rb') as file:
+            data = file.read()
+        if self.parse_cache.key_for(header['file'], data) != header['key']:
+            if not messagebox.askyesno("Restore Session",
+                    f"{header['file']} has changed since the edits were made.\n\n" +
+                    "Try to replay the edits anyway?"):
+                return
+        
+        cache_key = self.open_program(header['file'], journal=False)
+        if cache_key is None:
+            return
+        lines = list(self.content_lines)
+        applied, dicts = EditJournal.replay(lines, records)
+        
+        # The content is rebuilt directly; the new journal starts from it
+        self.original_content = '\n'.join(lines) + '\n'
+        if dicts is not None:
+            self.custom_z_params = {z: params for z, params in dicts['z']}
+            self.print_progress_params = {percent: params for percent, params in dicts['p']}
+        self.extract_params_from_file()
+        self.create_param_entries()
+        self.rebuild_progress_frames()
+        self.update_preview()
+        self.start_journal(cache_key)
+        self.compact_journal()
+        self.modify_button.config(state=tk.NORMAL)
+        self.save_button.config(state=tk.NORMAL)
+        
+        if applied < len(records):
+            messagebox.showwarning("Restore Session",
+                f"Restored {applied} of {len(records)} journal records; the rest no longer matched the file.")
+
+    def document_unsaved(self, document):
+        if document is self.active_document:
+            return self.content_lines != self.loaded_lines or (self.journal is not None and self.journal.has_edits())
+        return document.has_unsaved_edits()
+
+    def on_close(self):
+        """Closing normally discards the crash-recovery journals, after offering to save edits."""
+        try:
+            for document in list(self.documents):
+                if not self.document_unsaved(document):
+                    continue
+                answer = messagebox.askyesnocancel("Quit", f"{document.title} has unsaved edits.\n\n"
+                                                   "Save them before quitting?")
+                if answer is None:
+                    return
+                if answer:
+                    self.switch_document(document)
+                    if not self.modify_file():
+                        return
+            journals = [self.journal] + [document.state.get('journal') for document in self.documents]
+            for journal in journals:
+                if journal is not None:
+                    journal.close(delete=True)
+        except OSError:
+            pass
+        self.root.destroy()
+
+    def show_diff(self):
+        """Side-by-side view of the loaded program against the current output.
+
+        Only one page of hunks is put into the text widgets at a time.
+        """
+        try:
+            if not self.loaded_lines:
+                messagebox.showerror("Error", "Please load a file first")
+                return
+            
+            new_lines = [line.rstrip('\n') for line in self.calculate_new_params()]
+            old_lines = self.loaded_lines
+            hunks = diff_hunks(diff_lines(old_lines, new_lines), len(old_lines), len(new_lines))
+            if not hunks:
+                messagebox.showinfo("Changes", "No changes since the file was loaded")
+                return
+            
+            window = tk.Toplevel(self.root)
+            window.title("Changes")
+            window.geometry("1100x650")
+            
+            nav_frame = tk.Frame(window)
+            nav_frame.pack(fill='x', padx=5, pady=5)
+            position_label = tk.Label(nav_frame, anchor='w')
+            
+            text_frame = tk.Frame(window)
+            text_frame.pack(fill='both', expand=True, padx=5, pady=5)
+            texts = []
+            for column, title in enumerate(("As loaded", "Modified")):
+                tk.Label(text_frame, text=title, font=("Arial", 9, "bold")).grid(row=0, column=column)
+                text = Text(text_frame, wrap='none', font=("Courier", 9))
+                text.grid(row=1, column=column, sticky='nsew')
+                text.tag_configure('removed', background='#ffd7d7')
+                text.tag_configure('added', background='#d7ffd7')
+                text.tag_configure('filler', background='#eeeeee')
+                text.tag_configure('header', background='#dde6ff', font=("Courier", 9, "bold"))
+                texts.append(text)
+                text_frame.grid_columnconfigure(column, weight=1)
+            text_frame.grid_rowconfigure(1, weight=1)
+            
+            # One scrollbar drives both sides
+            def scroll_both(*args):
+                for text in texts:
+                    text.yview(*args)
+            scrollbar = Scrollbar(text_frame, command=scroll_both)
+            scrollbar.grid(row=1, column=2, sticky='ns')
+            for text in texts:
+                text.configure(yscrollcommand=scrollbar.set)
+            
+            state = {'hunk': 0}
+            
+            def side_by_side(hunk):
+                """Aligned (old_number, old_line, new_number, new_line, tag) rows of a hunk."""
+                i, i2, j, j2, changes = hunk
+                rows = []
+                for tag, a1, a2, b1, b2 in changes + [(None, i2, i2, j2, j2)]:
+                    while i < a1:
+                        rows.append((i + 1, old_lines[i], j + 1, new_lines[j], None))
+                        i += 1
+                        j += 1
+                    for k in range(max(a2 - a1, b2 - b1)):
+                        old_row = (a1 + k + 1, old_lines[a1 + k]) if a1 + k < a2 else (None, '')
+                        new_row = (b1 + k + 1, new_lines[b1 + k]) if b1 + k < b2 else (None, '')
+                        rows.append(old_row + new_row + (tag,))
+                    i, j = a2, b2
+                return rows
+            
+            def render():
+                first = state['hunk'] - state['hunk'] % DIFF_HUNKS_PER_PAGE
+                page = hunks[first:first + DIFF_HUNKS_PER_PAGE]
+                for text in texts:
+                    text.config(state='normal')
+                    text.delete('1.0', tk.END)
+                header_lines = {}
+                line = 1
+                for number, hunk in enumerate(page, first):
+                    header = f"@@ -{hunk[0] + 1},{hunk[1] - hunk[0]} +{hunk[2] + 1},{hunk[3] - hunk[2]} @@\n"
+                    header_lines[number] = line
+                    for text in texts:
+                        text.insert(tk.END, header, 'header')
+                    line += 1
+                    for old_number, old_line, new_number, new_line, tag in side_by_side(hunk):
+                        for text, row_number, content, changed in ((texts[0], old_number, old_line, 'removed'),
+                                                                    (texts[1], new_number, new_line, 'added')):
+                            if row_number is None:
+                                text.insert(tk.END, "\n", 'filler')
+                            else:
+                                text.insert(tk.END, f"{row_number:>8}  {content}\n", changed if tag else ())
+                        line += 1
+                for text in texts:
+                    text.config(state='disabled')
+                    text.yview(f"{header_lines[state['hunk']]}.0")
+                position_label.config(text=f"Hunk {state['hunk'] + 1} of {len(hunks)}")
+            
+            def move(step):
+                state['hunk'] = min(max(state['hunk'] + step, 0), len(hunks) - 1)
+                render()
+            
+            tk.Button(nav_frame, text="◀ Previous", command=lambda: move(-1)).pack(side='left', padx=2)
+            tk.Button(nav_frame, text="Next ▶", command=lambda: move(1)).pack(side='left', padx=2)
+            position_label.pack(side='left', padx=10)
+            window.bind('<n>', lambda event: move(1))
+            window.bind('<p>', lambda event: move(-1))
+            render()
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to show changes: {str(e)}")
+
+    def get_motion_table(self):
+        """Z/layer table for the current content, rebuilt only after moves change."""
+        if self.motion_table is None:
+            if self.src_index is not None:
+                self.motion_table = MotionTable.from_index(self.src_index)
+            else:
+                self.motion_table = MotionTable.from_lines(self.content_lines)
+        return self.motion_table
+
+    def get_timeline(self):
+        """Effective-state timeline, built in one pass over the occurrences."""
+        import numpy as np
+        motion = self.get_motion_table()
+        if self.timeline is None or self.timeline.motion is not motion:
+            all_values = column_to_numpy(self.param_store.values)
+            changes = {}
+            for param_type in PARAM_TYPES:
+                param_ids = column_to_numpy(self.param_groups.get(PARAM_GROUP_NAMES[param_type], array('i')))
+                lines = np.fromiter((self.param_line(param_id) for param_id in param_ids),
+                                    dtype=np.int64, count=len(param_ids))
+                changes[param_type] = (param_ids, lines, all_values[param_ids])
+            self.timeline = EffectiveTimeline(changes, motion)
+        return self.timeline
+
+    def param_changes(self, param_type):
+        """Lines and values of every assignment of a parameter, in file order."""
+        return self.get_timeline().changes(param_type)
+
+    def move_speeds(self, motion, vel_lines, vel_values):
+        """Effective $VEL.CP of every move in mm/s.
+
+        Moves before the first $VEL.CP use the first value.
+        """
+        default = vel_values[0] if len(vel_values) else 0.0
+        return effective_values(vel_lines, vel_values, motion.lines, default) * VEL_CP_TO_MM_S
+
+    def get_time_estimator(self):
+        """Estimator for the current content, refreshed incrementally."""
+        motion = self.get_motion_table()
+        estimator = self.time_estimator
+        if estimator is None or estimator.motion is not motion or estimator.acceleration != self.acceleration:
+            estimator = self.time_estimator = PrintTimeEstimator(motion, self.acceleration)
+        estimator.set_speeds(self.move_speeds(motion, *self.param_changes('$VEL.CP')))
+        return estimator
+
+    def get_baseline_estimator(self):
+        """Estimator for the file as it was loaded."""
+        import numpy as np
+        index = self.baseline_index
+        if index is None:
+            return None
+        estimator = self.baseline_estimator
+        if estimator is None or estimator.acceleration != self.acceleration:
+            motion = MotionTable.from_index(index)
+            estimator = self.baseline_estimator = PrintTimeEstimator(motion, self.acceleration)
+            code = PARAM_TYPES.index('$VEL.CP')
+            types = column_to_numpy(index.occ_types)
+            vel_lines = column_to_numpy(index.occ_lines)[types == code]
+            vel_values = column_to_numpy(index.occ_values)[types == code]
+            estimator.set_speeds(self.move_speeds(motion, vel_lines, vel_values))
+        return estimator
+
+    def show_time_estimate(self):
+        """Window with total and per-layer print time, before and after edits."""
+        try:
+            if not self.content_lines:
+                messagebox.showerror("Error", "Please load a file first")
+                return
+            
+            window = tk.Toplevel(self.root)
+            window.title("Print Time Estimate")
+            window.geometry("520x500")
+            
+            settings_frame = tk.Frame(window)
+            settings_frame.pack(fill='x', padx=5, pady=5)
+            tk.Label(settings_frame, text="Acceleration (mm/s²):").pack(side='left')
+            accel_var = tk.StringVar(value=f"{self.acceleration:g}")
+            tk.Entry(settings_frame, textvariable=accel_var, width=10).pack(side='left', padx=5)
+            
+            summary_label = tk.Label(window, justify='left', anchor='w', font=("Arial", 10, "bold"))
+            summary_label.pack(fill='x', padx=5)
+            
+            table = Text(window, wrap='none', font=("Courier", 9))
+            table_scroll = Scrollbar(window, command=table.yview)
+            table.configure(yscrollcommand=table_scroll.set)
+            table_scroll.pack(side='right', fill='y')
+            table.pack(fill='both', expand=True, padx=5, pady=5)
+            
+            def refresh():
+                try:
+                    acceleration = float(accel_var.get())
+                    if acceleration <= 0:
+                        raise ValueError
+                except ValueError:
+                    messagebox.showerror("Error", "Acceleration must be a positive number")
+                    return
+                self.acceleration = acceleration
+                
+                after = self.get_time_estimator()
+                before = self.get_baseline_estimator()
+                after_layers = after.layer_times()
+                before_layers = before.layer_times() if before else None
                 
-                toggle_func = make_toggle_function(content_frame, arrow_btn, header_label, param_type)
-                arrow_btn.bind('<Button-1>', toggle_func)
-                header_label.bind('<Button-1>', toggle_func)
+                total_after = after.total_time()
+                summary = f"Estimated print time: {format_duration(total_after)}"
+                if before is not None:
+                    total_before = before.total_time()
+                    delta = total_after - total_before
+                    summary += (f"\nAs loaded: {format_duration(total_before)}   "
+                                f"Change: {'+' if delta >= 0 else '-'}{format_duration(abs(delta))}")
+                summary_label.config(text=summary)
                 
-                # Create entries for parameters
-                for param_key in param_keys:
-                    row = tk.Frame(content_frame)
-                    row.pack(fill='x', padx=5, pady=2)
-                    
-                    # Extract just the variable name and line number
-                    param_parts = param_key.split(' (')
-                    var_name = param_parts[1].split(')')[0]  # Gets the variable name (e.g., $VEL.CP)
-                    line_num = param_parts[-1].split(')')[0]  # Gets the line number
-                    simplified_label = f"{var_name} ({line_num})"
-                    
-                    tk.Label(row, text=simplified_label).pack(side='left')
-                    
-                    value_var = tk.StringVar(value=str(self.params[param_key]))
-                    if "Drive" in param_key:
-                        entry = ttk.Combobox(row, textvariable=value_var, values=['TRUE', 'FALSE'],
-                                            width=7)
-                    else:
-                        entry = tk.Entry(row, width=10, textvariable=value_var)
-                    entry.pack(side='right')
-                    
-                    self.entries[param_key] = entry
-                    
-                    # Accept button
-                    accept_btn = tk.Button(row, text="✓", bg='LIGHT GREEN', fg='white',
-                                         command=lambda k=param_key, v=value_var, ln=self.param_line_numbers[param_key]:
-                                         self.update_line_and_preview(k, v, ln))
-                    accept_btn.pack(side='right', padx=2)
-                    
-                    # Delete button
-                    delete_btn = tk.Button(row, text="✕", bg='#ffb3b3', fg='white',
-                                         command=lambda k=param_key, ln=self.param_line_numbers[param_key]:
-                                         self.delete_parameter(k, ln))
-                    delete_btn.pack(side='right', padx=2)
-                    
-                    # Jump button
-                    if param_key in self.param_line_numbers:
-                        jump_btn = tk.Button(row, text="→",
-                                           command=lambda ln=self.param_line_numbers[param_key]: self.jump_to_line(ln),
-                                           bg='light blue')
-                        jump_btn.pack(side='right', padx=5)
-                    
+                # Per-layer rows; before/after only line up if the layers do
+                comparable = before_layers is not None and len(before_layers) == len(after_layers)
+                layer_z = after.motion.z[after.motion.layer_starts]
+                rows = [f"{'Layer':>6} {'Z':>9} {'Time (s)':>10}" + (f" {'Before':>10} {'Change':>9}" if comparable else "")]
+                for layer, (z, seconds) in enumerate(zip(layer_z, after_layers), 1):
+                    row = f"{layer:>6} {z:>9.3f} {seconds:>10.2f}"
+                    if comparable:
+                        row += f" {before_layers[layer - 1]:>10.2f} {seconds - before_layers[layer - 1]:>+9.2f}"
+                    rows.append(row)
+                table.config(state='normal')
+                table.delete('1.0', tk.END)
+                table.insert('1.0', "\n".join(rows))
+                table.config(state='disabled')
+            
+            tk.Button(settings_frame, text="Recalculate", command=refresh).pack(side='left')
+            refresh()
+            
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to create parameter entries: {str(e)}")
+            messagebox.showerror("Error", f"Failed to estimate print time: {str(e)}")
 
-    def update_line_and_preview(self, key, value_var, line_number):
+    def show_speed_optimizer(self):
+        """Window that computes, previews and applies a per-layer $VEL.CP schedule."""
         try:
-            # Save current state before update
-            self.save_state()
+            if not self.content_lines:
+                messagebox.showerror("Error", "Please load a file first")
+                return
             
-            # Validate and get the value based on parameter type
-            if "Feed Rate" in key:  # For $VEL.CP
-                value = float(value_var.get())
-                if value > 2:
-                    messagebox.showerror("Error", "Maximum value for $VEL.CP is 2")
+            window = tk.Toplevel(self.root)
+            window.title("Optimize Cycle Time")
+            window.geometry("620x560")
+            
+            settings_frame = tk.Frame(window)
+            settings_frame.pack(fill='x', padx=5, pady=5)
+            settings = {}
+            for row, (key, label, default) in enumerate([
+                    ('min_layer_time', "Minimum layer time (s):", 10.0),
+                    ('min_speed', "Minimum $VEL.CP:", 0.05),
+                    ('max_speed', "Maximum $VEL.CP:", VEL_CP_WARN_VALUE),
+                    ('max_step', "Max change between layers:", 0.05)]):
+                tk.Label(settings_frame, text=label).grid(row=row, column=0, sticky='w')
+                settings[key] = tk.StringVar(value=f"{default:g}")
+                tk.Entry(settings_frame, textvariable=settings[key], width=10).grid(row=row, column=1, sticky='w')
+            
+            summary_label = tk.Label(window, justify='left', anchor='w', font=("Arial", 10, "bold"))
+            summary_label.pack(fill='x', padx=5)
+            
+            table = Text(window, wrap='none', font=("Courier", 9))
+            table_scroll = Scrollbar(window, command=table.yview)
+            table.configure(yscrollcommand=table_scroll.set)
+            
+            button_frame = tk.Frame(window)
+            button_frame.pack(side='bottom', fill='x', padx=5, pady=5)
+            table_scroll.pack(side='right', fill='y')
+            table.pack(fill='both', expand=True, padx=5, pady=5)
+            
+            schedule = {}
+            
+            def calculate():
+                try:
+                    values = {key: float(var.get()) for key, var in settings.items()}
+                except ValueError:
+                    messagebox.showerror("Error", "Please enter valid numbers")
                     return
-                if value > 0.5:
-                    if not messagebox.askyesno("Warning", 
-                        "Values above 0.5 for $VEL.CP could be dangerous.\n\n" +
-                        "Do you wish to continue with this value?"):
-                        return
-            elif "Tool Speed" in key:  # For TOOL_RPM
-                value = float(value_var.get())
-                if value > 139.8:
-                    messagebox.showerror("Error", "Maximum value for TOOL_RPM is 139.8")
+                if not 0 < values['min_speed'] <= values['max_speed'] <= PARAM_MAX_VALUES['$VEL.CP']:
+                    messagebox.showerror("Error",
+                        f"Speeds must satisfy 0 < minimum <= maximum <= {PARAM_MAX_VALUES['$VEL.CP']:g}")
                     return
-            elif "Cooling" in key:  # For LAYER_COOLING
-                value = int(value_var.get())
-                if value > 200:
-                    messagebox.showerror("Error", "Maximum value for LAYER_COOLING is 200")
+                if values['min_layer_time'] < 0 or values['max_step'] <= 0:
+                    messagebox.showerror("Error", "Layer time cannot be negative and the max change must be positive")
                     return
-            else:  # For other parameters
-                value = value_var.get()
+                
+                estimator = self.get_time_estimator()
+                if not estimator.motion.layer_count:
+                    messagebox.showerror("Error", "No LIN moves found")
+                    return
+                speeds, too_fast = optimize_layer_speeds(estimator, values['min_layer_time'], values['min_speed'],
+                                                         values['max_speed'], values['max_step'])
+                new_times = estimator.layer_times_at(speeds * VEL_CP_TO_MM_S)
+                old_times = estimator.layer_times()
+                old_speeds = estimator.speeds[estimator.motion.layer_starts] / VEL_CP_TO_MM_S
+                schedule.update(speeds=speeds, max_speed=values['max_speed'], motion=estimator.motion)
+                
+                saving = old_times.sum() - new_times.sum()
+                summary = (f"Current: {format_duration(old_times.sum())}   "
+                           f"Optimized: {format_duration(new_times.sum())}   "
+                           f"{'Saves' if saving >= 0 else 'Adds'} {format_duration(abs(saving))}")
+                if too_fast.any():
+                    summary += f"\n{int(too_fast.sum())} layers stay under the minimum time even at the minimum speed"
+                summary_label.config(text=summary)
+                
+                layer_z = estimator.motion.z[estimator.motion.layer_starts]
+                rows = [f"{'Layer':>6} {'Z':>9} {'$VEL.CP':>8} {'New':>8} {'Time (s)':>9} {'New (s)':>9}"]
+                for layer in range(len(speeds)):
+                    rows.append(f"{layer + 1:>6} {layer_z[layer]:>9.3f} {old_speeds[layer]:>8.4f} "
+                                f"{speeds[layer]:>8.4f} {old_times[layer]:>9.2f} {new_times[layer]:>9.2f}"
+                                + ("  !" if too_fast[layer] else ""))
+                table.config(state='normal')
+                table.delete('1.0', tk.END)
+                table.insert('1.0', "\n".join(rows))
+                table.config(state='disabled')
+                apply_btn.config(state=tk.NORMAL)
+            
+            def apply():
+                if schedule.get('motion') is not self.get_motion_table():
+                    messagebox.showerror("Error", "The program changed; please calculate again")
+                    return
+                if not self.apply_layer_speeds(schedule['speeds']):
+                    return
+                apply_btn.config(state=tk.DISABLED)
+                calculate()
+            
+            tk.Button(button_frame, text="Calculate", command=calculate).pack(side='left', padx=5)
+            apply_btn = tk.Button(button_frame, text="Apply", command=apply, state=tk.DISABLED)
+            apply_btn.pack(side='left', padx=5)
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to optimize cycle time: {str(e)}")
+
+    def apply_layer_speeds(self, speeds):
+        """Make $VEL.CP equal speeds[i] throughout layer i, as one edit.
+
+        Every $VEL.CP assignment takes the value of the layer whose moves
+        it governs; layers with no assignment before their first move get
+        one inserted there. Without insertions this is a plain value edit,
+        otherwise the affected span is rewritten in a single pass. The
+        resulting sequence is validated first; returns True if applied.
+        """
+        import numpy as np
+        try:
+            motion = self.get_motion_table()
+            param_ids = column_to_numpy(self.param_groups.get(PARAM_GROUP_NAMES['$VEL.CP'], array('i')))
+            vel_lines, vel_values = self.param_changes('$VEL.CP')
+            
+            # Layer governed by each assignment: that of the next move
+            next_rows = np.searchsorted(motion.lines, vel_lines, side='right')
+            governing = next_rows < len(motion.lines)
+            layer_of_row = np.repeat(np.arange(motion.layer_count),
+                                     np.diff(np.r_[motion.layer_starts, len(motion.lines)]))
+            assignment_layers = layer_of_row[np.minimum(next_rows, len(motion.lines) - 1)]
+            speeds = np.round(speeds, 4)
+            new_values = np.where(governing, speeds[assignment_layers], vel_values)
+            
+            # Layers whose first move still runs on the previous layer's value
+            first_rows = motion.layer_starts
+            has_own = np.isin(first_rows, next_rows[governing])
+            insert_layers = np.flatnonzero(~has_own)
+            
+            # The assignments and insertions together are the whole $VEL.CP
+            # sequence, so steps are checked too
+            all_lines = np.r_[vel_lines, motion.lines[first_rows[insert_layers]]]
+            all_values = np.r_[new_values, speeds[insert_layers]]
+            order = np.argsort(all_lines, kind='stable')
+            if not self.confirm_values('$VEL.CP', all_values[order], lambda index: int(all_lines[order[index]]),
+                                       steps=True):
+                return False
+            
+            if not len(insert_layers):
+                changed = new_values != vel_values
+                if changed.any():
+                    self.apply_value_edits(param_ids[changed].tolist(), new_values[changed].tolist())
+                    self.modify_button.config(state=tk.NORMAL)
+                    self.save_button.config(state=tk.NORMAL)
+                return True
+            
+            # One streaming pass over the affected span
+            value_lines = dict(zip(vel_lines.tolist(), new_values.tolist()))
+            insert_lines = dict(zip(motion.lines[first_rows[insert_layers]].tolist(),
+                                    speeds[insert_layers].tolist()))
+            changed_lines = [line for line, value, old in zip(vel_lines.tolist(), new_values.tolist(),
+                                                              vel_values.tolist()) if value != old]
+            first = min(changed_lines + list(insert_lines))
+            last = max(changed_lines + list(insert_lines))
+            new_lines = []
+            for line_num in range(first, last + 1):
+                line = self.content_lines[line_num - 1]
+                if line_num in insert_lines:
+                    new_lines.append(f"$VEL.CP={insert_lines[line_num]}")
+                if line_num in value_lines:
+                    line = format_param_line('$VEL.CP', line, value_lines[line_num])
+                new_lines.append(line)
+            self.apply_line_edit(first, last + 1, new_lines)
+            self.modify_button.config(state=tk.NORMAL)
+            self.save_button.config(state=tk.NORMAL)
+            return True
             
-            self.params[key] = value
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to apply speed schedule: {str(e)}")
+            return False
+
+    def redundant_assignments(self):
+        """Assignments that set the value already in effect.
+
+        Each parameter's values are compared with the previous assignment
+        in file order. TRIGGER assignments (trigger_params, or a TRIGGER
+        prefix) take effect later, so an assignment right after one is
+        always kept, and a TRIGGER is only dropped when the assignments on
+        both sides hold its value. Returns ({param_type: ids}, kept) where
+        kept counts TRIGGER assignments kept only for timing.
+        """
+        import numpy as np
+        found = {}
+        kept = 0
+        all_values = column_to_numpy(self.param_store.values)
+        for param_type in PARAM_TYPES:
+            param_ids = column_to_numpy(self.param_groups.get(PARAM_GROUP_NAMES[param_type], array('i')))
+            if len(param_ids) < 2:
+                continue
+            values = all_values[param_ids]
+            triggers = np.fromiter((param_id in self.trigger_params
+                                    or 'TRIGGER' in self.param_store.prefix_of(param_id) for param_id in param_ids),
+                                   dtype=bool, count=len(param_ids))
+            
+            # Dropping a TRIGGER can make the assignment after it redundant,
+            # so repeat on what is left until nothing changes
+            remaining = np.arange(len(param_ids))
+            while True:
+                left_values = values[remaining]
+                left_triggers = triggers[remaining]
+                same_as_previous = np.r_[False, left_values[1:] == left_values[:-1]]
+                after_plain = np.r_[False, ~left_triggers[:-1]]
+                same_as_next = np.r_[left_values[:-1] == left_values[1:], True]
+                redundant = same_as_previous & after_plain & (~left_triggers | same_as_next)
+                if not redundant.any():
+                    break
+                remaining = remaining[~redundant]
+            
+            kept += int((same_as_previous & left_triggers).sum())
+            if len(remaining) < len(param_ids):
+                dropped = np.ones(len(param_ids), dtype=bool)
+                dropped[remaining] = False
+                found[param_type] = param_ids[dropped]
+        return found, kept
+
+    def remove_redundant_assignments(self):
+        """Delete every redundant assignment as one undoable edit."""
+        try:
+            if not self.content_lines:
+                messagebox.showerror("Error", "Please load a file first")
+                return
             
-            # Get the parameter type from the key
-            param_type = key.split(' (')[0]
+            found, kept = self.redundant_assignments()
+            total = sum(len(param_ids) for param_ids in found.values())
+            if not total:
+                messagebox.showinfo("Redundant Assignments", "Every assignment changes a value")
+                return
+            summary = "\n".join(f"- {param_type}: {len(param_ids)}" for param_type, param_ids in found.items())
+            if kept:
+                summary += f"\n\n{kept} TRIGGER assignments are kept because their timing matters."
+            if not messagebox.askyesno("Redundant Assignments",
+                    f"Remove {total} assignments that set the value already in effect?\n\n{summary}"):
+                return
             
-            # Update the specific line in the original content
-            content = self.original_content.splitlines()
-            line_idx = line_number - 1
+            removed = {self.param_line(int(param_id)) for param_ids in found.values() for param_id in param_ids}
+            first = min(removed)
+            last = max(removed)
+            new_lines = [self.content_lines[line_num - 1] for line_num in range(first, last + 1)
+                         if line_num not in removed]
+            self.apply_line_edit(first, last + 1, new_lines)
+            self.modify_button.config(state=tk.NORMAL)
+            self.save_button.config(state=tk.NORMAL)
             
-            if "Tool Speed" in param_type:
-                content[line_idx] = f"TOOL_RPM={value}"
-            elif "Feed Rate" in param_type:
-                content[line_idx] = f"$VEL.CP={value}"
-            elif "Cooling" in param_type:
-                # Check if line contains "TRIGGER WHEN" string
-                if "TRIGGER WHEN" in content[line_idx]:
-                    aux = re.match("^(.+?)LAYER_COOLING=\\d*\\.?\\d*", content[line_idx]).group(1)
-                    content[line_idx] = f"{aux}LAYER_COOLING={value}"
-                else:
-                    content[line_idx] = f"LAYER_COOLING={value}"
-            elif "Drive" in param_type:
-                # Check if line contains "TRIGGER WHEN" string
-                if "TRIGGER WHEN" in content[line_idx]:
-                    aux = re.match("^(.+?)ACT_DRIVE=\\d*\\.?\\d*", content[line_idx]).group(1)
-                    content[line_idx] = f"{aux}ACT_DRIVE={value}"
-                else:
-                    content[line_idx] = f"ACT_DRIVE={value}"
-                
-            # Update original content
-            self.original_content = "\n".join(content) + "\n"
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to remove redundant assignments: {str(e)}")
+
+    def rule_variables(self, param_ids):
+        """Arrays a rule can refer to, one element per occurrence."""
+        import numpy as np
+        lines = np.fromiter((self.param_line(param_id) for param_id in param_ids),
+                            dtype=np.int64, count=len(param_ids))
+        z, layer, progress = self.get_motion_table().placement(lines)
+        values = column_to_numpy(self.param_store.values)[param_ids]
+        # Estimated print time (s) of the layer each occurrence is in
+        layer_times = self.get_time_estimator().layer_times()
+        layer_time = layer_times[layer] if len(layer_times) else np.zeros(len(lines))
+        return {'z': z, 'layer': layer, 'line': lines, 'progress': progress, 'value': values,
+                'layer_time': layer_time}
+
+    def ask_rule(self):
+        """Ask for a rule such as 'TOOL_RPM = 80 + 0.4*z' and apply it."""
+        rule = simpledialog.askstring("Apply rule",
+            "Rule (e.g. TOOL_RPM = 80 + 0.4*z):\n\n" +
+            "Variables: z, layer, line, progress (0-1), value (current value),\n" +
+            "layer_time (estimated seconds for the layer)",
+            parent=self.root)
+        if rule:
+            self.apply_rule(rule)
+
+    def apply_rule(self, rule):
+        """Evaluate a rule over every occurrence of its parameter as one edit."""
+        try:
+            expression = ParamExpression(rule, ('z', 'layer', 'line', 'progress', 'value', 'layer_time'))
+            param_type = expression.target
+            if param_type not in PARAM_MAX_VALUES:
+                messagebox.showerror("Error",
+                    f"Rule must start with one of {', '.join(PARAM_MAX_VALUES)} followed by '='")
+                return
+            
+            param_ids = column_to_numpy(self.param_groups.get(PARAM_GROUP_NAMES[param_type], array('i')))
+            if not len(param_ids):
+                messagebox.showinfo("Apply rule", f"No {param_type} parameters in this file")
+                return
+            variables = self.rule_variables(param_ids)
+            new_values = expression.evaluate(**variables)
+            self.commit_group_values(param_type, param_ids, variables['value'], new_values)
             
-            # Update preview using update_preview to maintain highlighting
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to apply rule: {str(e)}")
+
+    def apply_value_edits(self, param_ids, new_values, record_undo=True):
+        """Set many parameter values at once as a single undoable edit.
+
+        The line count does not change, so only the parameter lines
+        themselves are rewritten.
+        """
+        store = self.param_store
+        old_values = [store.values[param_id] for param_id in param_ids]
+        if record_undo:
+            self.save_value_state(param_ids, old_values, new_values)
+        
+        changed_lines = []
+        old_lines = []
+        for param_id, value in zip(param_ids, new_values):
+            store.values[param_id] = value
+            if self.timeline is not None:
+                self.timeline.update_value(param_id, store.values[param_id])
+            param_type = store.type_of(param_id)
+            line_num = store.line_of(param_id)
+            old_lines.append(self.content_lines[line_num - 1])
+            self.content_lines[line_num - 1] = format_param_line(param_type, old_lines[-1], store.value_of(param_id))
+            changed_lines.append(line_num)
+            
+            row_info = self.entry_rows.get(param_id)
+            if row_info:
+                row_info['value_var'].set(str(store.value_of(param_id)))
+        self._content_cache = None
+        if self.journal is not None:
+            self.journal.record_lines(changed_lines, old_lines,
+                                      [self.content_lines[line_num - 1] for line_num in changed_lines])
+        
+        if len(changed_lines) > PREVIEW_PATCH_LIMIT:
             self.update_preview()
+        else:
+            for line_num in changed_lines:
+                self.patch_preview(line_num, 1, [self.content_lines[line_num - 1]])
+
+    def create_param_row(self, content_frame, param_id, before=None):
+        """Create the entry row for one parameter occurrence."""
+        row = tk.Frame(content_frame)
+        if before is not None:
+            row.pack(fill='x', padx=5, pady=2, before=before)
+        else:
+            row.pack(fill='x', padx=5, pady=2)
+        
+        label = tk.Label(row, text=self.param_row_label(param_id))
+        label.pack(side='left')
+        
+        record = self.param_store.record(param_id)
+        value_var = tk.StringVar(value=str(record.value))
+        if record.param_type == 'ACT_DRIVE':
+            entry = ttk.Combobox(row, textvariable=value_var, values=['TRUE', 'FALSE'],
+                                width=7)
+        else:
+            entry = tk.Entry(row, width=10, textvariable=value_var)
+        entry.pack(side='right')
+        
+        self.entries[param_id] = entry
+        self.entry_rows[param_id] = {'row': row, 'label': label, 'value_var': value_var}
+        
+        # Accept button
+        accept_btn = tk.Button(row, text="✓", bg='LIGHT GREEN', fg='white',
+                             command=lambda p=param_id, v=value_var: self.update_line_and_preview(p, v))
+        accept_btn.pack(side='right', padx=2)
+        
+        # Delete button
+        delete_btn = tk.Button(row, text="✕", bg='#ffb3b3', fg='white',
+                             command=lambda p=param_id: self.delete_parameter(p))
+        delete_btn.pack(side='right', padx=2)
+        
+        # Jump button
+        jump_btn = tk.Button(row, text="→",
+                           command=lambda p=param_id: self.jump_to_line(self.param_line(p)),
+                           bg='light blue')
+        jump_btn.pack(side='right', padx=5)
+
+    def param_line(self, param_id):
+        """Current line number of a parameter occurrence."""
+        return self.param_store.line_of(param_id)
+
+    def param_label(self, param_id):
+        """Full label, e.g. 'Feed Rate ($VEL.CP) (Line 12)'."""
+        return self.param_store.record(param_id).label
+
+    def param_row_label(self, param_id):
+        """Short label for a parameter row, e.g. '$VEL.CP (Line 12)'."""
+        return self.param_store.record(param_id).short_label
+
+    def schedule_relabel(self):
+        """Refresh visible row labels once the current batch of edits is done."""
+        if not self.relabel_pending:
+            self.relabel_pending = True
+            self.root.after_idle(self.relabel_visible_rows)
+
+    def relabel_visible_rows(self):
+        self.relabel_pending = False
+        for group_name, content_frame in self.content_frames.items():
+            if content_frame.winfo_viewable():
+                self.relabel_group(group_name)
+
+    def relabel_group(self, group_name):
+        """Recompute the line numbers shown in one group's rows."""
+        for param_id in self.param_groups.get(group_name, []):
+            row_info = self.entry_rows.get(param_id)
+            if row_info:
+                row_info['label'].config(text=self.param_row_label(param_id))
+
+    def update_line_and_preview(self, param_id, value_var):
+        try:
+            param_type = self.param_store.type_of(param_id)
+            line_number = self.param_line(param_id)
+            
+            # Get the value based on parameter type and validate it
+            if param_type in ('$VEL.CP', 'TOOL_RPM'):
+                value = float(value_var.get())
+            elif param_type == 'LAYER_COOLING':
+                value = int(value_var.get())
+            else:  # For other parameters
+                value = value_var.get()
+            if not self.validate_value(param_type, value):
+                return
+            
+            # Build the replacement for the parameter's line
+            new_line = format_param_line(param_type, self.content_lines[line_number - 1], value)
+            
+            # Only this line is re-parsed and redrawn
+            self.apply_line_edit(line_number, line_number + 1, [new_line])
             
             # Highlight the modified line and jump to it
             self.preview_text.see(f"{line_number}.0")
@@ -1384,22 +5510,30 @@ class SRCModifierApp:
             modified_lines = self.calculate_new_params()
             
             for line in modified_lines:
-                if 'TOOL_RPM=' in line:
-                    self.preview_text.insert(tk.END, line, "tool_speed")
-                elif '$VEL.CP=' in line:
-                    self.preview_text.insert(tk.END, line, "feed_rate")
-                elif 'LAYER_COOLING=' in line:
-                    self.preview_text.insert(tk.END, line, "cooling")
-                elif 'ACT_DRIVE=' in line:
-                    self.preview_text.insert(tk.END, line, "drive")
+                tag = self.preview_tag(line)
+                if tag:
+                    self.preview_text.insert(tk.END, line, tag)
                 else:
                     self.preview_text.insert(tk.END, line)
             
             self.update_line_numbers()
+            self.schedule_graph_update()
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to update preview: {str(e)}")
 
+    def preview_tag(self, line):
+        """Highlight tag for a preview line, or None."""
+        if 'TOOL_RPM=' in line:
+            return "tool_speed"
+        elif '$VEL.CP=' in line:
+            return "feed_rate"
+        elif 'LAYER_COOLING=' in line:
+            return "cooling"
+        elif 'ACT_DRIVE=' in line:
+            return "drive"
+        return None
+
     def calculate_new_params(self):
         try:
             if not self.original_content:
@@ -1437,20 +5571,33 @@ class SRCModifierApp:
             if not self.input_file:
                 return
                 
-            for key, entry in self.entries.items():
+            # Entries only reach the program once accepted with ✓; here they
+            # are just checked, so the store keeps matching the text
+            for param_id, entry in self.entries.items():
                 try:
                     # Special handling for ACT_DRIVE
-                    if "Drive" in key:
-                        value = entry.get()
-                        if value not in ['TRUE', 'FALSE']:
-                            tk.messagebox.showerror("Error", f"Invalid value for {key}. Must be TRUE or FALSE")
+                    if self.param_store.type_of(param_id) == 'ACT_DRIVE':
+                        if entry.get() not in ['TRUE', 'FALSE']:
+                            tk.messagebox.showerror("Error", f"Invalid value for {self.param_label(param_id)}. Must be TRUE or FALSE")
                             return
-                        self.params[key] = value
                     else:
-                        # Convert other parameters to float
-                        self.params[key] = float(entry.get())
+                        float(entry.get())
                 except ValueError:
-                    tk.messagebox.showerror("Error", f"Invalid value for {key}")
+                    tk.messagebox.showerror("Error", f"Invalid value for {self.param_label(param_id)}")
+                    return
+            
+            # Check the lines that will actually be written
+            modified_lines = self.calculate_new_params()
+            scan = self.scan_violations(lines=modified_lines)
+            violations, errors, warnings = scan
+            if violations:
+                self.show_violations(scan)
+                if errors:
+                    tk.messagebox.showerror("Error", f"{errors} values are outside the allowed limits; "
+                                                     "fix the listed errors before saving")
+                    return
+                if not tk.messagebox.askyesno("Warning", f"{warnings} values raised warnings.\n\n" +
+                                              "Do you wish to save anyway?"):
                     return
             
             # Get input file name without extension
@@ -1464,8 +5611,6 @@ class SRCModifierApp:
             output_file = self.output_name.get() if self.output_name.get() else default_output
             if not output_file.endswith('.src'):
                 output_file += '.src'
-                
-            modified_lines = self.calculate_new_params()
             
             # Create changelog entry
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -1474,9 +5619,12 @@ class SRCModifierApp:
             changelog_entry += f"Output file: {output_file}\n"
             changelog_entry += "Parameter changes:\n"
             
-            # Add parameter changes to changelog
-            for key, value in self.params.items():
-                changelog_entry += f"- {key}: {value}\n"
+            # Add parameter changes to changelog (labels are only built here)
+            for param_id in sorted(self.param_store.ids(), key=self.param_line):
+                record = self.param_store.record(param_id)
+                changelog_entry += f"- {record.label}: {record.value}\n"
+                if record.prefix:
+                    changelog_entry += f"- {record.label}_prefix: {record.prefix}\n"
             
             # Add custom Z height parameters to changelog
             if self.custom_z_params:
@@ -1486,38 +5634,149 @@ class SRCModifierApp:
                     for param_type, value in params.items():
                         changelog_entry += f"  - {param_type}: {value}\n"
             
-            # Write modified file
-            with open(output_file, 'w', encoding='utf-8') as file:
-                file.writelines(modified_lines)
+            # Minified output is produced batch by batch as it is written
+            minify_stats = None
+            if self.minify_var.get():
+                try:
+                    tolerance = float(self.minify_tolerance_entry.get())
+                    tolerance_decimals(tolerance)
+                except ValueError:
+                    tk.messagebox.showerror("Error", "Minify tolerance must be a positive number")
+                    return
+                minify_stats = {}
+                modified_lines = minify_lines(modified_lines, tolerance, self.minify_comments.get(), minify_stats)
+            
+            # Write modified file, or a master program and its parts
+            if self.split_var.get():
+                try:
+                    max_lines = int(self.split_lines_entry.get())
+                    max_bytes = int(float(self.split_kb_entry.get()) * 1024)
+                except ValueError:
+                    tk.messagebox.showerror("Error", "Split targets must be numbers")
+                    return
+                if max_lines <= 0 or max_bytes <= 0:
+                    tk.messagebox.showerror("Error", "Split targets must be positive")
+                    return
+                part_files = self.write_split_program(output_file, list(modified_lines), max_lines, max_bytes)
+                changelog_entry += f"\nSplit into {len(part_files)} parts: {', '.join(part_files)}\n"
+                saved = f"Master program saved as {output_file}\n{len(part_files)} sub-programs written"
+            else:
+                with open(output_file, 'w', encoding='utf-8') as file:
+                    file.writelines(modified_lines)
+                saved = f"File saved as {output_file}"
+            
+            if minify_stats is not None:
+                saved_bytes = minify_stats['bytes_in'] - minify_stats['bytes_out']
+                minified = (f"Minified from {minify_stats['bytes_in']:,} to {minify_stats['bytes_out']:,} bytes "
+                            f"({100.0 * saved_bytes / max(minify_stats['bytes_in'], 1):.1f}% smaller), "
+                            f"{minify_stats['lines_in'] - minify_stats['lines_out']:,} lines removed, "
+                            f"largest coordinate change {minify_stats['max_change']:.4g} mm")
+                changelog_entry += f"\n{minified}\n"
+                saved += f"\n{minified}"
                 
             # Append to changelog using default name
             with open(default_changelog, 'a', encoding='utf-8') as log:
                 log.write(changelog_entry)
             
-            tk.messagebox.showinfo("Success", f"File saved as {output_file}\nChangelog updated in {default_changelog}")
+            # The journal only needs the net edits from here on
+            self.compact_journal()
+            
+            tk.messagebox.showinfo("Success", f"{saved}\nChangelog updated in {default_changelog}")
+            return True
                 
         except Exception as e:
             tk.messagebox.showerror("Error", f"Failed to save file: {str(e)}")
 
-    def delete_parameter(self, key, line_number):
+    def write_split_program(self, output_file, modified_lines, max_lines, max_bytes):
+        """Write the program as sub-programs split at layer boundaries.
+
+        output_file becomes a master program that calls the parts in order.
+        Each part after the first starts with the DEF, the PARKPOS header
+        and the TOOL_RPM/$VEL.CP/LAYER_COOLING/ACT_DRIVE values in force
+        where it begins. Parts are written in parallel; returns their paths.
+        """
+        import numpy as np
+        
+        # Layer boundaries and parameter changes of the lines being written
+        if not (self.custom_z_params or self.minify_var.get()):
+            motion = self.get_motion_table()
+            changes = {param_type: self.param_changes(param_type) for param_type in PARAM_TYPES}
+        else:
+            # Z-height inserts or minifying moved lines; index the output itself
+            index = SRCIndex.build(''.join(modified_lines))
+            motion = MotionTable.from_index(index)
+            occ_lines = column_to_numpy(index.occ_lines)
+            occ_types = column_to_numpy(index.occ_types)
+            occ_values = column_to_numpy(index.occ_values)
+            changes = {param_type: (occ_lines[occ_types == type_id], occ_values[occ_types == type_id])
+                       for type_id, param_type in enumerate(PARAM_TYPES)}
+        
+        def_index = next((i for i, line in enumerate(modified_lines) if line.startswith("DEF ")), None)
+        if def_index is None:
+            raise ValueError("No DEF line found")
+        end_index = next((i for i in range(len(modified_lines) - 1, def_index, -1)
+                          if modified_lines[i].strip() == "END"), len(modified_lines))
+        parkpos = next((line for line in modified_lines[def_index:end_index]
+                        if line.startswith("PARKPOS = ")), None)
+        prefix = ''.join(modified_lines[:def_index])  # e.g. &ACCESS lines
+        
+        # A part begins after the last move of the previous layer
+        cuts = motion.lines[motion.layer_starts[1:] - 1] if motion.layer_count > 1 else []
+        line_sizes = np.fromiter(map(len, modified_lines), dtype=np.int64, count=len(modified_lines))
+        starts = plan_split(line_sizes, cuts, def_index + 1, end_index, max_lines, max_bytes)
+        stops = starts[1:] + [end_index]
+        
+        directory = os.path.dirname(os.path.abspath(output_file))
+        stem = os.path.splitext(os.path.basename(output_file))[0]
+        names = [f"{stem}_p{number:03d}" for number in range(1, len(starts) + 1)]
+        
+        def header(part, start):
+            lines = [prefix, f"DEF {names[part]}()\n"]
+            if part:
+                if parkpos:
+                    lines.append(parkpos if parkpos.endswith('\n') else parkpos + '\n')
+                lines.append(f";Part {part + 1} of {len(starts)}, state at line {start + 1}\n")
+                for param_type in PARAM_TYPES:
+                    change_lines, change_values = changes[param_type]
+                    value = effective_values(change_lines, change_values, [start])[0]
+                    if not np.isnan(value):
+                        lines.append(f"{param_type}={param_value_from_float(param_type, value)}\n")
+            return ''.join(lines)
+        
+        def write_part(part):
+            path = os.path.join(directory, names[part] + ".src")
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(header(part, starts[part]))
+                file.writelines(modified_lines[starts[part]:stops[part]])
+                if modified_lines[stops[part] - 1:stops[part]] and not modified_lines[stops[part] - 1].endswith('\n'):
+                    file.write('\n')
+                file.write("END\n")
+            return path
+        
+        with ThreadPoolExecutor(max_workers=min(len(starts), os.cpu_count() or 4)) as executor:
+            part_files = list(executor.map(write_part, range(len(starts))))
+        
+        # Master program calling the parts in order
+        with open(output_file, 'w', encoding='utf-8') as file:
+            file.write(prefix)
+            file.write(modified_lines[def_index] if modified_lines[def_index].endswith('\n')
+                       else modified_lines[def_index] + '\n')
+            if parkpos:
+                file.write(parkpos if parkpos.endswith('\n') else parkpos + '\n')
+            for name in names:
+                file.write(f"{name}()\n")
+            file.write("END\n")
+        return part_files
+
+    def delete_parameter(self, param_id):
         try:
-            # Save current state before deletion
-            self.save_state()
-            
-            # Get the line containing the parameter we want to delete
-            content_lines = self.original_content.splitlines()
-            param_line = content_lines[line_number - 1]
-            
-            # Identify parameter type
-            param_type = None
-            if 'TOOL_RPM=' in param_line:
-                param_type = 'TOOL_RPM'
-            elif '$VEL.CP=' in param_line:
-                param_type = '$VEL.CP'
-            elif 'LAYER_COOLING=' in param_line:
-                param_type = 'LAYER_COOLING'
-            elif 'ACT_DRIVE=' in param_line:
-                param_type = 'ACT_DRIVE'
+            content_lines = self.content_lines
+            line_number = self.param_line(param_id)
+            param_type = self.param_store.type_of(param_id)
+
+            # Remove the line; only that line is re-indexed and the
+            # parameters below it are shifted up by one
+            self.apply_line_edit(line_number, line_number + 1, [])
 
             # Search backwards for position marker
             for i in range(line_number - 2, -1, -1):
@@ -1542,44 +5801,6 @@ class SRCModifierApp:
                         if not self.print_progress_params[progress_value]:
                             del self.print_progress_params[progress_value]
                     break
-
-            # Remove the line from content
-            del content_lines[line_number - 1]
-            
-            # Remove from tracking dictionaries
-            if key in self.params:
-                del self.params[key]
-            if key in self.param_line_numbers:
-                del self.param_line_numbers[key]
-
-            # Remove from param_groups
-            for group_name, group_keys in self.param_groups.items():
-                if key in group_keys:
-                    group_keys.remove(key)
-                    if group_name in self.header_labels:
-                        header_label = self.header_labels[group_name]
-                        header_label.config(text=f"{group_name} ({len(group_keys)} occurrences)")
-                    break
-
-            # Update line numbers
-            for param_key, line_num in list(self.param_line_numbers.items()):
-                if line_num > line_number:
-                    self.param_line_numbers[param_key] = line_num - 1
-                    if param_key in self.params:
-                        value = self.params[param_key]
-                        new_key = param_key.replace(f"Line {line_num}", f"Line {line_num - 1}")
-                        del self.params[param_key]
-                        self.params[new_key] = value
-                        for group_keys in self.param_groups.values():
-                            if param_key in group_keys:
-                                group_keys.remove(param_key)
-                                group_keys.append(new_key)
-
-            # Update content and UI
-            self.original_content = '\n'.join(content_lines) + '\n'
-            self.update_preview()
-            self.extract_params_from_file()
-            self.create_param_entries()
             
             # Enable save buttons
             self.modify_button.config(state=tk.NORMAL)
@@ -1588,12 +5809,286 @@ class SRCModifierApp:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to delete parameter: {str(e)}")
 
+    def apply_line_edit(self, start, stop, new_lines, record_undo=True):
+        """Replace lines start..stop-1 (1-based) with new_lines.
+
+        Only the edited span is re-parsed. Lines below it move through
+        line_map, so no other parameter is renumbered, and only the
+        affected parameter rows and preview lines are redrawn.
+        """
+        old_lines = self.content_lines[start - 1:stop - 1]
+        if record_undo:
+            self.save_edit_state(start, old_lines, new_lines)
+        
+        if self.journal is not None:
+            self.journal.record_edit(start, old_lines, new_lines)
+        self.content_lines[start - 1:stop - 1] = new_lines
+        self._content_cache = None
+        
+        # The index and Z/layer table are spliced: only the edited lines are parsed
+        new_stop = start + len(new_lines)
+        occurrences, lin_rows, triggers = SRCIndex.parse_lines(new_lines, first_line=start)
+        if self.src_index is not None:
+            self.src_index = self.src_index.splice(self.content_lines, start - 1, stop - 1, new_stop - 1, old_lines)
+        lin_changed = any('LIN' in line for line in old_lines) or bool(lin_rows)
+        if self.motion_table is not None and (lin_changed or new_stop != stop):
+            self.motion_table = self.motion_table.splice(start, stop, new_stop, lin_rows)
+        
+        self.update_progress_index(start, stop, new_lines)
+        
+        if len(old_lines) == len(new_lines):
+            removed_ids, added_ids, updated_ids = self.replace_params_in_place(start, len(new_lines),
+                                                                               occurrences, triggers)
+        else:
+            removed_ids = self.remove_params_in_span(start, stop)
+            added_ids = self.insert_param_lines(start, len(new_lines), occurrences, triggers)
+            updated_ids = []
+        
+        # New values are patched into the timeline and shifted lines moved;
+        # added, removed or reordered assignments or moves need a rebuild
+        if self.timeline is not None:
+            if removed_ids or added_ids or lin_changed or self.motion_table is None:
+                self.timeline = None
+            else:
+                for param_id in updated_ids:
+                    self.timeline.update_value(param_id, self.param_store.values[param_id])
+                if new_stop != stop:
+                    self.timeline.shift_lines(stop, new_stop - stop, self.motion_table)
+        
+        self.refresh_param_rows(removed_ids, added_ids, updated_ids)
+        self.patch_preview(start, len(old_lines), new_lines)
+
+    def update_progress_index(self, start, stop, new_lines):
+        """Keep progress_index in step with an edit of lines start..stop-1."""
+        shift = len(new_lines) - (stop - start)
+        updated = {}
+        for percent, line_num in self.progress_index.items():
+            if line_num >= stop:
+                updated[percent] = line_num + shift
+            elif line_num < start:
+                updated[percent] = line_num
+        for line_num, percent in SRCIndex.find_progress(new_lines, first_line=start):
+            if line_num < updated.get(percent, line_num + 1):
+                updated[percent] = line_num
+        
+        # A trigger that was only shadowed by a removed duplicate needs a rescan
+        removed = set(self.progress_index) - set(updated)
+        if removed:
+            for line_num, percent in SRCIndex.find_progress(self.content_lines):
+                if percent in removed and percent not in updated:
+                    updated[percent] = line_num
+        self.progress_index = updated
+
+    def progress_line(self, percent):
+        """Line number of the PRINT_PROGRESS trigger for a percentage, or None."""
+        return self.progress_index.get(int(percent))
+
+    def insert_progress_triggers(self):
+        """Insert the missing PRINT_PROGRESS triggers at true path-length progress.
+
+        Positions come from the cumulative LIN path length, and the new
+        lines are merged into the program in a single pass as one edit.
+        """
+        try:
+            if not self.content_lines:
+                return
+            
+            missing = [percent for percent in range(1, 101) if percent not in self.progress_index]
+            if not missing:
+                messagebox.showinfo("Print Progress", "All PRINT_PROGRESS triggers are already present")
+                return
+            
+            motion = self.get_motion_table()
+            if not len(motion.lines):
+                messagebox.showerror("Error", "No LIN moves found to measure progress against")
+                return
+            rows = motion.progress_rows(missing)
+            insert_lines = motion.lines[rows].tolist()
+            
+            # Triggers go directly before the move that reaches their percentage
+            first = insert_lines[0]
+            last = insert_lines[-1]
+            new_lines = []
+            pending = iter(zip(insert_lines, missing))
+            next_insert = next(pending, None)
+            for line_num in range(first, last + 1):
+                while next_insert and next_insert[0] == line_num:
+                    new_lines.append(f"TRIGGER WHEN DISTANCE=0 DELAY=0 DO PRINT_PROGRESS={next_insert[1]}")
+                    next_insert = next(pending, None)
+                new_lines.append(self.content_lines[line_num - 1])
+            
+            self.apply_line_edit(first, last + 1, new_lines)
+            self.modify_button.config(state=tk.NORMAL)
+            self.save_button.config(state=tk.NORMAL)
+            messagebox.showinfo("Print Progress", f"Inserted {len(missing)} PRINT_PROGRESS triggers")
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to insert print progress triggers: {str(e)}")
+
+    def param_at_line(self, line_num):
+        """Return (slot, index, param_id) for a current line; param_id may be None."""
+        slot, index = self.line_map.locate(line_num)
+        if index < 0:
+            param_id = self.param_store.slot_ids[slot]
+        else:
+            param_id = self.line_map.inserted[slot][index]
+        return slot, index, (param_id if param_id >= 0 else None)
+
+    def add_to_group(self, param_id):
+        """Insert a parameter into its group list in file order."""
+        group_name = PARAM_GROUP_NAMES[self.param_store.type_of(param_id)]
+        if group_name not in self.param_groups:
+            self.param_groups[group_name] = array('i')
+        group_ids = self.param_groups[group_name]
+        group_ids.insert(bisect_left(group_ids, self.param_line(param_id), key=self.param_line), param_id)
+
+    def drop_param(self, param_id):
+        """Forget a parameter; must run before its line is removed from line_map."""
+        group_ids = self.param_groups[PARAM_GROUP_NAMES[self.param_store.type_of(param_id)]]
+        del group_ids[bisect_left(group_ids, self.param_line(param_id), key=self.param_line)]
+        self.param_store.remove(param_id)
+        self.trigger_params.pop(param_id, None)
+
+    def replace_params_in_place(self, start, count, occurrences, triggers):
+        """Re-index lines that were rewritten without changing the line count.
+
+        A line that still holds the same parameter keeps its ID.
+        """
+        store = self.param_store
+        new_by_line = {occurrence[0]: occurrence for occurrence in occurrences}
+        removed_ids, added_ids, updated_ids = [], [], []
+        
+        for line_num in range(start, start + count):
+            slot, index, old_id = self.param_at_line(line_num)
+            occurrence = new_by_line.get(line_num)
+            
+            if old_id is not None and occurrence and store.type_of(old_id) == occurrence[1]:
+                # Same parameter with a new value
+                _, _, value, prefix = occurrence
+                store.set_value(old_id, value, prefix)
+                self.trigger_params.pop(old_id, None)
+                if line_num in triggers:
+                    self.trigger_params[old_id] = triggers[line_num]
+                updated_ids.append(old_id)
+                continue
+            
+            if old_id is not None:
+                self.drop_param(old_id)
+                removed_ids.append(old_id)
+                if index >= 0:
+                    self.line_map.inserted[slot][index] = -1
+            
+            if occurrence:
+                param_id = store.add(*occurrence[1:])
+                store.set_anchor(param_id, slot, index >= 0)
+                if index >= 0:
+                    self.line_map.inserted[slot][index] = param_id
+                if line_num in triggers:
+                    self.trigger_params[param_id] = triggers[line_num]
+                self.add_to_group(param_id)
+                added_ids.append(param_id)
+        
+        return removed_ids, added_ids, updated_ids
+
+    def remove_params_in_span(self, start, stop):
+        """Delete lines start..stop-1 from line_map and drop their parameters."""
+        removed_ids = []
+        for line_num in range(start, stop):
+            _, _, param_id = self.param_at_line(line_num)
+            if param_id is not None:
+                self.drop_param(param_id)
+                removed_ids.append(param_id)
+        
+        self.line_map.delete(start, stop - start)
+        return removed_ids
+
+    def insert_param_lines(self, start, count, occurrences, triggers):
+        """Insert count new lines at start into line_map and index their parameters."""
+        if not count:
+            return []
+        
+        new_by_line = {occurrence[0]: occurrence for occurrence in occurrences}
+        markers = []
+        added_ids = []
+        for line_num in range(start, start + count):
+            occurrence = new_by_line.get(line_num)
+            if occurrence is None:
+                markers.append(-1)
+                continue
+            param_id = self.param_store.add(*occurrence[1:])
+            if line_num in triggers:
+                self.trigger_params[param_id] = triggers[line_num]
+            markers.append(param_id)
+            added_ids.append(param_id)
+        
+        slot = self.line_map.insert(start, markers)
+        for param_id in added_ids:
+            self.param_store.set_anchor(param_id, slot, True)
+            self.add_to_group(param_id)
+        return added_ids
+
+    def refresh_param_rows(self, removed_ids, added_ids, updated_ids):
+        """Update only the parameter rows touched by an edit."""
+        # A brand new group needs its header, so fall back to a full rebuild
+        if any(PARAM_GROUP_NAMES[self.param_store.type_of(param_id)] not in self.content_frames
+               for param_id in added_ids):
+            self.create_param_entries()
+            return
+        
+        for param_id in removed_ids:
+            row_info = self.entry_rows.pop(param_id, None)
+            if row_info:
+                row_info['row'].destroy()
+            self.entries.pop(param_id, None)
+        
+        for param_id in updated_ids:
+            if param_id in self.entry_rows:
+                self.entry_rows[param_id]['value_var'].set(str(self.param_store.value_of(param_id)))
+        
+        for param_id in added_ids:
+            group_name = PARAM_GROUP_NAMES[self.param_store.type_of(param_id)]
+            group_ids = self.param_groups[group_name]
+            pos = bisect_left(group_ids, self.param_line(param_id), key=self.param_line)
+            before = None
+            if pos + 1 < len(group_ids) and group_ids[pos + 1] in self.entry_rows:
+                before = self.entry_rows[group_ids[pos + 1]]['row']
+            self.create_param_row(self.content_frames[group_name], param_id, before=before)
+        
+        for group_name, header_label in self.header_labels.items():
+            count = len(self.param_groups.get(group_name, []))
+            header_label.config(text=f"{group_name} ({count} occurrences)")
+        
+        # Rows below the edit now show stale line numbers
+        if removed_ids or added_ids:
+            self.schedule_relabel()
+
+    def patch_preview(self, start, old_count, new_lines):
+        """Redraw only the edited lines of the preview."""
+        if not self.preview_text:
+            return
+        
+        # The preview may contain generated lines (calculate_new_params);
+        # only patch in place when it mirrors the content line for line
+        preview_lines = int(self.preview_text.index('end-1c').split('.')[0])
+        expected = len(self.content_lines) - (len(new_lines) - old_count) + 1
+        if preview_lines != expected:
+            self.update_preview()
+            return
+        
+        self.preview_text.delete(f"{start}.0", f"{start + old_count}.0")
+        for offset, line in enumerate(new_lines):
+            tag = self.preview_tag(line)
+            if tag:
+                self.preview_text.insert(f"{start + offset}.0", line + '\n', tag)
+            else:
+                self.preview_text.insert(f"{start + offset}.0", line + '\n')
+        
+        self.update_line_numbers()
+        self.schedule_graph_update()
+
     def save_state(self):
         """Save current state for undo"""
         state = {
-            'params': self.params.copy(),
-            'param_line_numbers': self.param_line_numbers.copy(), 
-            'param_groups': {k: v[:] for k, v in self.param_groups.items()},
             'original_content': self.original_content,
             'custom_z_params': {k: v.copy() for k, v in self.custom_z_params.items()},
             'print_progress_params': {k: v.copy() for k, v in self.print_progress_params.items()},
@@ -1606,17 +6101,67 @@ class SRCModifierApp:
         self.redo_state = None  # Clear redo state when new state is saved
         self.redo_button.config(state=tk.DISABLED)
 
+    def save_edit_state(self, start, old_lines, new_lines):
+        """Save a line edit for undo; undoing it re-applies the inverse edit."""
+        self.undo_state = {
+            'edit': (start, old_lines, new_lines),
+            'custom_z_params': {k: v.copy() for k, v in self.custom_z_params.items()},
+            'print_progress_params': {k: v.copy() for k, v in self.print_progress_params.items()}
+        }
+        self.undo_button.config(state=tk.NORMAL)
+        self.redo_state = None  # Clear redo state when new state is saved
+        self.redo_button.config(state=tk.DISABLED)
+
+    def save_value_state(self, param_ids, old_values, new_values):
+        """Save a batch of value changes for undo."""
+        self.undo_state = {
+            'values': (param_ids, old_values, new_values),
+            'custom_z_params': {k: v.copy() for k, v in self.custom_z_params.items()},
+            'print_progress_params': {k: v.copy() for k, v in self.print_progress_params.items()}
+        }
+        self.undo_button.config(state=tk.NORMAL)
+        self.redo_state = None  # Clear redo state when new state is saved
+        self.redo_button.config(state=tk.DISABLED)
+
+    def swap_edit_state(self, state, undo):
+        """Apply (or revert) a saved line/value edit and return the opposite record."""
+        opposite = {
+            'custom_z_params': {k: v.copy() for k, v in self.custom_z_params.items()},
+            'print_progress_params': {k: v.copy() for k, v in self.print_progress_params.items()}
+        }
+        if 'values' in state:
+            param_ids, old_values, new_values = state['values']
+            opposite['values'] = state['values']
+            self.apply_value_edits(param_ids, old_values if undo else new_values, record_undo=False)
+        else:
+            start, old_lines, new_lines = state['edit']
+            opposite['edit'] = state['edit']
+            if undo:
+                self.apply_line_edit(start, start + len(new_lines), old_lines, record_undo=False)
+            else:
+                self.apply_line_edit(start, start + len(old_lines), new_lines, record_undo=False)
+        self.custom_z_params = state['custom_z_params']
+        self.print_progress_params = state['print_progress_params']
+        return opposite
+
     def undo_last_action(self):
         try:
             if not self.undo_state:
                 self.undo_button.config(state=tk.DISABLED)
                 return
             
+            if 'edit' in self.undo_state or 'values' in self.undo_state:
+                # Line and value edits are undone incrementally
+                self.redo_state = self.swap_edit_state(self.undo_state, undo=True)
+                self.undo_state = None
+                self.undo_button.config(state=tk.DISABLED)
+                self.redo_button.config(state=tk.NORMAL)
+                self.modify_button.config(state=tk.NORMAL)
+                self.save_button.config(state=tk.NORMAL)
+                return
+            
             # Save current state to redo
             current_state = {
-                'params': self.params.copy(),
-                'param_line_numbers': self.param_line_numbers.copy(),
-                'param_groups': {k: v[:] for k, v in self.param_groups.items()},
                 'original_content': self.original_content,
                 'custom_z_params': {k: v.copy() for k, v in self.custom_z_params.items()},
                 'print_progress_params': {k: v.copy() for k, v in self.print_progress_params.items()},
@@ -1628,9 +6173,7 @@ class SRCModifierApp:
             
             # Restore undo state
             state = self.undo_state
-            self.params = state['params']
-            self.param_line_numbers = state['param_line_numbers']
-            self.param_groups = state['param_groups']
+            self.journal_content(state['original_content'])
             self.original_content = state['original_content']
             self.custom_z_params = state['custom_z_params']
             self.print_progress_params = state['print_progress_params']
@@ -1642,7 +6185,8 @@ class SRCModifierApp:
                 if k in self.header_labels:
                     self.header_labels[k].config(text=text)
             
-            # Update UI
+            # Update UI (parameters are re-indexed from the restored content)
+            self.extract_params_from_file()
             self.update_preview()
             self.create_param_entries()
             
@@ -1663,12 +6207,19 @@ class SRCModifierApp:
             if not self.redo_state:
                 self.redo_button.config(state=tk.DISABLED)
                 return
+            
+            if 'edit' in self.redo_state or 'values' in self.redo_state:
+                # Line and value edits are redone incrementally
+                self.undo_state = self.swap_edit_state(self.redo_state, undo=False)
+                self.redo_state = None
+                self.redo_button.config(state=tk.DISABLED)
+                self.undo_button.config(state=tk.NORMAL)
+                self.modify_button.config(state=tk.NORMAL)
+                self.save_button.config(state=tk.NORMAL)
+                return
                 
             # Save current state to undo
             current_state = {
-                'params': self.params.copy(),
-                'param_line_numbers': self.param_line_numbers.copy(),
-                'param_groups': {k: v[:] for k, v in self.param_groups.items()},
                 'original_content': self.original_content,
                 'custom_z_params': {k: v.copy() for k, v in self.custom_z_params.items()},
                 'print_progress_params': {k: v.copy() for k, v in self.print_progress_params.items()},
@@ -1680,9 +6231,7 @@ class SRCModifierApp:
             
             # Restore redo state
             state = self.redo_state
-            self.params = state['params']
-            self.param_line_numbers = state['param_line_numbers']
-            self.param_groups = state['param_groups']
+            self.journal_content(state['original_content'])
             self.original_content = state['original_content']
             self.custom_z_params = state['custom_z_params']
             self.print_progress_params = state['print_progress_params']
@@ -1694,7 +6243,8 @@ class SRCModifierApp:
                 if k in self.header_labels:
                     self.header_labels[k].config(text=text)
             
-            # Update UI
+            # Update UI (parameters are re-indexed from the restored content)
+            self.extract_params_from_file()
             self.update_preview()
             self.create_param_entries()
             
@@ -1746,7 +6296,41 @@ class SRCModifierApp:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to jump to Z height: {str(e)}")
 
+def measure_startup():
+    """Print a breakdown of where cold-start time goes, then exit."""
+    timings = [("Python + tkinter imports", time.perf_counter() - _STARTUP_T0)]
+
+    def timed(label, func):
+        start = time.perf_counter()
+        result = func()
+        timings.append((label, time.perf_counter() - start))
+        return result
+
+    root = timed("Tk root", tk.Tk)
+    app = timed("Main window (SRCModifierApp)", lambda: SRCModifierApp(root, deferred_loading=False))
+    timed("First paint", root.update)
+    window_time = sum(seconds for _, seconds in timings)
+
+    # Everything below is deferred in normal startup
+    timed("Theme (azure.tcl + PNG assets)", app.load_theme)
+    for module_name in DEFERRED_IMPORTS + ['matplotlib.backends.backend_tkagg']:
+        try:
+            timed(f"import {module_name}", lambda m=module_name: importlib.import_module(m))
+        except ImportError:
+            timings.append((f"import {module_name} (not installed)", 0.0))
+    root.destroy()
+
+    print("Startup time breakdown:")
+    for label, seconds in timings:
+        print(f"  {label:<45} {seconds * 1000:8.1f} ms")
+    print(f"  {'Window visible after':<45} {window_time * 1000:8.1f} ms")
+    print(f"  {'Total incl. deferred work':<45} {sum(s for _, s in timings) * 1000:8.1f} ms")
+
+
 if __name__ == "__main__":
+    if '--measure-startup' in sys.argv:
+        measure_startup()
+        sys.exit(0)
     try:
         root = tk.Tk()
         app = SRCModifierApp(root)
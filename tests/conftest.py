@@ -0,0 +1,74 @@
+"""Shared fixtures: the app with Tk replaced by mocks, on a temporary program."""
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PARAMETROS_BLU3D as blu3d
+
+
+def make_program(layers=6, moves_per_layer=8, name='job'):
+    """A small BLU3D-style program with every parameter type and triggers."""
+    lines = [f"DEF  {name}()", "PARKPOS = {X 0, Y 0, Z 300}", ";generated for tests",
+             "TOOL_RPM=80", "$VEL.CP=0.2", "LAYER_COOLING=100", "ACT_DRIVE=FALSE"]
+    for layer in range(layers):
+        z = 0.3 * (layer + 1)
+        lines.append(f"TOOL_RPM={80 + layer}")
+        lines.append(f"$VEL.CP={0.2 + 0.01 * layer:.2f}")
+        lines.append(f"TRIGGER WHEN DISTANCE=0 DELAY=0 DO LAYER_COOLING={100 + layer}")
+        lines.append("TRIGGER WHEN DISTANCE=1 DELAY=0.5 DO ACT_DRIVE=TRUE")
+        for move in range(moves_per_layer):
+            x = 10.0 * move + layer
+            y = 5.0 * (move % 3)
+            lines.append(f"LIN {{X {x:.4f}, Y {y:.4f}, Z {z:.4f}}} C_DIS")
+        lines.append("TRIGGER WHEN DISTANCE=0 DELAY=0 DO ACT_DRIVE=FALSE")
+    lines.append("END")
+    return "\n".join(lines) + "\n"
+
+
+class FakeEntry:
+    """Stands in for a tk.Entry or StringVar: holds text."""
+
+    def __init__(self, text=''):
+        self.text = text
+
+    def get(self):
+        return self.text
+
+    def set(self, text):
+        self.text = text
+
+    def delete(self, first, last=None):
+        self.text = ''
+
+    def insert(self, index, text):
+        self.text += text
+
+
+@pytest.fixture
+def gui(monkeypatch, tmp_path):
+    """Replace Tk and the dialogs with mocks; journal and cache go to tmp_path."""
+    for name in ('tk', 'ttk', 'messagebox', 'filedialog', 'simpledialog', 'Text', 'Scrollbar'):
+        monkeypatch.setattr(blu3d, name, mock.MagicMock())
+    monkeypatch.setattr(blu3d, 'JOURNAL_DIR', str(tmp_path / 'journal'))
+    monkeypatch.setattr(blu3d.ParseCache.__init__, '__defaults__', (str(tmp_path / 'cache'), blu3d.CACHE_MAX_BYTES))
+    return blu3d.messagebox
+
+
+@pytest.fixture
+def make_app(gui, tmp_path):
+    """Build the app and open a program in it: make_app(text, name='job.src')."""
+    def make(text, name='job.src'):
+        path = tmp_path / name
+        path.write_text(text)
+        app = blu3d.SRCModifierApp(mock.MagicMock(), deferred_loading=False)
+        app.minify_var = mock.MagicMock(**{'get.return_value': False})
+        app.split_var = mock.MagicMock(**{'get.return_value': False})
+        app.def_entry, app.parkpos_entry, app.output_name = FakeEntry(), FakeEntry(), FakeEntry()
+        app.open_program(str(path))
+        gui.showerror.assert_not_called()
+        return app
+    return make
@@ -0,0 +1,54 @@
+"""diff_lines opcodes must turn the old lines into the new ones."""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PARAMETROS_BLU3D import diff_lines
+
+
+def reconstruct(old, new, opcodes):
+    """Apply the opcodes to old, copying replacement text from new."""
+    result = list(old)
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        assert tag in ('replace', 'delete', 'insert')
+        result[i1:i2] = new[j1:j2]
+    return result
+
+
+def check(old, new):
+    opcodes = diff_lines(old, new)
+    assert reconstruct(old, new, opcodes) == new
+    # Regions come in order and do not overlap
+    for previous, current in zip(opcodes, opcodes[1:]):
+        assert previous[2] <= current[1] and previous[4] <= current[3]
+    return opcodes
+
+
+def test_identical_and_empty():
+    assert check(['a', 'b'], ['a', 'b']) == []
+    check([], ['a'])
+    check(['a'], [])
+
+
+def test_simple_edits():
+    old = [f"LIN X{i}" for i in range(20)]
+    new = old[:5] + ['TOOL_RPM=90'] + old[5:12] + old[14:]
+    new[17] = 'changed'
+    check(old, new)
+
+
+def test_random_edits_with_repeated_lines():
+    rng = random.Random(5)
+    for _ in range(200):
+        old = [rng.choice('abcdefgh') if rng.random() < 0.5 else f"line {rng.randrange(1000)}"
+               for _ in range(rng.randrange(40))]
+        new = list(old)
+        for _ in range(rng.randrange(6)):
+            position = rng.randrange(len(new) + 1)
+            if new and rng.random() < 0.5:
+                del new[position:position + rng.randint(1, 3)]
+            else:
+                new[position:position] = [rng.choice('abcxyz') for _ in range(rng.randint(1, 3))]
+        check(old, new)
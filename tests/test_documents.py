@@ -0,0 +1,103 @@
+"""Closing document tabs."""
+import os
+
+from conftest import make_program
+
+
+def edited_app(make_app):
+    app = make_app(make_program())
+    app.apply_line_edit(5, 6, ['$VEL.CP=0.3'])
+    return app
+
+
+def test_close_with_unsaved_edits_can_be_cancelled(make_app, gui):
+    app = edited_app(make_app)
+    journal_path = app.journal.path
+    gui.askyesnocancel.return_value = None
+    app.close_document()
+    gui.showerror.assert_not_called()
+    assert gui.askyesnocancel.called
+    assert len(app.documents) == 1 and os.path.exists(journal_path)
+
+
+def test_close_with_unsaved_edits_saves_first(make_app, gui, monkeypatch):
+    app = edited_app(make_app)
+    saved = []
+    monkeypatch.setattr(app, 'modify_file', lambda: saved.append(True) or True)
+    gui.askyesnocancel.return_value = True
+    app.close_document()
+    gui.showerror.assert_not_called()
+    assert saved and not app.documents
+
+
+def test_failed_save_keeps_the_tab(make_app, gui, monkeypatch):
+    app = edited_app(make_app)
+    monkeypatch.setattr(app, 'modify_file', lambda: None)
+    gui.askyesnocancel.return_value = True
+    app.close_document()
+    assert len(app.documents) == 1
+
+
+def test_close_discarding_edits_deletes_the_journal(make_app, gui):
+    app = edited_app(make_app)
+    journal_path = app.journal.path
+    gui.askyesnocancel.return_value = False
+    app.close_document()
+    gui.showerror.assert_not_called()
+    assert not app.documents and not os.path.exists(journal_path)
+
+
+def test_close_without_edits_does_not_ask(make_app, gui):
+    app = make_app(make_program())
+    app.close_document()
+    gui.askyesnocancel.assert_not_called()
+    assert not app.documents
+
+
+def edited_in_background(make_app, tmp_path):
+    """An app whose first document has edits and is no longer the active one."""
+    app = edited_app(make_app)
+    edited = app.active_document
+    other = tmp_path / 'other.src'
+    other.write_text(make_program(name='other'))
+    app.open_program(str(other))
+    assert app.active_document is not edited
+    return app, edited
+
+
+def test_quit_with_unsaved_edits_can_be_cancelled(make_app, gui, tmp_path):
+    app, edited = edited_in_background(make_app, tmp_path)
+    journal_path = edited.state['journal'].path
+    gui.askyesnocancel.return_value = None
+    app.on_close()
+    assert gui.askyesnocancel.call_count == 1
+    app.root.destroy.assert_not_called()
+    assert os.path.exists(journal_path)
+
+
+def test_quit_saves_edits_of_an_inactive_document(make_app, gui, tmp_path, monkeypatch):
+    app, edited = edited_in_background(make_app, tmp_path)
+    saved = []
+    monkeypatch.setattr(app, 'modify_file', lambda: saved.append(app.active_document) or True)
+    gui.askyesnocancel.return_value = True
+    app.on_close()
+    gui.showerror.assert_not_called()
+    assert saved == [edited]
+    app.root.destroy.assert_called_once()
+
+
+def test_quit_sees_edits_of_evicted_text(make_app, gui, tmp_path):
+    app, edited = edited_in_background(make_app, tmp_path)
+    edited.evict()
+    gui.askyesnocancel.return_value = False
+    app.on_close()
+    assert gui.askyesnocancel.call_count == 1
+    app.root.destroy.assert_called_once()
+    assert not os.listdir(tmp_path / 'journal')
+
+
+def test_quit_without_edits_does_not_ask(make_app, gui):
+    app = make_app(make_program())
+    app.on_close()
+    gui.askyesnocancel.assert_not_called()
+    app.root.destroy.assert_called_once()
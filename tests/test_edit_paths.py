@@ -0,0 +1,42 @@
+"""Whole-program edit paths go through apply_line_edit and stay undoable."""
+from conftest import blu3d, make_program
+
+
+def store_occurrences(app):
+    return sorted((app.param_line(param_id), app.param_store.type_of(param_id), app.param_store.values[param_id])
+                  for param_id in app.param_store.ids())
+
+
+def index_occurrences(app):
+    index = blu3d.SRCIndex.build("\n".join(app.content_lines) + "\n")
+    return sorted(zip(index.occ_lines, (blu3d.PARAM_TYPES[code] for code in index.occ_types), index.occ_values))
+
+
+def test_remove_param_edits_in_place_and_undoes(make_app, gui, monkeypatch):
+    app = make_app(make_program())
+    before = list(app.content_lines)
+    monkeypatch.setattr(app, 'extract_params_from_file', None)  # Must not be needed
+    app.remove_param('$VEL.CP', 0.0)
+    gui.showerror.assert_not_called()
+    
+    removed = {i for i, line in enumerate(before) if line.startswith('$VEL.CP=')}
+    removed |= {i + 1 for i in removed}
+    assert app.content_lines == [line for i, line in enumerate(before) if i not in removed]
+    assert store_occurrences(app) == index_occurrences(app)
+    
+    app.undo_last_action()
+    assert app.content_lines == before
+
+
+def test_apply_patch_data_edits_in_place(make_app, gui, monkeypatch):
+    app = make_app(make_program())
+    line_num = app.content_lines.index('TOOL_RPM=82') + 1
+    app.apply_line_edit(line_num, line_num + 1, ['TOOL_RPM=99'])
+    patch = app.build_patch()
+    
+    other = make_app(make_program(), name='other.src')
+    monkeypatch.setattr(other, 'extract_params_from_file', None)
+    assert other.apply_patch_data(patch) == []
+    gui.showerror.assert_not_called()
+    assert other.content_lines == app.content_lines
+    assert store_occurrences(other) == index_occurrences(other)
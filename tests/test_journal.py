@@ -0,0 +1,87 @@
+"""The crash-recovery journal: records, replay and compaction."""
+import os
+
+from conftest import blu3d, make_program
+
+
+def test_records_replay_onto_the_original(gui, tmp_path):
+    journal = blu3d.EditJournal(str(tmp_path / 'journal' / 'job.journal'))
+    journal.start({'file': 'job.src', 'key': 'k'})
+    journal.record_edit(2, ['b'], ['B', 'B2'])
+    journal.record_lines([1, 4], ['a', 'c'], ['A', 'D'])
+    journal.record_dicts({0.3: {'TOOL_RPM': 90}}, {})
+    journal.record_dicts({0.3: {'TOOL_RPM': 90}}, {})  # Unchanged lists are not logged again
+    journal.close()
+    
+    header, records = blu3d.EditJournal.read(journal.path)
+    assert header['file'] == 'job.src' and header['key'] == 'k'
+    assert [record['t'] for record in records] == ['edit', 'lines', 'dicts']
+    lines = ['a', 'b', 'c']
+    applied, dicts = blu3d.EditJournal.replay(lines, records)
+    assert applied == 3
+    assert lines == ['A', 'B', 'B2', 'D']
+    assert dicts['z'] == [[0.3, {'TOOL_RPM': 90}]]
+
+
+def test_torn_last_line_and_stale_edits(gui, tmp_path):
+    journal = blu3d.EditJournal(str(tmp_path / 'journal' / 'job.journal'))
+    journal.start({'file': 'job.src', 'key': 'k'})
+    journal.record_edit(1, ['a'], ['A'])
+    journal.record_edit(2, ['x'], ['X'])  # Does not match: replay stops here
+    journal.record_edit(3, ['c'], ['C'])
+    journal.close()
+    with open(journal.path, 'a') as journal_file:
+        journal_file.write('{"t": "edit", "s": 1, ')
+    
+    _, records = blu3d.EditJournal.read(journal.path)
+    assert len(records) == 3
+    lines = ['a', 'b', 'c']
+    applied, _ = blu3d.EditJournal.replay(lines, records)
+    assert applied == 1 and lines == ['A', 'b', 'c']
+
+
+def session_edits(app):
+    line_num = app.content_lines.index('TOOL_RPM=82') + 1
+    app.apply_line_edit(line_num, line_num + 1, ['TOOL_RPM=99'])
+    app.apply_line_edit(3, 3, [';first comment', ';second comment'])
+    app.apply_line_edit(3, 4, [])
+    ids = list(app.param_groups[blu3d.PARAM_GROUP_NAMES['$VEL.CP']])
+    app.apply_value_edits(ids[:3], [0.3, 0.31, 0.32])
+    app.apply_line_edit(5, 6, ['$VEL.CP=0.4'])
+    app.undo_last_action()  # Undone edits leave nothing after compaction
+    app.custom_z_params = {0.6: {'TOOL_RPM': 95}}
+
+
+def test_session_replays_and_compacts(make_app, gui):
+    app = make_app(make_program())
+    session_edits(app)
+    app.flush_journal()
+    _, records = blu3d.EditJournal.read(app.journal.path)
+    lines = list(app.loaded_lines)
+    applied, dicts = blu3d.EditJournal.replay(lines, records)
+    assert applied == len(records) and lines == app.content_lines
+    assert dicts['z'] == [[0.6, {'TOOL_RPM': 95}]]
+    
+    app.compact_journal()
+    _, compacted = blu3d.EditJournal.read(app.journal.path)
+    edits = [record for record in records if record['t'] != 'dicts']
+    assert len([record for record in compacted if record['t'] != 'dicts']) < len(edits)
+    lines = list(app.loaded_lines)
+    applied, dicts = blu3d.EditJournal.replay(lines, compacted)
+    assert applied == len(compacted) and lines == app.content_lines
+    assert dicts['z'] == [[0.6, {'TOOL_RPM': 95}]]
+
+
+def test_session_is_restored_from_the_journal(make_app, gui):
+    app = make_app(make_program())
+    session_edits(app)
+    app.flush_journal()
+    expected = list(app.content_lines)
+    header, records = blu3d.EditJournal.read(app.journal.path)
+    
+    other = make_app(make_program(), name='other.src')
+    other.restore_session(header, records)
+    gui.showerror.assert_not_called()
+    assert other.content_lines == expected
+    assert other.custom_z_params == {0.6: {'TOOL_RPM': 95}}
+    assert os.path.exists(other.journal.path)
@@ -0,0 +1,36 @@
+"""Edits are journaled where they are made, and the journal replays to the content."""
+from conftest import blu3d, make_program
+
+
+def replayed(app):
+    app.journal.flush()
+    _, records = blu3d.EditJournal.read(app.journal.path)
+    lines = list(app.loaded_lines)
+    applied, _ = blu3d.EditJournal.replay(lines, records)
+    assert applied == len(records)
+    return lines, records
+
+
+def test_content_assignment_is_not_journaled(make_app):
+    app = make_app(make_program())
+    _, before = replayed(app)
+    app.original_content = app.original_content.replace(';generated for tests', ';changed')
+    _, after = replayed(app)
+    assert after == before
+
+
+def test_settings_update_and_undo_replay(make_app, gui):
+    app = make_app(make_program())
+    app.def_entry.set('renamed()')
+    app.parkpos_entry.set('{X 1, Y 1, Z 300}')
+    app.update_file_settings()
+    gui.showerror.assert_not_called()
+    assert app.content_lines[:2] == ['DEF renamed()', 'PARKPOS = {X 1, Y 1, Z 300}']
+    assert replayed(app)[0] == app.content_lines
+    
+    app.undo_last_action()
+    assert app.content_lines == app.loaded_lines
+    assert replayed(app)[0] == app.content_lines
+    app.redo_last_action()
+    assert app.content_lines[0] == 'DEF renamed()'
+    assert replayed(app)[0] == app.content_lines
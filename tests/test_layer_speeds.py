@@ -0,0 +1,84 @@
+"""Per-layer $VEL.CP schedules: optimizing them and applying them to the program."""
+import numpy as np
+import pytest
+
+from conftest import blu3d, make_program
+
+
+def program_missing_layer_speed():
+    """Layer 4 has no $VEL.CP of its own, so applying a schedule inserts one."""
+    return make_program().replace('$VEL.CP=0.23\n', '')
+
+
+def test_schedule_with_insertion_is_applied(make_app, gui):
+    app = make_app(program_missing_layer_speed())
+    assert app.apply_layer_speeds(np.array([0.2, 0.25, 0.3, 0.35, 0.4, 0.45]))
+    gui.showerror.assert_not_called()
+    gui.askyesno.assert_not_called()
+    speeds = [float(line.split('=')[1]) for line in app.content_lines if line.startswith('$VEL.CP=')]
+    assert speeds[1:] == [0.2, 0.25, 0.3, 0.35, 0.4, 0.45]
+
+
+def test_inserted_value_above_the_maximum_is_refused(make_app, gui):
+    app = make_app(program_missing_layer_speed())
+    before = list(app.content_lines)
+    assert not app.apply_layer_speeds(np.array([0.2, 0.2, 0.2, 2.5, 0.2, 0.2]))
+    assert 'maximum' in gui.showerror.call_args[0][1]
+    assert app.content_lines == before
+
+
+def test_inserted_step_asks_and_can_be_declined(make_app, gui):
+    app = make_app(program_missing_layer_speed())
+    before = list(app.content_lines)
+    gui.askyesno.return_value = False
+    assert not app.apply_layer_speeds(np.array([0.2, 0.2, 0.2, 0.45, 0.45, 0.45]))
+    assert 'more than 0.2' in gui.askyesno.call_args[0][1]
+    assert app.content_lines == before
+    
+    gui.askyesno.return_value = True
+    assert app.apply_layer_speeds(np.array([0.2, 0.2, 0.2, 0.45, 0.45, 0.45]))
+    assert app.content_lines != before
+
+
+class LengthEstimator:
+    """Layer time is path length over speed; enough for optimize_layer_speeds."""
+
+    def __init__(self, lengths):
+        self.lengths = np.asarray(lengths, dtype=float)
+        self.motion = type('Motion', (), {'layer_count': len(lengths)})()
+
+    def layer_times_at(self, speeds):
+        return self.lengths / speeds
+
+
+def test_optimized_speeds_keep_every_limit():
+    rng = np.random.default_rng(35)
+    lengths = rng.uniform(200, 20000, 60)
+    lengths[10] = 5  # Too short even at the minimum speed
+    estimator = LengthEstimator(lengths)
+    min_time, min_speed, max_speed, max_step = 20.0, 0.05, 0.5, 0.03
+    speeds, too_fast = blu3d.optimize_layer_speeds(estimator, min_time, min_speed, max_speed, max_step)
+    
+    assert too_fast.tolist() == (lengths / (min_speed * blu3d.VEL_CP_TO_MM_S) < min_time).tolist()
+    assert too_fast[10]
+    assert np.all(speeds >= min_speed - 1e-9) and np.all(speeds <= max_speed + 1e-9)
+    assert np.all(np.round(speeds, 4) == speeds)
+    assert np.all(np.abs(np.diff(speeds)) <= max_step + 1e-9)
+    times = estimator.layer_times_at(speeds * blu3d.VEL_CP_TO_MM_S)
+    assert np.all(times[~too_fast] >= min_time - 1e-9)
+    
+    # No layer can go any faster without breaking a limit
+    for layer in np.flatnonzero(~too_fast):
+        faster = speeds[layer] + 0.0001
+        neighbours = speeds[max(layer - 1, 0):layer + 2]
+        assert faster > max_speed + 1e-9 or \
+            lengths[layer] / (faster * blu3d.VEL_CP_TO_MM_S) < min_time or \
+            np.any(np.abs(neighbours - faster) > max_step + 1e-9)
+
+
+def test_step_limit_spreads_a_slow_layer():
+    estimator = LengthEstimator([10 ** 6] * 3 + [1000] + [10 ** 6] * 3)
+    speeds, too_fast = blu3d.optimize_layer_speeds(estimator, 10.0, 0.01, 0.5, 0.1)
+    assert not too_fast.any()
+    cap = np.floor(1000 / (10 * blu3d.VEL_CP_TO_MM_S) * 10000) / 10000
+    assert speeds.tolist() == pytest.approx([cap + 0.3, cap + 0.2, cap + 0.1, cap, cap + 0.1, cap + 0.2, cap + 0.3], abs=1e-4)
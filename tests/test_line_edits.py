@@ -0,0 +1,62 @@
+"""Edits through apply_line_edit keep the spliced index, motion table and timeline exact."""
+import random
+
+import numpy as np
+
+from conftest import blu3d, make_program
+
+
+def index_fields(index):
+    return (list(index.line_offsets), list(index.occ_lines), list(index.occ_types), list(index.occ_values),
+            [index.prefixes[i] for i in index.occ_prefix_ids], list(index.lin_lines), list(index.lin_z),
+            list(index.layer_starts), index.progress_lines, index.triggers, index.def_value, index.parkpos_value)
+
+
+def random_lines(rng):
+    choices = ["; comment", "TOOL_RPM=95", "$VEL.CP=0.25", "TRIGGER WHEN DISTANCE=0 DELAY=0 DO LAYER_COOLING=120",
+               "LIN {X 3.0000, Y 4.0000, Z 0.9000} C_DIS", "TRIGGER WHEN DISTANCE=0 DELAY=0 DO PRINT_PROGRESS=50",
+               "ACT_DRIVE=TRUE"]
+    return [rng.choice(choices) for _ in range(rng.randint(0, 3))]
+
+
+def test_random_edits_match_a_full_rebuild(make_app, gui):
+    rng = random.Random(4)
+    app = make_app(make_program())
+    for _ in range(150):
+        app.get_timeline()
+        count = len(app.content_lines)
+        start = rng.randint(2, count)
+        stop = min(count + 1, start + rng.randint(0, 3))
+        if rng.random() < 0.5:
+            # Same line count, often just a new value
+            stop = min(count + 1, start + 1)
+            new_lines = [app.content_lines[start - 1].replace('0', '1')] if stop > start else []
+        else:
+            new_lines = random_lines(rng)
+        app.apply_line_edit(start, stop, new_lines)
+        gui.showerror.assert_not_called()
+
+        text = "\n".join(app.content_lines) + "\n"
+        assert index_fields(app.src_index) == index_fields(blu3d.SRCIndex.build(text))
+        motion = app.get_motion_table()
+        fresh = blu3d.MotionTable.from_lines(app.content_lines)
+        for name in ('lines', 'z', 'x', 'y', 'layer_starts'):
+            assert np.array_equal(getattr(motion, name), getattr(fresh, name))
+        timeline = app.get_timeline()
+        for param_type in blu3d.PARAM_TYPES:
+            param_ids = timeline.ids[param_type]
+            lines = [app.param_line(int(param_id)) for param_id in param_ids]
+            assert list(timeline.lines[param_type]) == lines
+            values = [app.param_store.values[int(param_id)] for param_id in param_ids]
+            expected = blu3d.effective_values(np.array(lines), np.array(values), fresh.lines)
+            assert np.array_equal(timeline.move_values(param_type), expected, equal_nan=True)
+
+
+def test_inserting_a_comment_keeps_the_index_and_table(make_app):
+    app = make_app(make_program())
+    motion = app.get_motion_table()
+    timeline = app.get_timeline()
+    app.apply_line_edit(10, 10, ["; note"])
+    assert app.src_index is not None
+    assert app.get_timeline() is timeline
+    assert np.array_equal(app.get_motion_table().lines[motion.lines >= 10], motion.lines[motion.lines >= 10] + 1)
@@ -0,0 +1,93 @@
+"""LineMap line numbers checked against a plain list of the current lines."""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PARAMETROS_BLU3D import LineMap
+
+
+class ListModel:
+    """Current lines as a list of ('slot', n) originals and ('marker', id) inserts."""
+
+    def __init__(self, line_count):
+        self.lines = [('slot', slot) for slot in range(1, line_count + 1)]
+
+    def insert(self, start, markers):
+        self.lines[start - 1:start - 1] = [('marker', marker) for marker in markers]
+
+    def delete(self, start, count):
+        del self.lines[start - 1:start - 1 + count]
+
+
+def marker_slots(line_map):
+    return {marker: slot for slot, markers in line_map.inserted.items() for marker in markers}
+
+
+def assert_matches(line_map, model):
+    assert line_map.total == len(model.lines)
+    slots = marker_slots(line_map)
+    for line_num, (kind, key) in enumerate(model.lines, 1):
+        if kind == 'slot':
+            assert line_map.alive[key]
+            assert line_map.line_of(key) == line_num
+        else:
+            assert line_map.line_of(slots[key], key) == line_num
+        slot, index = line_map.locate(line_num)
+        assert (slot, index if index < 0 else line_map.inserted[slot][index]) == \
+            ((key, -1) if kind == 'slot' else (slots[key], key))
+
+
+def apply(line_map, model, operation, start, value):
+    if operation == 'insert':
+        line_map.insert(start, value)
+        model.insert(start, value)
+    else:
+        line_map.delete(start, value)
+        model.delete(start, value)
+
+
+def test_insert_at_head_and_tail():
+    line_map, model = LineMap(5), ListModel(5)
+    apply(line_map, model, 'insert', 1, [100, 101])
+    apply(line_map, model, 'insert', line_map.total + 1, [102])
+    apply(line_map, model, 'insert', line_map.total, [103])
+    assert_matches(line_map, model)
+
+
+def test_delete_at_head_and_tail():
+    line_map, model = LineMap(6), ListModel(6)
+    apply(line_map, model, 'delete', 1, 2)
+    apply(line_map, model, 'delete', line_map.total, 1)
+    assert_matches(line_map, model)
+    apply(line_map, model, 'insert', 1, [100])
+    apply(line_map, model, 'delete', line_map.total - 1, 2)
+    assert_matches(line_map, model)
+
+
+def test_edits_inside_inserted_lines():
+    line_map, model = LineMap(4), ListModel(4)
+    apply(line_map, model, 'insert', 3, [100, 101, 102])
+    apply(line_map, model, 'insert', 4, [103])  # Between two inserted lines
+    apply(line_map, model, 'delete', 5, 1)  # An inserted line
+    apply(line_map, model, 'delete', 3, 1)  # The first inserted line of the slot
+    assert_matches(line_map, model)
+    apply(line_map, model, 'delete', 5, 1)  # The slot's original line, after its inserts
+    apply(line_map, model, 'insert', 5, [104])
+    assert_matches(line_map, model)
+
+
+def test_random_edits():
+    rng = random.Random(7)
+    line_map, model = LineMap(40), ListModel(40)
+    next_marker = 1000
+    for _ in range(500):
+        if model.lines and rng.random() < 0.45:
+            start = rng.randint(1, len(model.lines))
+            apply(line_map, model, 'delete', start, rng.randint(1, min(3, len(model.lines) - start + 1)))
+        else:
+            markers = list(range(next_marker, next_marker + rng.randint(1, 3)))
+            next_marker += len(markers)
+            apply(line_map, model, 'insert', rng.randint(1, len(model.lines) + 1), markers)
+        assert_matches(line_map, model)
@@ -0,0 +1,48 @@
+"""Minified programs keep every coordinate within the tolerance."""
+import random
+import re
+
+import pytest
+
+from conftest import blu3d
+
+NUMBER = re.compile(r'([XYZ])\s*(-?\d+(?:\.\d*)?)')
+
+
+def coordinates(lines):
+    return [(axis, float(value)) for line in lines if line.startswith('LIN') for axis, value in NUMBER.findall(line)]
+
+
+@pytest.mark.parametrize('tolerance, decimals', [(0.5, 0), (0.05, 1), (0.01, 2), (0.005, 2), (0.001, 3)])
+def test_tolerance_decimals(tolerance, decimals):
+    assert blu3d.tolerance_decimals(tolerance) == decimals
+    assert 0.5 * 10 ** -decimals <= tolerance + 1e-12
+
+
+@pytest.mark.parametrize('tolerance', [0.5, 0.05, 0.01, 0.005, 0.001])
+def test_coordinates_stay_within_tolerance(tolerance, monkeypatch):
+    monkeypatch.setattr(blu3d, 'MINIFY_CHUNK_LINES', 1000)  # Several batches
+    rng = random.Random(46)
+    lines = [f"LIN {{X {rng.uniform(-500, 500):.6f},  Y {rng.uniform(-500, 500):.6f}, Z {rng.uniform(0, 300):.6f}}} C_DIS"
+             for _ in range(2500)]
+    stats = {}
+    output = list(blu3d.minify_lines(lines, tolerance, stats=stats))
+    
+    before, after = coordinates(lines), coordinates(output)
+    assert [axis for axis, _ in after] == [axis for axis, _ in before]
+    change = max(abs(new - old) for (_, old), (_, new) in zip(before, after))
+    assert change <= tolerance + 1e-9
+    assert stats['max_change'] == pytest.approx(change)
+    assert stats['coordinates'] == len(before)
+    assert stats['bytes_out'] < stats['bytes_in']
+    assert all('-0' != value for line in output for value in re.findall(r'-?\d+(?:\.\d*)?', line))
+
+
+def test_comments_whitespace_and_strings():
+    lines = ["DEF  job()", "", ";one", ";two", "   TOOL_RPM=80   ; spin", 'MSG "keep   this"', ";three", "END"]
+    assert list(blu3d.minify_lines(lines, 0.01, comments='keep')) == \
+        ["DEF job()\n", ";one\n", ";two\n", "TOOL_RPM=80 ; spin\n", 'MSG "keep   this"\n', ";three\n", "END\n"]
+    assert list(blu3d.minify_lines(lines, 0.01, comments='condense')) == \
+        ["DEF job()\n", ";one\n", "TOOL_RPM=80 ; spin\n", 'MSG "keep   this"\n', ";three\n", "END\n"]
+    assert list(blu3d.minify_lines(lines, 0.01, comments='strip')) == \
+        ["DEF job()\n", "TOOL_RPM=80\n", 'MSG "keep   this"\n', "END\n"]
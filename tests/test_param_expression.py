@@ -0,0 +1,43 @@
+"""Rules like 'TOOL_RPM = 80 + 0.4*z' accept arithmetic only."""
+import numpy as np
+import pytest
+
+from conftest import blu3d
+
+VARIABLES = ('z', 'layer', 'value')
+
+
+@pytest.mark.parametrize('text', [
+    "z.__class__",
+    "value.real",
+    "clip.__globals__",
+    "__import__('os')",
+    "open('job.src')",
+    "(lambda: 1)()",
+    "z(1)",
+    "clip(z, a_min=0)",
+    "__builtins__",
+    "__class__",
+    "'text'",
+    "[z][0]",
+    "{z: 1}",
+    "[x for x in z]",
+    "f'{z}'",
+    "(z := 1)",
+])
+def test_rejects_anything_but_arithmetic(text):
+    with pytest.raises((ValueError, SyntaxError)):
+        blu3d.ParamExpression(text, VARIABLES)
+
+
+def test_evaluates_element_wise():
+    z = np.array([0.3, 0.6, 0.9, 1.2])
+    layer = np.arange(4.0)
+    rule = blu3d.ParamExpression("TOOL_RPM = 80 + 10 * z if 0.5 < z < 1 or layer == 0 else max(value, 90)", VARIABLES)
+    assert rule.target == 'TOOL_RPM'
+    assert rule.evaluate(z=z, layer=layer, value=np.full(4, 85.0)).tolist() == pytest.approx([83, 86, 89, 90])
+    
+    constant = blu3d.ParamExpression("$VEL.CP = 0.25", VARIABLES)
+    assert constant.target == '$VEL.CP'
+    assert constant.evaluate(z=z).tolist() == [0.25] * 4
+    assert blu3d.ParamExpression("value == 1", VARIABLES).target is None
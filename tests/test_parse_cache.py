@@ -0,0 +1,60 @@
+"""The on-disk cache of parsed program indexes."""
+import os
+
+from conftest import blu3d, make_program
+
+
+def write(path, text, mtime_ns=None):
+    path.write_text(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path.read_bytes()
+
+
+def test_key_follows_size_mtime_and_content(tmp_path):
+    cache = blu3d.ParseCache(str(tmp_path / 'cache'))
+    path = tmp_path / 'job.src'
+    key = cache.key_for(path, write(path, "TOOL_RPM=80\n", 10 ** 18))
+    assert cache.key_for(path, write(path, "TOOL_RPM=80\n", 10 ** 18)) == key
+    assert cache.key_for(path, write(path, "TOOL_RPM=81\n", 10 ** 18)) != key  # Same size and mtime
+    assert cache.key_for(path, write(path, "TOOL_RPM=80\n", 10 ** 18 + 1)) != key
+    assert cache.key_for(path, write(path, "TOOL_RPM=800\n", 10 ** 18)) != key
+
+
+def test_store_and_load(tmp_path, monkeypatch):
+    cache = blu3d.ParseCache(str(tmp_path / 'cache'))
+    index = blu3d.SRCIndex.build(make_program())
+    cache.store('a', index)
+    loaded = cache.load('a')
+    assert list(loaded.occ_lines) == list(index.occ_lines)
+    assert list(loaded.lin_z) == list(index.lin_z)
+    assert cache.load('missing') is None
+    
+    # Stale formats and damaged entries are misses
+    monkeypatch.setattr(blu3d, 'CACHE_VERSION', blu3d.CACHE_VERSION + 1)
+    assert cache.load('a') is None
+    monkeypatch.undo()
+    with open(cache.entry_path('a'), 'r+b') as entry:
+        entry.truncate(20)
+    assert cache.load('a') is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    index = blu3d.SRCIndex.build(make_program())
+    cache = blu3d.ParseCache(str(tmp_path / 'cache'))
+    cache.store('first', index)
+    size = os.path.getsize(cache.entry_path('first'))
+    cache.max_bytes = 2 * size + size // 2
+    cache.store('second', index)
+    for age, key in ((300, 'first'), (200, 'second')):
+        os.utime(cache.entry_path(key), (1e9 - age, 1e9 - age))
+    
+    # Loading 'first' makes 'second' the least recently used
+    assert cache.load('first') is not None
+    cache.store('third', index)
+    assert sorted(os.listdir(cache.cache_dir)) == ['first.idx', 'third.idx']
+    
+    # The entry just stored is never evicted, even when it alone is too big
+    cache.max_bytes = size // 2
+    cache.store('fourth', index)
+    assert os.listdir(cache.cache_dir) == ['fourth.idx']
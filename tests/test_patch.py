@@ -0,0 +1,57 @@
+"""Session edits exported as a Z/progress-anchored patch and replayed elsewhere."""
+import json
+
+from conftest import blu3d, make_program
+
+
+def replace_line(app, old, new_lines, nth=0):
+    line_num = [i for i, line in enumerate(app.content_lines, 1) if line == old][nth]
+    app.apply_line_edit(line_num, line_num + 1, new_lines)
+
+
+def edit_session(app):
+    replace_line(app, 'TOOL_RPM=82', ['TOOL_RPM=99'])
+    replace_line(app, 'TRIGGER WHEN DISTANCE=1 DELAY=0.5 DO ACT_DRIVE=TRUE', [], nth=3)
+    replace_line(app, '$VEL.CP=0.21', ['$VEL.CP=0.21', ';slower from here'])
+
+
+def test_every_line_anchors_back_to_itself(make_app):
+    text = make_program(layers=4)
+    app = make_app(text + text.split('\n', 7)[7])  # Layers 1-4 again: repeated Z values
+    anchors = blu3d.LayerAnchors(app.content_lines, app.get_motion_table(), app.occurrence_lines())
+    for line_num in range(len(app.content_lines) + 1):
+        assert anchors.resolve(anchors.anchor(line_num), {}) == line_num
+
+
+def test_patch_replays_onto_a_shifted_program(make_app, gui):
+    app = make_app(make_program())
+    edit_session(app)
+    patch = json.loads(json.dumps(app.build_patch()))
+    
+    # The same print with a longer header: every line number differs
+    shifted = make_program().replace(';generated for tests', ';generated for tests\n;one\n;two\n;three')
+    other = make_app(shifted, name='other.src')
+    assert other.apply_patch_data(patch) == []
+    gui.showerror.assert_not_called()
+    
+    expected = make_app(shifted, name='expected.src')
+    edit_session(expected)
+    assert other.content_lines == expected.content_lines
+    
+    # Undone as one edit
+    other.undo_last_action()
+    assert other.content_lines == shifted.splitlines()
+
+
+def test_missing_layers_are_reported(make_app, gui):
+    app = make_app(make_program())
+    edit_session(app)
+    patch = app.build_patch()
+    
+    other = make_app(make_program(layers=2), name='other.src')
+    unresolved = other.apply_patch_data(patch)
+    gui.showerror.assert_not_called()
+    assert sorted(edit['op'] for edit in unresolved) == ['delete', 'set']
+    assert 'TOOL_RPM=99' not in other.content_lines
+    assert ';slower from here' in other.content_lines
+    assert 'Applied 1 of 3' in other.patch_report(patch, unresolved)
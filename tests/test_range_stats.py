@@ -0,0 +1,77 @@
+"""RangeStats and EffectiveTimeline.range_stats checked against brute force."""
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PARAMETROS_BLU3D import EffectiveTimeline, MotionTable, RangeStats
+
+
+def brute_query(values, weights, start, stop):
+    present = [i for i in range(start, stop) if weights[i] > 0]
+    low = min((values[i] for i in present), default=float('inf'))
+    high = max((values[i] for i in present), default=float('-inf'))
+    total = sum(values[i] * weights[i] for i in range(start, stop))
+    return low, high, total, float(sum(weights[start:stop]))
+
+
+def test_queries_and_updates_match_brute_force():
+    rng = random.Random(3)
+    for count in (1, 2, 5, 16, 37):
+        values = [rng.uniform(-50, 50) for _ in range(count)]
+        weights = [rng.choice((0, 0, 1, 2, 5)) for _ in range(count)]
+        tree = RangeStats(values, weights)
+        for _ in range(200):
+            if rng.random() < 0.3:
+                index = rng.randrange(count)
+                values[index] = rng.uniform(-50, 50)
+                tree.update(index, values[index])
+            start = rng.randrange(count + 1)
+            stop = rng.randrange(start, count + 1)
+            assert np.allclose(tree.query(start, stop), brute_query(values, weights, start, stop))
+
+
+def make_timeline(rng, moves=60, assignments=12):
+    lines = np.arange(10, 10 + 3 * moves, 3)
+    motion = MotionTable(lines, np.repeat(np.arange(moves // 6) * 0.3, 6)[:moves],
+                         np.arange(moves, dtype=float), np.zeros(moves))
+    change_lines = np.sort(rng.sample(range(1, int(lines[-1]) + 5), assignments)).astype(np.int64)
+    values = np.array([float(rng.randint(50, 150)) for _ in range(assignments)])
+    param_ids = np.arange(assignments)
+    return EffectiveTimeline({'TOOL_RPM': (param_ids, change_lines, values)}, motion)
+
+
+def brute_stats(timeline, start, stop):
+    values = timeline.move_values('TOOL_RPM')[start:stop]
+    fill = timeline.fill['TOOL_RPM']
+    changes = int(fill[stop - 1] - fill[start]) if stop > start else 0
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {'moves': 0, 'changes': changes}
+    return {'min': values.min(), 'max': values.max(), 'mean': values.mean(),
+            'moves': len(values), 'changes': changes}
+
+
+def test_range_stats_partial_cover_and_edits():
+    rng = random.Random(11)
+    for _ in range(20):
+        timeline = make_timeline(rng)
+        moves = len(timeline.motion.z)
+        for _ in range(50):
+            if rng.random() < 0.3:
+                timeline.update_value(rng.randrange(12), float(rng.randint(50, 150)))
+            start = rng.randrange(moves)
+            stop = rng.randrange(start, moves + 1)
+            stats = timeline.range_stats('TOOL_RPM', start, stop)
+            for key, expected in brute_stats(timeline, start, stop).items():
+                assert np.isclose(stats[key], expected), (key, start, stop)
+
+
+def test_row_ranges():
+    timeline = make_timeline(random.Random(5))
+    assert timeline.rows_of_layers(1, 2) == (6, 18)
+    assert timeline.rows_between_z(0.3, 0.6) == (6, 18)
+    assert timeline.rows_between_lines(10, 16) == (0, 3)
@@ -0,0 +1,44 @@
+"""An external rewrite of the open program is reloaded and pending edits re-applied."""
+from conftest import make_program
+
+
+def test_reload_reapplies_pending_edits_as_line_edits(make_app, gui, monkeypatch, tmp_path):
+    app = make_app(make_program())
+    line_num = app.content_lines.index('TOOL_RPM=82') + 1
+    app.apply_line_edit(line_num, line_num + 1, ['TOOL_RPM=99'])
+    
+    # Only the baseline is extracted again; the edit goes through apply_line_edit
+    extracts = []
+    extract = app.extract_params_from_file
+    monkeypatch.setattr(app, 'extract_params_from_file', lambda *args: extracts.append(args) or extract(*args))
+    edits = []
+    line_edit = app.apply_line_edit
+    monkeypatch.setattr(app, 'apply_line_edit', lambda *args, **kwargs: edits.append(args) or line_edit(*args, **kwargs))
+    gui.askyesno.return_value = True
+    
+    (tmp_path / 'job.src').write_text(make_program().replace(';generated for tests', ';rewritten'))
+    app.reload_source()
+    gui.showerror.assert_not_called()
+    assert len(extracts) == 1
+    assert len(edits) == 1
+    assert 'TOOL_RPM=99' in app.content_lines
+    assert ';rewritten' in app.content_lines
+    
+    # The only undo step is the re-application, and it lands on the new file
+    assert app.redo_state is None
+    app.undo_last_action()
+    assert app.content_lines == app.loaded_lines
+
+
+def test_reload_without_edits_clears_undo(make_app, gui, tmp_path):
+    app = make_app(make_program())
+    line_num = app.content_lines.index('TOOL_RPM=82') + 1
+    app.apply_line_edit(line_num, line_num + 1, ['TOOL_RPM=99'])
+    app.undo_last_action()
+    assert app.redo_state is not None
+    
+    (tmp_path / 'job.src').write_text(make_program().replace(';generated for tests', ';rewritten'))
+    app.reload_source()
+    gui.showerror.assert_not_called()
+    assert app.undo_state is None and app.redo_state is None
+    assert ';rewritten' in app.content_lines
@@ -0,0 +1,58 @@
+"""Splitting a program into sub-programs at layer boundaries."""
+import os
+import re
+
+import numpy as np
+
+from conftest import blu3d, make_program
+
+ASSIGNMENT = re.compile(r'(TOOL_RPM|\$VEL\.CP|LAYER_COOLING|ACT_DRIVE)=(\w+(?:\.\d+)?)')
+
+
+def test_plan_split_respects_targets():
+    sizes = np.full(100, 10)
+    cuts = list(range(10, 100, 10))
+    starts = blu3d.plan_split(sizes, cuts, 0, 100, max_lines=25, max_bytes=10 ** 6)
+    assert starts == [0, 20, 40, 60, 80]
+    assert blu3d.plan_split(sizes, cuts, 0, 100, max_lines=1000, max_bytes=300) == [0, 30, 60, 90]
+    
+    # A layer larger than the target is a part of its own
+    assert blu3d.plan_split(sizes, [10, 80], 0, 100, max_lines=20, max_bytes=10 ** 6) == [0, 10, 80]
+    assert blu3d.plan_split(sizes, [], 0, 100, max_lines=20, max_bytes=10 ** 6) == [0]
+
+
+def test_parts_reassemble_to_the_program(make_app, tmp_path):
+    app = make_app(make_program(layers=12))
+    lines = [line + '\n' for line in app.content_lines]
+    output = str(tmp_path / 'out' / 'job_split.src')
+    os.makedirs(os.path.dirname(output))
+    part_files = app.write_split_program(output, lines, max_lines=40, max_bytes=10 ** 6)
+    assert len(part_files) > 2
+    
+    # The master calls every part in order
+    with open(output) as file:
+        master = file.read().splitlines()
+    names = [os.path.splitext(os.path.basename(path))[0] for path in part_files]
+    assert master == ['DEF  job()', 'PARKPOS = {X 0, Y 0, Z 300}'] + [f"{name}()" for name in names] + ['END']
+    
+    body = []
+    for part, (path, name) in enumerate(zip(part_files, names)):
+        with open(path) as file:
+            part_lines = file.read().splitlines(True)
+        assert part_lines[0] == f"DEF {name}()\n" and part_lines[-1] == "END\n"
+        if part:
+            # Each later part restates the header and the values in force
+            assert part_lines[1] == 'PARKPOS = {X 0, Y 0, Z 300}\n'
+            assert part_lines[2].startswith(f";Part {part + 1} of {len(names)}")
+            state = dict(ASSIGNMENT.match(line).groups() for line in part_lines[3:7])
+            expected = {}
+            for line in lines[:len(body) + 1]:
+                expected.update(ASSIGNMENT.findall(line))
+            assert {key: float(value) if value[0].isdigit() else value for key, value in state.items()} == \
+                {key: float(value) if value[0].isdigit() else value for key, value in expected.items()}
+            part_lines = part_lines[7:]
+        else:
+            part_lines = part_lines[1:]
+        assert len(part_lines) <= 41
+        body.extend(part_lines[:-1])
+    assert body == lines[1:-1]
@@ -0,0 +1,51 @@
+"""Where TRIGGER WHEN DISTANCE=.. DELAY=.. statements fire along the path."""
+import numpy as np
+import pytest
+
+from conftest import blu3d
+
+
+def straight_path():
+    """Five LIN moves 10 mm apart along X on lines 10, 12, .., 18; 1 s per move."""
+    motion = blu3d.MotionTable(np.array([10, 12, 14, 16, 18]), np.full(5, 1.0),
+                               np.array([0.0, 10.0, 20.0, 30.0, 40.0]), np.zeros(5))
+    return motion, np.array([0.0, 1.0, 1.0, 1.0, 1.0])
+
+
+@pytest.mark.parametrize('distance, delay, x, line', [
+    (0, 0, 10.0, 12),      # Start point of the next move (the end of the one before)
+    (1, 0, 20.0, 14),      # End point of the next move
+    (0, 500, 15.0, 14),    # Half a second into the next move
+    (1, 2500, 40.0, 18),   # Two and a half moves on
+    (0, 99000, 40.0, 18),  # Past the end of the program: the last point
+    (0, -500, 5.0, 12),    # A negative delay fires before the reference point
+])
+def test_fire_point(distance, delay, x, line):
+    motion, move_times = straight_path()
+    fired = blu3d.simulate_triggers(motion, move_times, [13], [distance], [delay])
+    assert fired['x'][0] == pytest.approx(x)
+    assert fired['length'][0] == pytest.approx(x)
+    assert fired['line'][0] == line
+    assert fired['z'][0] == 1.0
+
+
+def test_many_triggers_at_once():
+    motion, move_times = straight_path()
+    fired = blu3d.simulate_triggers(motion, move_times, [5, 11, 17, 20], [0, 1, 0, 1], [0, 0, 250, 0])
+    assert fired['x'].tolist() == pytest.approx([0.0, 10.0, 32.5, 40.0])
+    assert fired['time'].tolist() == pytest.approx([0.0, 1.0, 3.25, 4.0])
+
+
+def test_zero_time_moves_do_not_pull_the_point_back():
+    motion, _ = straight_path()
+    move_times = np.array([0.0, 1.0, 0.0, 0.0, 1.0])
+    fired = blu3d.simulate_triggers(motion, move_times, [15], [1], [0])
+    assert fired['line'][0] == 16 and fired['x'][0] == pytest.approx(30.0)
+
+
+def test_no_moves_or_no_triggers():
+    motion, move_times = straight_path()
+    assert len(blu3d.simulate_triggers(motion, move_times, [], [], [])['x']) == 0
+    empty = blu3d.MotionTable(np.zeros(0, dtype=np.int64), np.zeros(0))
+    fired = blu3d.simulate_triggers(empty, [], [3], [0], [0])
+    assert fired['x'].tolist() == [0.0]